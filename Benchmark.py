@@ -0,0 +1,182 @@
+# Benchmarks of state resolution and cycle evaluation, reported as JSON
+#
+#   python Benchmark.py                                  print the report
+#   python Benchmark.py -o today.json                    also write it to a file
+#   python Benchmark.py --compare today.json             fail (exit status 1) if a benchmark got slower than the
+#                                                        threshold compared to an earlier report
+#   python Benchmark.py --backend if97 --filter rankine  only the rankine benchmarks, on the IF97 backend
+#
+# Every benchmark calls one function repeatedly on representative inputs and times each call.  The state cache is
+# turned off while timing (unless --cache is given) so repeated inputs measure the calculation, not the cache.
+
+import argparse
+import datetime
+import json
+import sys
+import time
+import numpy as np
+
+from Calc_state import Steam_SI
+from Steam import steam
+from Rankine import rankine
+from Steam_batch import CASES
+from Steam_cache import state_cache
+
+# representative states: two-phase (P in kPa, quality) and superheated (P in kPa, T in C), from low to high pressure
+SATURATED = ((10, 0.9), (500, 0.5), (5000, 0.2), (15000, 0.7))
+SUPERHEATED = ((10, 100), (500, 300), (5000, 450), (15000, 600))
+ITERATIONS = 200
+THRESHOLD = 0.2  # a benchmark regressed if its ops/s dropped by more than this fraction
+
+
+def reference_states(backend=None):
+    """
+    Resolves the representative states.
+    :return: (saturated, superheated) lists of Steam_SI with every property filled in
+    """
+    saturated = [Steam_SI(P=P, x=x, backend=backend) for P, x in SATURATED]
+    superheated = [Steam_SI(P=P, T=T, backend=backend) for P, T in SUPERHEATED]
+    for state in saturated + superheated:
+        state.calc()
+    return saturated, superheated
+
+
+def case_inputs(case, saturated, superheated):
+    """
+    Inputs of a Steam_SI case taken from the reference states.  Cases with the quality use the two-phase states,
+    PT uses the superheated states (T is indeterminate for a two-phase state) and the others use both.
+    :return: list of keyword argument dicts for Steam_SI
+    """
+    if 'x' in case:
+        states = saturated
+    elif case == 'PT':
+        states = superheated
+    else:
+        states = saturated + superheated
+    return [{case[0]: getattr(state, case[0]), case[1]: getattr(state, case[1])} for state in states]
+
+
+def time_calls(fun, inputs, iterations=ITERATIONS):
+    """
+    Times fun(inputs[i]) going round the inputs.  Every input is evaluated once before timing starts, so one-time
+    setup (reading tables, building interpolators) is not counted.
+    :param fun: function of one input
+    :param inputs: list of inputs
+    :param iterations: number of timed calls
+    :return: dict of ops_per_sec, p50_us, p99_us, mean_us and iterations
+    """
+    for value in inputs:
+        fun(value)
+    times = np.empty(iterations)
+    clock = time.perf_counter
+    for i in range(iterations):
+        value = inputs[i % len(inputs)]
+        start = clock()
+        fun(value)
+        times[i] = clock() - start
+    return {'ops_per_sec': iterations / times.sum(), 'p50_us': float(np.percentile(times, 50)) * 1e6,
+            'p99_us': float(np.percentile(times, 99)) * 1e6, 'mean_us': float(times.mean()) * 1e6,
+            'iterations': iterations}
+
+
+def benchmarks(backend=None):
+    """
+    :param backend: property backend for every calculation (None for the steam tables, see Steam_backends.py)
+    :return: dict of benchmark name -> (function of one input, list of inputs)
+    """
+    saturated, superheated = reference_states(backend)
+    found = {}
+
+    def steam_si(kwargs):
+        Steam_SI(backend=backend, **kwargs).calc()
+
+    for case in CASES:
+        found['Steam_SI.calc[{}]'.format(case)] = (steam_si, case_inputs(case, saturated, superheated))
+
+    def steam_calc(kwargs):
+        steam(backend=backend, **kwargs)  # the constructor calls calc
+
+    found['steam.calc[saturated]'] = (steam_calc, [{'pressure': s.P, 'x': s.x} for s in saturated]
+                                      + [{'pressure': s.P, 'h': s.h} for s in saturated]
+                                      + [{'pressure': s.P, 's': s.s} for s in saturated])
+    found['steam.calc[superheated]'] = (steam_calc, [{'pressure': s.P, 'T': s.T} for s in superheated]
+                                        + [{'pressure': s.P, 'h': s.h} for s in superheated]
+                                        + [{'pressure': s.P, 's': s.s} for s in superheated])
+
+    def cycle(kwargs):
+        rankine(backend=backend, **kwargs).calc_efficiency()
+
+    pressures = ((8, 8000), (10, 5000), (20, 12000), (5, 2000))
+    found['rankine.calc_efficiency[saturated]'] = (cycle, [{'p_low': lo, 'p_high': hi, 't_high': None, 'quality': 1}
+                                                           for lo, hi in pressures])
+    found['rankine.calc_efficiency[superheated]'] = (cycle, [{'p_low': lo, 'p_high': hi, 't_high': T}
+                                                             for (lo, hi), T in zip(pressures, (500, 400, 600, 350))])
+    return found
+
+
+def run(names=None, iterations=ITERATIONS, backend=None, cache=False):
+    """
+    Runs the benchmarks.
+    :param names: substrings; only benchmarks whose name contains one of them are run (None for all)
+    :param iterations: timed calls per benchmark
+    :param backend: property backend name (None for the steam tables)
+    :param cache: True to leave the state cache on while timing
+    :return: report dict with the settings and one result per benchmark
+    """
+    was_enabled = state_cache.enabled
+    state_cache.configure(enabled=cache)
+    try:
+        results = {}
+        for name, (fun, inputs) in benchmarks(backend).items():
+            if names and not any(part in name for part in names):
+                continue
+            results[name] = time_calls(fun, inputs, iterations)
+    finally:
+        state_cache.configure(enabled=was_enabled)
+    return {'timestamp': datetime.datetime.now().isoformat(timespec='seconds'), 'python': sys.version.split()[0],
+            'backend': backend, 'cache': cache, 'iterations': iterations, 'results': results}
+
+
+def compare(report, baseline, threshold=THRESHOLD):
+    """
+    Compares a report with an earlier one.
+    :param threshold: allowed fractional drop in ops/s
+    :return: list of (name, baseline ops/s, current ops/s) for the benchmarks that regressed
+    """
+    regressions = []
+    for name, result in report['results'].items():
+        before = baseline['results'].get(name)
+        if before is not None and result['ops_per_sec'] < (1 - threshold) * before['ops_per_sec']:
+            regressions.append((name, before['ops_per_sec'], result['ops_per_sec']))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmarks steam state resolution and Rankine cycles.')
+    parser.add_argument('--filter', nargs='+', help='only run benchmarks whose name contains one of these')
+    parser.add_argument('--iterations', type=int, default=ITERATIONS, help='timed calls per benchmark')
+    parser.add_argument('--backend', help='property backend (see Steam_backends.py), default: the steam tables')
+    parser.add_argument('--cache', action='store_true', help='leave the state cache on while timing')
+    parser.add_argument('-o', '--output', help='write the report to this JSON file')
+    parser.add_argument('--compare', help='earlier JSON report to check for regressions')
+    parser.add_argument('--threshold', type=float, default=THRESHOLD,
+                        help='allowed fractional drop in ops/s before a benchmark counts as a regression')
+    args = parser.parse_args(argv)
+
+    report = run(args.filter, args.iterations, args.backend, args.cache)
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(report, json.load(f), args.threshold)
+        for name, before, after in regressions:
+            print('{}: {:.0f} ops/s, was {:.0f} ops/s ({:.0%} slower)'.format(name, after, before, 1 - after / before),
+                  file=sys.stderr)
+        return 1 if regressions else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
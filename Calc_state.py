@@ -1,10 +1,31 @@
-import numpy as np
-from scipy.interpolate import griddata
-from scipy.optimize import fsolve
-from pyXSteam.XSteam import XSteam
+import threading
+from Steam_sat import sat_props_P, sat_props_T
+from Steam_superheated import superheated_props
+from Steam_batch import calc_states, region_name, REGION_NONE
+from Steam_cache import state_cache
+from Steam_backends import get_backend
+import Steam_profile
+
+_xsteam = None
+_xsteam_lock = threading.Lock()
+
+
+def xsteam():
+    """
+    The shared pyXSteam calculator (m/kg/sec/C/bar/W units), for comparing against the tables.  pyXSteam is
+    imported and the calculator created on the first call only.
+    :return: XSteam
+    """
+    global _xsteam
+    if _xsteam is None:
+        with _xsteam_lock:
+            if _xsteam is None:
+                from pyXSteam.XSteam import XSteam
+                _xsteam = XSteam(XSteam.UNIT_SYSTEM_MKS)
+    return _xsteam
 
 class Steam_SI:
-    def __init__(self, P=None, T=None, x=None, v=None, h=None, s=None, name=None):
+    def __init__(self, P=None, T=None, x=None, v=None, h=None, s=None, name=None, backend=None):
         """
         This is a general steam class for sub-critical (i.e., superheated and saturated) properties of steam.
         The user may specify any two properties to calculate all other properties of the steam.
@@ -19,6 +40,8 @@ class Steam_SI:
         :param h: Enthalpy (kJ/kg)
         :param s: Entropy (kJ/(kg*K))
         :param name:
+        :param backend: None for the steam tables, or the name of a property backend from Steam_backends.py
+                        (e.g. 'if97' for the IAPWS-IF97 equations, which also cover compressed liquid)
         """
         self.P = P  # pressure - kPa
         self.T = T  # Temperature  - degrees C
@@ -28,11 +51,13 @@ class Steam_SI:
         self.s = s  # entropy - kJ/(kg K)
         self.name = name # a useful identifier
         self.region = None # 'superheated' or 'saturated'
+        self.backend = backend # None for the steam tables (see Steam_backends.py)
 
+    @Steam_profile.timed('Steam_SI.calc')
     def calc(self):
         """
         In principle, there are 15 cases to handle any pair of variables.  I depend on user to specify proper set of variables
-        :return: True if properties calculated
+        :return: True if properties calculated, False if the pair is incomplete or has no solution in the tables
         """
         #region select case
         case=None
@@ -75,39 +100,42 @@ class Steam_SI:
             return False
         # my 15 cases are:  PT, Px, Pv, Ph, Ps, Tx, Tv, Th, Ts, xv, xh, xs, vh, vs, hs
         #endregion
+        if Steam_profile.enabled:
+            Steam_profile.count('Steam_SI case ' + case)
 
-        st=XSteam(XSteam.UNIT_SYSTEM_MKS)  # m/kg/sec/°C/bar/W
-        # Read the saturated table data
-        tscol, pscol, hfcol, hgcol, sfcol, sgcol, vfcol, vgcol = np.loadtxt('sat_water_table.txt', skiprows=1, unpack=True)
-        # Read the superheated water table
-        tcol, hcol, scol, pcol = np.loadtxt('superheated_water_table.txt', skiprows=1, unpack=True)
-        R=8.314 #kJ/kmol*K
-        MW=18.0 #kg/kmol
-        RW=R/MW
-        # ideal gas law V=RT/P-> v=(R/MW)*(T+273)/(P)
-        # calculate a column of specific volume for the superheated water table using ideal gas
-        vcol=[RW*(tcol[nI]+273)/pcol[nI] for nI in range(len(pcol))]
+        # repeated states come from the LRU cache (see Steam_cache.py)
+        if not state_cache.enabled:
+            return self._calc_case(case)
+        given = (getattr(self, case[0]), getattr(self, case[1]))
+        kind = 'Steam_SI' if self.backend is None else 'Steam_SI/' + get_backend(self.backend).name
+        key = state_cache.key(kind, case, given)
+        cached = state_cache.get(key)
+        if cached is not None:
+            self.P, self.T, self.x, self.h, self.s, self.v, self.region, result = cached
+            setattr(self, case[0], given[0])
+            setattr(self, case[1], given[1])
+            return result
+        result = self._calc_case(case)
+        state_cache.put(key, (self.P, self.T, self.x, self.h, self.s, self.v, self.region, result))
+        return result
 
+    @Steam_profile.timed('Steam_SI case calculation')
+    def _calc_case(self, case):
+        """
+        Calculates the properties for one of the 15 cases (see calc)
+        :param case: the pair of given properties, e.g. 'Ph'
+        :return: True if properties calculated
+        """
+        if self.backend is not None:
+            return self._calc_batch(case, get_backend(self.backend))
+        # The table data is loaded once and shared (see Steam_tables.py).  Saturated properties come from the splines
+        # in Steam_sat.py and superheated properties from the cached triangulations in Steam_superheated.py
         #region calculate properties based on case
         # if P given (easy to check saturated vs. superheated)
         if case.__contains__("P"):
             # at the known pressure, get saturated liq and vap properties
-            sfval = float(griddata(pscol, sfcol, self.P / 100, method='cubic'))
-            sgval = float(griddata(pscol, sgcol, self.P / 100, method='cubic'))
-            vfval = float(griddata(pscol, vfcol, self.P / 100, method='cubic'))
-            vgval = float(griddata(pscol, vgcol, self.P / 100, method='cubic'))
-            hfval = float(griddata(pscol, hfcol, self.P / 100, method='cubic'))
-            hgval = float(griddata(pscol, hgcol, self.P / 100, method='cubic'))
-            tsat = float(griddata(pscol, tscol, self.P / 100, method='cubic'))
-
-            # this is a test of pyXSteam.  With cubic interpolation on tables, pretty good match
-            sL=st.sL_p(self.P/100)
-            sV=st.sV_p(self.P/100)
-            vL=st.vL_p(self.P/100)
-            vV=st.vV_p(self.P/100)
-            hL=st.hL_p(self.P/100)
-            hV=st.hV_p(self.P/100)
-            t_sat=st.tsat_p(self.P/100)
+            # all seven saturated properties from one evaluation of the saturation splines (see Steam_sat.py)
+            tsat, hfval, hgval, sfval, sgval, vfval, vgval = sat_props_P(self.P / 100)
 
             if case.__contains__("x"):  #quality given
 
@@ -129,9 +157,8 @@ class Steam_SI:
                 else:  #superheated
                     self.region = "superheated"
                     self.x=1.0
-                    self.T = float(griddata((vcol, pcol), tcol, (self.v, self.P), method='cubic'))
-                    self.h = float(griddata((vcol, pcol), hcol, (self.v, self.P), method='cubic'))
-                    self.s = float(griddata((vcol, pcol), scol, (self.v, self.P), method='cubic'))
+                    P, T, h, s, v = superheated_props('Pv', self.P, self.v)  # one cached interpolator gives every property
+                    self.T, self.h, self.s = T, h, s
                     return True
             if case.__contains__("h"):  #find if saturated or superheated
                 xval=(self.h-hfval)/(hgval-hfval)
@@ -145,9 +172,8 @@ class Steam_SI:
                 else:  #superheated
                     self.region = "superheated"
                     self.x=1.0
-                    self.T = float(griddata((hcol, pcol), tcol, (self.h, self.P), method='cubic'))
-                    self.v = float(griddata((hcol, pcol), vcol, (self.h, self.P), method='cubic'))
-                    self.s = float(griddata((hcol, pcol), scol, (self.h, self.P), method='cubic'))
+                    P, T, h, s, v = superheated_props('Ph', self.P, self.h)  # one cached interpolator gives every property
+                    self.T, self.v, self.s = T, v, s
                     return True
             if case.__contains__("s"):  # find if saturated or superheated
                 xval = (self.s - sfval) / (sgval - sfval)
@@ -161,9 +187,8 @@ class Steam_SI:
                 else:  # superheated
                     self.region = "superheated"
                     self.x=1.0
-                    self.T = float(griddata((scol, pcol), tcol, (self.s, self.P), method='cubic'))
-                    self.h = float(griddata((scol, pcol), hcol, (self.s, self.P), method='cubic'))
-                    self.v = float(griddata((scol, pcol), vcol, (self.s, self.P), method='cubic'))
+                    P, T, h, s, v = superheated_props('Ps', self.P, self.s)  # one cached interpolator gives every property
+                    self.T, self.h, self.v = T, h, v
                     return True
             if case.__contains__("T"):  # find if satruated or superheated steam
                 if self.T==tsat:  # generally, this is an indeterminate case, but assume saturated vapor
@@ -176,14 +201,13 @@ class Steam_SI:
                 elif self.T>tsat:  #superheated
                     self.region = "superheated"
                     self.x=1.0
-                    self.v = float(griddata((tcol, pcol), vcol, (self.T, self.P), method='cubic'))
-                    self.h = float(griddata((tcol, pcol), hcol, (self.T, self.P), method='cubic'))
-                    self.s = float(griddata((tcol, pcol), scol, (self.T, self.P), method='cubic'))
+                    P, T, h, s, v = superheated_props('PT', self.P, self.T)  # one cached interpolator gives every property
+                    self.v, self.h, self.s = v, h, s
                     return True
                 else: # sub-cooled, so estimate properties
                     self.region = "saturated"
                     self.x=0
-                    psat= float(griddata(tscol, pscol, self.T))*100
+                    psat= sat_props_T(self.T)[0]*100
                     self.h=hfval+(self.P-psat)*vfval
                     self.s=sfval
                     self.v=vfval
@@ -192,13 +216,7 @@ class Steam_SI:
         if case.__contains__("T"):
             # Using the known Temperature, interpolate on the saturation tables columns
             # at the known pressure
-            sfval = float(griddata(tscol, sfcol, self.T, method='cubic'))
-            sgval = float(griddata(tscol, sgcol, self.T, method='cubic'))
-            vfval = float(griddata(tscol, vfcol, self.T, method='cubic'))
-            vgval = float(griddata(tscol, vgcol, self.T, method='cubic'))
-            hfval = float(griddata(tscol, hfcol, self.T, method='cubic'))
-            hgval = float(griddata(tscol, hgcol, self.T, method='cubic'))
-            psat = float(griddata(tscol, pscol, self.T, method='cubic'))
+            psat, hfval, hgval, sfval, sgval, vfval, vgval = sat_props_T(self.T)
             if case.__contains__("x"):  # quality given
                 self.region = "saturated"
                 self.P = psat*100
@@ -218,9 +236,8 @@ class Steam_SI:
                 else:  # superheated
                     self.region = "superheated"
                     self.x=1.0
-                    self.P = float(griddata((vcol, tcol), pcol, (self.v, self.T), method='cubic'))
-                    self.h = float(griddata((vcol, tcol), hcol, (self.v, self.T), method='cubic'))
-                    self.s = float(griddata((vcol, tcol), scol, (self.v, self.T), method='cubic'))
+                    P, T, h, s, v = superheated_props('Tv', self.T, self.v)  # one cached interpolator gives every property
+                    self.P, self.h, self.s = P, h, s
                     return True
             if case.__contains__("h"):  # find if saturated or superheated
                 xval = (self.h - hfval) / (hgval - hfval)
@@ -234,9 +251,8 @@ class Steam_SI:
                 else:  # superheated
                     self.region = "superheated"
                     self.x=1.0
-                    self.P = float(griddata((hcol, tcol), pcol, (self.h, self.T), method='cubic'))
-                    self.s = float(griddata((hcol, tcol), scol, (self.h, self.T), method='cubic'))
-                    self.v = float(griddata((hcol, tcol), vcol, (self.h, self.T), method='cubic'))
+                    P, T, h, s, v = superheated_props('Th', self.T, self.h)  # one cached interpolator gives every property
+                    self.P, self.s, self.v = P, s, v
                     return True
             if case.__contains__("s"):  # find if saturated or superheated
                 xval = (self.s - sfval) / (sgval - sfval)
@@ -250,182 +266,50 @@ class Steam_SI:
                 else:  # superheated
                     self.region = "superheated"
                     self.x=1.0
-                    self.P = float(griddata((scol, tcol), pcol, (self.s, self.T), method='cubic'))
-                    self.h = float(griddata((scol, tcol), hcol, (self.s, self.T), method='cubic'))
-                    self.v = float(griddata((scol, tcol), vcol, (self.s, self.T), method='cubic'))
+                    P, T, h, s, v = superheated_props('Ts', self.T, self.s)  # one cached interpolator gives every property
+                    self.P, self.h, self.v = P, h, v
                     return True
             return
-        # if quality given (easy case) for saturated
-        if case.__contains__("x"):
-            self.region = "saturated"
-            if case.__contains__("v"):  #find if saturated or superheated
-                def findPsat_v(P):  #note: P in bar
-                    vfval = float(griddata(pscol, vfcol, P, method='cubic'))
-                    vgval = float(griddata(pscol, vgcol, P, method='cubic'))
-                    vcalc=self.x*(vgval-vfval)+vfval
-                    diff=self.v-vcalc
-                    return diff
-                self.P=100*fsolve(findPsat_v,[1])[0]  # find the pressure
-                sfval = float(griddata(pscol, sfcol, self.P / 100, method='cubic'))
-                sgval = float(griddata(pscol, sgcol, self.P / 100, method='cubic'))
-                vfval = float(griddata(pscol, vfcol, self.P / 100, method='cubic'))
-                vgval = float(griddata(pscol, vgcol, self.P / 100, method='cubic'))
-                hfval = float(griddata(pscol, hfcol, self.P / 100, method='cubic'))
-                hgval = float(griddata(pscol, hgcol, self.P / 100, method='cubic'))
-                tsat = float(griddata(pscol, tscol, self.P / 100, method='cubic'))
-                self.T = tsat
-                self.s = self.x * (sgval - sfval) + sfval
-                self.h = self.x * (hgval - hfval) + hfval
-                return True
-            if case.__contains__("h"):  #find if saturated or superheated
-                def findPsat_h(P):  #note: P in bar
-                    hfval = float(griddata(pscol, hfcol, P))
-                    hgval = float(griddata(pscol, hgcol, P))
-                    hcalc=self.x*(hgval-hfval)+hfval
-                    return self.h-hcalc
-                self.P=100*fsolve(findPsat_h,[1])[0]  # find the pressure
-                sfval = float(griddata(pscol, sfcol, self.P / 100, method='cubic'))
-                sgval = float(griddata(pscol, sgcol, self.P / 100, method='cubic'))
-                vfval = float(griddata(pscol, vfcol, self.P / 100, method='cubic'))
-                vgval = float(griddata(pscol, vgcol, self.P / 100, method='cubic'))
-                hfval = float(griddata(pscol, hfcol, self.P / 100, method='cubic'))
-                hgval = float(griddata(pscol, hgcol, self.P / 100, method='cubic'))
-                tsat = float(griddata(pscol, tscol, self.P / 100, method='cubic'))
-                self.T = tsat
-                self.s = self.x * (sgval - sfval) + sfval
-                self.v = self.x * (vgval - vfval) + vfval
-                return True
-            if case.__contains__("s"):  # find if saturated or superheated
-                def findPsat_s(P):  #note: P in bar
-                    sfval = float(griddata(pscol, sfcol, P, method='cubic'))
-                    sgval = float(griddata(pscol, sgcol, P, method='cubic'))
-                    stest=self.x*(sgval-sfval)+sfval
-                    return self.s-stest
-                self.P=100*fsolve(findPsat_s,[1])[0]  # find the pressure
-                sfval = float(griddata(pscol, sfcol, self.P / 100, method='cubic'))
-                sgval = float(griddata(pscol, sgcol, self.P / 100, method='cubic'))
-                vfval = float(griddata(pscol, vfcol, self.P / 100, method='cubic'))
-                vgval = float(griddata(pscol, vgcol, self.P / 100, method='cubic'))
-                hfval = float(griddata(pscol, hfcol, self.P / 100, method='cubic'))
-                hgval = float(griddata(pscol, hgcol, self.P / 100, method='cubic'))
-                tsat = float(griddata(pscol, tscol, self.P / 100, method='cubic'))
-                self.T = tsat
-                self.h = self.x * (hgval - hfval) + hfval
-                self.v = self.x * (vgval - vfval) + vfval
-                return True
-            return
-        # if vh, vs, or hs (searching required to determine if saturated)
-        if case.__contains__("v"):
-            vcritical=float(griddata(pscol, vfcol, max(pscol), method='cubic'))
-            twophase=False
-            if self.v<vcritical:
-                twophase=True
-            else:  #might be two-phase
-                tmax = float(griddata(vgcol, tscol, self.v, method='cubic'))  # temperature for x=1
-                if case.__contains__("h"):
-                    hgsat= float(griddata(tscol, hgcol, tmax, method='cubic'))
-                    if self.h<=hgsat:  # means two phase
-                        twophase=True
-                else:
-                    sgsat= float(griddata(tscol, sgcol, tmax, method='cubic'))
-                    if self.s<=sgsat:  # means two phase
-                        twophase=True
-            if twophase:
-                self.region = "saturated"
-                if case.__contains__("h"):
-                    tmax=max(tscol)
-                    def findTSat_h(T):
-                        hfsat=float(griddata(tscol, hfcol, T, method='cubic'))
-                        hgsat=float(griddata(tscol, hgcol, T, method='cubic'))
-                        vfsat=float(griddata(tscol, vfcol, T, method='cubic'))
-                        vgsat=float(griddata(tscol, vgcol, T, method='cubic'))
-                        xv=(self.v-vfsat)/(vgsat-vfsat)
-                        xh=(self.h-hfsat)/(hgsat-hfsat)
-                        return xh-xv if T<tmax else 100
-                    self.T=fsolve(findTSat_h, 100)[0]
-                    sfval = float(griddata(tscol, sfcol, self.T, method='cubic'))
-                    sgval = float(griddata(tscol, sgcol, self.T, method='cubic'))
-                    vfval = float(griddata(tscol, vfcol, self.T, method='cubic'))
-                    vgval = float(griddata(tscol, vgcol, self.T, method='cubic'))
-                    psat = float(griddata(tscol, pscol, self.T, method='cubic'))
-                    self.x=(self.v-vfval)/(vgval-vfval)
-                    self.P=psat*100
-                    self.s=self.x*(sgval-sfval)+sfval
-                    return True
-                if case.__contains__("s"):
-                    tmax=max(tscol)
-                    def findTSat_s(T):
-                        sfsat=float(griddata(tscol, sfcol, T, method='cubic'))
-                        sgsat=float(griddata(tscol, sgcol, T, method='cubic'))
-                        vfsat=float(griddata(tscol, vfcol, T, method='cubic'))
-                        vgsat=float(griddata(tscol, vgcol, T, method='cubic'))
-                        xv=(self.v-vfsat)/(vgsat-vfsat)
-                        xs=(self.s-sfsat)/(sgsat-sfsat)
-                        return xs-xv if T<tmax else 100
-                    self.T=fsolve(findTSat_s, 100)[0]
-                    vfval = float(griddata(tscol, vfcol, self.T, method='cubic'))
-                    vgval = float(griddata(tscol, vgcol, self.T, method='cubic'))
-                    hfval = float(griddata(tscol, hfcol, self.T, method='cubic'))
-                    hgval = float(griddata(tscol, hgcol, self.T, method='cubic'))
-                    psat = float(griddata(tscol, pscol, self.T, method='cubic'))
-                    self.x=(self.v-vfval)/(vgval-vfval)
-                    self.P=psat*100
-                    self.h=self.x*(hgval-hfval)+hfval
-                    return True
-            else:  # means superheated
-                self.region = "superheated"
-                self.x = 1.0
-                if case.__contains__("h"):
-                    self.P = float(griddata((vcol, hcol), pcol, (self.v, self.h), method='cubic'))
-                    self.T = float(griddata((vcol, hcol), tcol, (self.v, self.h), method='cubic'))
-                    self.s = float(griddata((vcol, hcol), scol, (self.v, self.h), method='cubic'))
-                    return True
-                if case.__contains__("s"):
-                    self.P = float(griddata((vcol, scol), pcol, (self.v, self.s), method='cubic'))
-                    self.T = float(griddata((vcol, scol), tcol, (self.v, self.s), method='cubic'))
-                    self.h = float(griddata((vcol, scol), hcol, (self.v, self.s), method='cubic'))
-                    return True
-                return True
-        if case.__contains__("h"):
-            hcritical=float(griddata(pscol, hfcol, max(pscol), method='cubic'))
-            twophase=False
-            if self.h<hcritical:
-                twophase=True
-            else:  #might be two-phase
-                tmax = float(griddata(hgcol, tscol, self.h, method='cubic'))  # temperature for x=1
-                sgsat= float(griddata(tscol, sgcol, tmax, method='cubic'))
-                if self.s<=sgsat:  # means two phase
-                    twophase=True
-            if twophase:
-                self.region="saturated"
-                tmax = max(tscol)
-
-                def findTSat_s(T):
-                    sfsat=float(griddata(tscol, sfcol, T, method='cubic'))
-                    sgsat=float(griddata(tscol, sgcol, T, method='cubic'))
-                    hfsat=float(griddata(tscol, hfcol, T, method='cubic'))
-                    hgsat=float(griddata(tscol, hgcol, T, method='cubic'))
-                    xs=(self.s-sfsat)/(sgsat-sfsat)
-                    xh=(self.h-hfsat)/(hgsat-hfsat)
-                    return xs-xh if T<tmax else 100
-                self.T=fsolve(findTSat_s, 100)[0]
-                vfval = float(griddata(tscol, vfcol, self.T, method='cubic'))
-                vgval = float(griddata(tscol, vgcol, self.T, method='cubic'))
-                hfval = float(griddata(tscol, hfcol, self.T, method='cubic'))
-                hgval = float(griddata(tscol, hgcol, self.T, method='cubic'))
-                psat = float(griddata(tscol, pscol, self.T, method='cubic'))
-                self.x=(self.h-hfval)/(hgval-hfval)
-                self.P=psat*100
-                self.v=self.x*(vgval-vfval)+vfval
-                return True
-            else:  # means superheated
-                self.region="superheated"
-                self.P = float(griddata((hcol, scol), pcol, (self.h, self.s), method='cubic'))
-                self.T = float(griddata((hcol, scol), tcol, (self.h, self.s), method='cubic'))
-                self.v = float(griddata((hcol, scol), vcol, (self.h, self.s), method='cubic'))
-                return True
+        # The remaining cases (xv, xh, xs, vh, vs, hs) need a search along the saturation curve.  The bracketed
+        # solver in Steam_inverse.py is shared with the batch code, so resolve this state as a batch of one.
+        return self._calc_batch(case)
         #endregion
 
+    def _calc_batch(self, case, backend=None):
+        """
+        Resolves the state as a batch of one, with the table batch code or a property backend
+        :param case: the pair of given properties, e.g. 'hs'
+        :param backend: a Steam_backends.PropertyBackend, or None for Steam_batch.calc_states
+        :return: True if properties calculated
+        """
+        a, b = [getattr(self, case[0])], [getattr(self, case[1])]
+        state = (calc_states(case, a, b) if backend is None else backend.calc_states(case, a, b))[0]
+        if state['region'] == REGION_NONE:  # no solution in the tables (or outside the backend's range)
+            self.region = None
+            return False
+        self.P, self.T, self.x, self.h, self.s, self.v = (float(state[c]) for c in 'PTxhsv')
+        self.region = region_name(state['region'])
+        return True
+
+    @staticmethod
+    def calc_many(case, a, b, method='cubic', backend=None):
+        """
+        Vectorized version of calc for many states given by the same pair of properties (see Steam_batch.py).
+        For example, Steam_SI.calc_many('Ph', P_array, h_array)
+        :param case: one of the 15 cases handled by calc (PT, Px, Pv, Ph, Ps, Tx, Tv, Th, Ts, xv, xh, xs, vh, vs, hs)
+        :param a: array of the first property of case
+        :param b: array of the second property of case
+        :param method: 'cubic' (same as calc), 'linear', or 'fast'/'fast_linear' to use the precomputed grids
+                       (see Steam_superheated.superheated_props)
+        :param backend: None for the steam tables (with method), or the name of a property backend from
+                        Steam_backends.py, e.g. 'if97'
+        :return: structured array with fields P, T, x, h, s, v and region (0=unresolved, 1=saturated, 2=superheated,
+                 3=compressed liquid, 4=supercritical; see Steam_batch.REGION_NAMES)
+        """
+        if backend is not None:
+            return get_backend(backend).calc_states(case, a, b)
+        return calc_states(case, a, b, method)
+
     def print(self):
         if self.name is not None:
             print('Name: {}'.format(self.name))
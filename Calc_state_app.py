@@ -1,11 +1,14 @@
 # Team: Christy Cravens, Robert Lucas, and Gabe Moya
 
+import functools
 import numpy as np
 
 from Calc_state import Steam_SI as steam  #import any of your own classes as you wish
+from Steam_backends import backend_names
+from Calc_worker import CalcRunner
 
 import sys
-from PyQt5.QtWidgets import QWidget, QApplication
+from PyQt5.QtWidgets import QWidget, QApplication, QComboBox, QLabel
 from PyQt5.QtWidgets import QFileDialog,QMessageBox
 from PyQt5.QtGui import QCursor
 from PyQt5.QtCore import Qt
@@ -25,6 +28,19 @@ class main_window(QWidget, Ui_Form):
         #create a list of the check boxes on the main window
         self.checkBoxes=[self.chk_Press, self.chk_Temp, self.chk_Quality, self.chk_Enthalpy, self.chk_Entropy, self.chk_SpV]
 
+        #choice of property backend (see Steam_backends.py), added here so Calc_state_gui.py stays generated
+        self.lbl_Backend=QLabel('Properties from:', self.groupBox)
+        self.cmb_Backend=QComboBox(self.groupBox)
+        for name in backend_names():
+            self.cmb_Backend.addItem(name, None if name == 'table' else name)  # None keeps Steam_SI's own table code
+        self.gridLayout.addWidget(self.lbl_Backend, 0, 0, 1, 1)
+        self.gridLayout.addWidget(self.cmb_Backend, 0, 1, 1, 1)
+
+        #calculations run on a worker thread (see Calc_worker.py) and come back to show_state
+        self.runner=CalcRunner(self)
+        self.runner.result.connect(self.show_state)
+        self.runner.failed.connect(self.show_error)
+
         self.assign_widgets()  #connects signals and slots
         self.show()
 
@@ -33,32 +49,80 @@ class main_window(QWidget, Ui_Form):
         self.pushButton_Exit.clicked.connect(self.ExitApp)
         # connect clicked signal of pushButton_Calculate to self.Calculate
         self.pushButton_Calculate.clicked.connect(self.Calculate)
+        # recalculate automatically when the user edits a value, checks a box or picks another backend
+        for le in (self.le_P, self.le_T, self.le_Q, self.le_H, self.le_S, self.le_SpV):
+            le.textEdited.connect(self.Recalculate)  # textEdited (unlike textChanged) ignores our own setText
+        for c in self.checkBoxes:
+            c.toggled.connect(self.Recalculate)
+        self.cmb_Backend.currentIndexChanged.connect(self.Recalculate)
 
-    def Calculate(self):
+    def read_inputs(self):
         """
         Here, we need to scan through the check boxes and ensure that only two are selected a defining properties
-        for calculating the state of the steam.  Then set the properties of the steam object and calculate the
-        steam state.  Finally, output the results to the line edit widgets.
-        :return:
+        for calculating the state of the steam.
+        :return: dict of the two checked properties for Steam_SI, or None if not exactly two boxes are checked or a
+                 checked value is not a number (e.g., while it is being typed)
         """
         #make sure only two boxes checked
         nChecked=0
         for c in self.checkBoxes:
             nChecked+= 1 if c.isChecked() else 0
         if nChecked!=2:
-            return
+            return None
 
         # If checked, turn the value in the text box into a floating point number
-        # Otherwise, leave it as is to fill in after calculated
-        self.Steam.P= float(self.le_P.text()) if self.chk_Press.isChecked() else None # read from appropriate line edit and convert to floating point number if box checked, otherwise set to None
-        self.Steam.T= float(self.le_T.text()) if self.chk_Temp.isChecked() else None # read from appropriate line edit and convert to floating point number if box checked, otherwise set to None
-        self.Steam.x= float(self.le_Q.text()) if self.chk_Quality.isChecked() else None # read from appropriate line edit and convert to floating point number if box checked, otherwise set to None
-        self.Steam.h= float(self.le_H.text()) if self.chk_Enthalpy.isChecked() else None # read from appropriate line edit and convert to floating point number if box checked, otherwise set to None
-        self.Steam.s= float(self.le_S.text()) if self.chk_Entropy.isChecked() else None # read from appropriate line edit and convert to floating point number if box checked, otherwise set to None
-        self.Steam.v= float(self.le_SpV.text()) if self.chk_SpV.isChecked() else None # read from appropriate line edit and convert to floating point number if box checked, otherwise set to None
+        # Otherwise, leave it out to fill in after calculated
+        boxes={'P': (self.chk_Press, self.le_P), 'T': (self.chk_Temp, self.le_T), 'x': (self.chk_Quality, self.le_Q),
+               'h': (self.chk_Enthalpy, self.le_H), 's': (self.chk_Entropy, self.le_S), 'v': (self.chk_SpV, self.le_SpV)}
+        inputs={}
+        try:
+            for prop, (chk, le) in boxes.items():
+                if chk.isChecked():
+                    inputs[prop]=float(le.text())
+        except ValueError:
+            return None
+        return inputs
+
+    @staticmethod
+    def calc_state(inputs, backend):
+        """
+        Calculates the steam state.  This runs on the worker thread, so it uses its own Steam_SI object.
+        :param inputs: the two given properties (see read_inputs)
+        :param backend: the selected property backend
+        :return: the Steam_SI object, or None if the state could not be calculated
+        """
+        state=steam(backend=backend, **inputs)
+        return state if state.calc() else None
 
-        self.Steam.calc()
+    def Calculate(self):
+        """
+        Reads the two checked properties and calculates the steam state on the worker thread.  The results are
+        output to the line edit widgets by show_state.
+        :return:
+        """
+        inputs=self.read_inputs()
+        if inputs is None:
+            return
+        self.runner.submit(functools.partial(self.calc_state, inputs, self.cmb_Backend.currentData()))
+
+    def Recalculate(self):
+        """
+        Calculates again once the user pauses typing; a calculation still running for the old inputs is dropped.
+        """
+        inputs=self.read_inputs()
+        if inputs is None:
+            self.runner.cancel()
+            return
+        self.runner.schedule(functools.partial(self.calc_state, inputs, self.cmb_Backend.currentData()))
 
+    def show_state(self, state):
+        """
+        Receives a calculated state from the worker thread.
+        """
+        if state is None:
+            self.lbl_Properties.setText('no solution for these properties')
+            return
+        self.Steam=state
 
         # set the text in each line edit and the label should tell the state 'saturated' or 'superheated'
         # Need to tell the code to input the calculated values into the text boxes for display, rounded to 4 decimals
@@ -79,8 +143,15 @@ class main_window(QWidget, Ui_Form):
 
         return
 
+    def show_error(self, message):
+        self.lbl_Properties.setText(message)
+
+    def closeEvent(self, event):
+        self.runner.shutdown()  # let a running calculation finish before the window goes away
+        super().closeEvent(event)
 
     def ExitApp(self):
+        self.runner.shutdown()
         app.exit()
 
 if __name__ == "__main__":
@@ -0,0 +1,131 @@
+# Runs the calculations of the GUIs (Calc_state_app.py, Rankine_app.py) on a worker thread so the window stays
+# responsive, with results coming back through signals.  Only the result of the newest request is delivered: a
+# request made while an older one is queued or running makes the older one stale, and its result is dropped.
+
+from PyQt5.QtCore import QObject, QRunnable, QThreadPool, QTimer, pyqtSignal
+
+DEBOUNCE_MS = 300  # typing pause before an automatic recalculation starts
+
+
+class _WorkerSignals(QObject):
+    done = pyqtSignal(int, object)  # request number, result
+    error = pyqtSignal(int, str)  # request number, message
+    finished = pyqtSignal(int)  # request number, after done, error or a cancelled run
+
+
+class CalcWorker(QRunnable):
+    def __init__(self, request, fun):
+        """
+        One calculation for a QThreadPool.
+        :param request: the request number, passed back with the result
+        :param fun: function without arguments that does the calculation and returns the result.  It runs on the
+                    worker thread, so it must build its own objects rather than touch the GUI or the GUI's objects.
+        """
+        super().__init__()
+        self.request = request
+        self.fun = fun
+        self.cancelled = False
+        self.signals = _WorkerSignals()
+
+    def run(self):
+        try:
+            if self.cancelled:  # made stale while still queued
+                return
+            try:
+                result = self.fun()
+            except Exception as e:
+                self.signals.error.emit(self.request, '{}: {}'.format(type(e).__name__, e))
+                return
+            self.signals.done.emit(self.request, result)
+        finally:
+            self.signals.finished.emit(self.request)
+
+
+class CalcRunner(QObject):
+    result = pyqtSignal(object)  # the result of the newest request
+    failed = pyqtSignal(str)  # the error of the newest request
+
+    def __init__(self, parent=None, delay=DEBOUNCE_MS):
+        """
+        Runs calculations one at a time on a private thread pool and delivers the newest result.
+        :param parent: the owning QObject (e.g., the main window)
+        :param delay: milliseconds schedule() waits for further changes before starting
+        """
+        super().__init__(parent)
+        self.pool = QThreadPool(self)
+        self.pool.setMaxThreadCount(1)  # requests run in order; stale queued ones are skipped
+        self.delay = delay
+        self.stale = 0  # results dropped because a newer request was made
+        self._latest = 0
+        self._workers = {}  # request number -> CalcWorker, until it has finished
+        self._pending = None
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._start_pending)
+
+    def submit(self, fun):
+        """
+        Starts a calculation now, making every earlier request stale.
+        :param fun: function without arguments run on the worker thread (see CalcWorker)
+        :return: the request number
+        """
+        self._timer.stop()
+        self._pending = None
+        self.cancel()
+        worker = CalcWorker(self._latest, fun)
+        worker.signals.done.connect(self._done)
+        worker.signals.error.connect(self._error)
+        worker.signals.finished.connect(self._finished)
+        self._workers[worker.request] = worker  # keeps the Python object alive while the pool runs it
+        self.pool.start(worker)
+        return worker.request
+
+    def schedule(self, fun):
+        """
+        Starts a calculation once no further schedule() call has come for delay ms (e.g., while the user types).
+        Earlier requests are stale from now on.
+        """
+        self.cancel()
+        self._pending = fun
+        self._timer.start(self.delay)
+
+    def cancel(self):
+        """
+        Makes every queued or running request stale: queued ones are skipped, running ones are left to finish
+        (a calculation cannot be interrupted) and their results dropped.
+        """
+        self._timer.stop()
+        self._pending = None
+        for worker in self._workers.values():
+            worker.cancelled = True
+        self._latest += 1
+
+    def shutdown(self):
+        """
+        Cancels everything and waits for a running calculation to finish (call before the window closes).
+        """
+        self.cancel()
+        self.pool.waitForDone()
+
+    def busy(self):
+        return any(not worker.cancelled for worker in self._workers.values())
+
+    def _start_pending(self):
+        fun = self._pending
+        if fun is not None:
+            self.submit(fun)
+
+    def _done(self, request, result):
+        if request == self._latest:
+            self.result.emit(result)
+        else:
+            self.stale += 1
+
+    def _error(self, request, message):
+        if request == self._latest:
+            self.failed.emit(message)
+        else:
+            self.stale += 1
+
+    def _finished(self, request):
+        self._workers.pop(request, None)
@@ -0,0 +1,98 @@
+# Measures how long importing Calc_state and Rankine takes in a fresh interpreter and reports it as JSON
+#
+#   python Import_time.py                          print the report
+#   python Import_time.py --history imports.jsonl  also append it to a history file (one JSON report per line)
+#   python Import_time.py --max-seconds 0.5        exit with status 1 if any median is slower
+
+import argparse
+import datetime
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = ('Calc_state', 'Rankine')
+HEAVY_MODULES = ('scipy', 'matplotlib', 'pyXSteam', 'PyQt5')  # dependencies that should load only when used
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+_PROBE = """
+import sys, time, json
+start = time.perf_counter()
+import {module}
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'loaded': [m for m in {heavy!r} if m in sys.modules]}}))
+"""
+
+
+def _run(args):
+    env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    return subprocess.run([sys.executable] + args, cwd=REPO_DIR, env=env, capture_output=True, text=True, check=True)
+
+
+def measure(module, repeat=5):
+    """
+    Imports a module in repeat fresh interpreters.
+    :param module: module name, e.g. 'Calc_state'
+    :param repeat: number of interpreters
+    :return: dict with the median, min and max import time (s), the heavy modules the import loaded and the
+             slowest imports underneath it (from python -X importtime)
+    """
+    probe = _PROBE.format(module=module, heavy=HEAVY_MODULES)
+    _run(['-c', probe])  # the first run writes the .pyc files, which later starts reuse
+    runs = [json.loads(_run(['-c', probe]).stdout) for i in range(repeat)]
+    times = [run['seconds'] for run in runs]
+    return {'median': statistics.median(times), 'min': min(times), 'max': max(times), 'repeat': repeat,
+            'loaded': runs[-1]['loaded'], 'slowest': slowest_imports(module)}
+
+
+def slowest_imports(module, count=5):
+    """
+    :return: the top level packages that take longest to import with module, as {name: cumulative seconds}
+    """
+    stderr = _run(['-X', 'importtime', '-c', 'import ' + module]).stderr
+    totals = {}
+    for line in stderr.splitlines():
+        # lines look like "import time:       774 |     679428 | scipy.interpolate"
+        parts = line.split('|')
+        if len(parts) != 3 or not parts[1].strip().isdigit():
+            continue
+        name = parts[2].strip()
+        if name == module or '.' in name:
+            continue
+        totals[name] = max(totals.get(name, 0.0), int(parts[1]) / 1e6)
+    return dict(sorted(totals.items(), key=lambda item: -item[1])[:count])
+
+
+def report(modules=MODULES, repeat=5):
+    """
+    :return: dict with one measurement per module plus the Python version and the time of the run
+    """
+    return {'timestamp': datetime.datetime.now().isoformat(timespec='seconds'), 'python': sys.version.split()[0],
+            'modules': {module: measure(module, repeat) for module in modules}}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measures the import time of the steam modules.')
+    parser.add_argument('--modules', nargs='+', default=list(MODULES), help='modules to import')
+    parser.add_argument('--repeat', type=int, default=5, help='fresh interpreters per module')
+    parser.add_argument('--history', help='append the report to this JSON lines file')
+    parser.add_argument('--max-seconds', type=float, help='fail if a median import time is above this')
+    args = parser.parse_args(argv)
+
+    result = report(args.modules, args.repeat)
+    print(json.dumps(result, indent=2))
+    if args.history:
+        with open(args.history, 'a') as f:
+            f.write(json.dumps(result) + '\n')
+    if args.max_seconds is not None:
+        slow = [m for m, r in result['modules'].items() if r['median'] > args.max_seconds]
+        for module in slow:
+            print('{} imports in {:.3f} s (limit {:.3f} s)'.format(module, result['modules'][module]['median'],
+                                                                  args.max_seconds), file=sys.stderr)
+        return 1 if slow else 0
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,20 +1,34 @@
 # This is Dr. Smay's code for Rankine, with a few necessary modifications to work with our code
 
-import numpy as np
-
 from Steam import steam
-import matplotlib.pyplot as plt
+from Rankine_plot import dome, cycle_TS
+from Rankine_sweep import sweep
+import Steam_profile
 
 class rankine():
-    def __init__(self, p_low=8, p_high=8000, eff_turbine=0.95, t_high=200, quality=1, name='Rankine Cycle'):
+    # the inputs each state is calculated from, and the states it is calculated from
+    _STATE_INPUTS = {'state1': ('p_high', 't_high', 'quality', 'backend'), 'state2s': ('p_low', 'backend'),
+                     'state2': ('p_low', 'eff_turbine', 'backend'), 'state3': ('p_low', 'backend'),
+                     'state4': ('p_high', 'backend')}
+    _STATE_DEPENDS = {'state2s': ('state1',), 'state2': ('state1', 'state2s'), 'state4': ('state3',)}
+    STATES = ('state1', 'state2s', 'state2', 'state3', 'state4')  # in the order they are calculated
+
+    def __init__(self, p_low=8, p_high=8000, eff_turbine=0.95, t_high=200, quality=1, name='Rankine Cycle',
+                 backend=None):
         '''
         Constructor for rankine power cycle.  If t_high is not specified, the State 1
         is assigned x=1 (saturated steam @ p_high).  Otherwise, use t_high to find State 1.
+        Changing an input later (e.g. cycle.eff_turbine=0.9) only recalculates the states that depend on it
+        the next time calc_efficiency is called; recompute_counts counts the calculations of each state.
         :param p_low: the low pressure isobar for the cycle in kPa
         :param p_high: the high pressure isobar for the cycle in kPa
         :param t_high: optional temperature for State1 (turbine inlet) in degrees C
         :param name: a convenient name
+        :param backend: None for the steam tables, or the name of a property backend from Steam_backends.py
+                        (e.g. 'if97' to use the IAPWS-IF97 equations for every state)
         '''
+        self._dirty=set(self.STATES) # states to (re)calculate in calc_efficiency
+        self.recompute_counts=dict.fromkeys(self.STATES, 0) # calculations of each state
         self.p_low=p_low
         self.p_high=p_high
         self.t_high=t_high
@@ -24,31 +38,80 @@ class rankine():
         self.pump_work=0
         self.heat_added=0
         self.state1=None
+        self.state2s=None
         self.state2=None
         self.state3=None
         self.state4=None
         self.quality=quality
         self.eff_turbine=eff_turbine # Rankine class modified to include a value for isentropic turbine efficiency
+        self.backend=backend # property backend used for every state (None for the steam tables)
+
+    def _input(name):
+        # an input of the cycle: setting it to a new value invalidates the states calculated from it
+        attr='_'+name
+
+        def get(self):
+            return getattr(self, attr)
 
+        def set(self, value):
+            if attr in self.__dict__ and getattr(self, attr)==value:
+                return
+            setattr(self, attr, value)
+            if name=='quality' and self.__dict__.get('_t_high') is not None:
+                return # the quality only matters for a saturated turbine inlet
+            self.invalidate(*[state for state, inputs in self._STATE_INPUTS.items() if name in inputs])
+        return property(get, set)
+
+    p_low=_input('p_low')
+    p_high=_input('p_high')
+    t_high=_input('t_high')
+    quality=_input('quality')
+    eff_turbine=_input('eff_turbine')
+    backend=_input('backend')
+    del _input
+
+    def invalidate(self, *states):
+        """
+        Marks states (and the states calculated from them) for recalculation.  With no arguments, every state.
+        """
+        todo=list(states or self.STATES)
+        while todo:
+            state=todo.pop()
+            if state not in self._dirty:
+                self._dirty.add(state)
+                todo.extend(s for s, depends in self._STATE_DEPENDS.items() if state in depends)
+        self.efficiency=None
+
+    def _calc_state(self, state):
+        self.recompute_counts[state]+=1
+        if state=='state1':
+            if(self.t_high==None):
+                return steam(self.p_high, x=self.quality, name='Turbine Inlet', backend=self.backend) # instantiate a steam object with conditions of state 1 as saturated steam, named 'Turbine Inlet'
+            return steam(self.p_high, T=self.t_high, name='Turbine Inlet', backend=self.backend) # instantiate a steam object with conditions of state 1 at t_high, named 'Turbine Inlet'
+        if state=='state2s':
+            return steam(self.p_low, s=self.state1.s, name="Turbine Exit", backend=self.backend) # instantiate a steam object with conditions of state 2, named 'Turbine Exit'
+        if state=='state2':
+            if self.eff_turbine < 1.0:  # eff=(h1-h2)/(h1-h2s) -> h2=h1-eff(h1-h2s)
+                h2=self.state1.h-self.eff_turbine*(self.state1.h-self.state2s.h)
+                return steam(self.p_low,h=h2, name="Turbine Exit", backend=self.backend)
+            return self.state2s
+        if state=='state3':
+            return steam(self.p_low, x=0, name='Pump Inlet', backend=self.backend) # instantiate a steam object with conditions of state 3 as saturated liquid, named 'Pump Inlet'
+        state4=steam(self.p_high, s=self.state3.s, name='Pump Exit', backend=self.backend)
+        state4.h=self.state3.h+self.state3.v*(self.p_high-self.p_low)
+        return state4
+
+    @Steam_profile.timed('rankine.calc_efficiency')
     def calc_efficiency(self):
-        #calculate the 4 states
+        #calculate the 4 states, only those whose inputs changed since the last call
         #state 1: turbine inlet (p_high, t_high) superheated or saturated vapor
-        if(self.t_high==None):
-            self.state1 = steam(self.p_high, x=self.quality, name='Turbine Inlet') # instantiate a steam object with conditions of state 1 as saturated steam, named 'Turbine Inlet'
-        else:
-            self.state1= steam(self.p_high, T=self.t_high, name='Turbine Inlet') # instantiate a steam object with conditions of state 1 at t_high, named 'Turbine Inlet'
         #state 2: turbine exit (p_low, s=s_turbine inlet) two-phase
-        self.state2s= steam(self.p_low, s=self.state1.s, name="Turbine Exit") # instantiate a steam object with conditions of state 2, named 'Turbine Exit'
-        if self.eff_turbine < 1.0:  # eff=(h1-h2)/(h1-h2s) -> h2=h1-eff(h1-h2s)
-            h2=self.state1.h-self.eff_turbine*(self.state1.h-self.state2s.h)
-            self.state2=steam(self.p_low,h=h2, name="Turbine Exit")
-        else:
-            self.state2=self.state2s
         #state 3: pump inlet (p_low, x=0) saturated liquid
-        self.state3= steam(self.p_low, x=0, name='Pump Inlet') # instantiate a steam object with conditions of state 3 as saturated liquid, named 'Pump Inlet'
         #state 4: pump exit (p_high,s=s_pump_inle t) typically sub-cooled, but estimate as saturated liquid
-        self.state4=steam(self.p_high, s=self.state3.s, name='Pump Exit')
-        self.state4.h=self.state3.h+self.state3.v*(self.p_high-self.p_low)
+        for state in self.STATES:
+            if state in self._dirty:
+                setattr(self, state, self._calc_state(state))
+                self._dirty.discard(state)
 
         self.turbine_work= (self.state1.h - self.state2.h) # calculate turbine work #multiplied by turbine efficiency
         self.pump_work= self.state4.h - self.state3.h # calculate pump work
@@ -56,6 +119,40 @@ class rankine():
         self.efficiency=100.0*(self.turbine_work - self.pump_work)/self.heat_added
         return self.efficiency
 
+    @staticmethod
+    def sweep(p_low=8, p_high=8000, t_high=None, quality=1, eff_turbine=0.95, grid=False, backend=None):
+        """
+        Evaluates many cycles in one batched pass (see Rankine_sweep.py).  Any argument may be an array, e.g.
+        rankine.sweep(p_low=8, p_high=np.linspace(1000, 15000, 50), t_high=[400, 500, 600], grid=True)
+        :param grid: True to evaluate every combination of the argument values
+        :param backend: None for the steam tables, or the name of a property backend from Steam_backends.py
+        :return: structured array with the cycle parameters, efficiency, turbine_work, pump_work, heat_added and
+                 the state enthalpies h1, h2s, h2, h3, h4
+        """
+        return sweep(p_low, p_high, t_high, quality, eff_turbine, grid, backend=backend)
+
+    @staticmethod
+    def simulate(p_high, t_high, p_low, eff_turbine=0.95, tolerance=None, backend=None):
+        """
+        Evaluates the cycle at every timestep of a load profile (see Rankine_timeseries.py), e.g. a day of
+        one-second plant data: rankine.simulate(p_high_array, t_high_array, p_low_array)
+        :param tolerance: None, or {input name: absolute tolerance} to reuse results while inputs barely change
+        :return: structured array with efficiency, turbine_work, pump_work and heat_added for each timestep
+        """
+        from Rankine_timeseries import simulate
+        return simulate(p_high, t_high, p_low, eff_turbine=eff_turbine, tolerance=tolerance, backend=backend)
+
+    def states(self):
+        """
+        The cycle states in one compact container (see Steam_state.py), e.g. to keep many cycles' states
+        without their steam objects.
+        :return: StateArray of states 1, 2s, 2, 3 and 4
+        """
+        from Steam_state import StateArray
+        if self.efficiency==None:
+            self.calc_efficiency()
+        return StateArray.from_states([self.state1, self.state2s, self.state2, self.state3, self.state4])
+
     def print_summary(self):
 
         if self.efficiency==None:
@@ -77,21 +174,15 @@ class rankine():
         Graph also includes isobars for plow and phigh (constructed from state objects above and steam objects in Steam_work.py).
         :return: none, just the graph
         """
-        ts, ps, hfs, hgs, sfs, sgs, vfs, vgs = np.loadtxt('sat_water_table.txt', skiprows=1, unpack=True) #reads values from water table txt file
+        import matplotlib.pyplot as plt  # only loaded when a plot is drawn, so batch use stays headless and fast
+        sfs, sgs, ts = dome() #the vapor dome of the shared diagram geometry (cached, see Steam_diagram.py)
         plt.xlim(0,8.99) #sets limits on x
         plt.ylim(0,550) #sets limits on y
         plt.plot(sfs,ts) #plots the sat fluid entropy vs. Tsat
         plt.plot(sgs,ts,color='red') #plots the sat vapor entropy vs. Tsat #resposible for the right half of the curve
-        x1vals=[self.state3.s,self.state2.s]
-        y1vals=[self.state3.T,self.state2.T]
+        #the plow isobar, and the phigh isobar from the pump exit to the turbine inlet (the cycle's real isobars)
+        (x1vals,y1vals),(x2vals,y2vals)=cycle_TS(self)
         plt.plot(x1vals,y1vals, color='black') #plots the plow isobar
-        xs=steam(8000,x=0) #these 4 lines are the 2 points near the vapor dome
-        p1,p2=xs.s,xs.T
-        xt=steam(8000,x=1)
-        p3,p4=xt.s,xt.T
-        x2vals=[self.state3.s,p1,p3,self.state1.s,self.state2.s] #x vals for green curve
-        y2vals=[self.state3.T,p2,p4,self.state1.T,self.state2.T] #y vals for green curve
-        #print(self.state1.s)
         plt.plot(x2vals,y2vals, color='green') #plots the phigh isobar
         plt.fill_between(x2vals,y2vals,self.state2.T,facecolor='gray',alpha=0.15) #fills in the graph between phigh and plow isobars
         plt.xlabel(r'S $\left(\frac{kJ}{{kg\cdot K}}\right)$', fontsize=12) #xlabel
@@ -107,6 +198,21 @@ class rankine():
         plt.show()
         pass
 
+    def plot_cycle(self, kind='Ts'):
+        """
+        Graphs the cycle on a property diagram with the vapor dome, isobars, isotherms and lines of constant quality
+        (see Steam_diagram.py); the cycle follows the real p_high and p_low isobars.
+        :param kind: 'Ts', 'hs' (Mollier) or 'Pv'
+        :return: none, just the graph
+        """
+        import matplotlib.pyplot as plt
+        from Steam_diagram import Diagram
+        if self.efficiency==None:
+            self.calc_efficiency()
+        Diagram(kind, plt.gca()).overlay(self)
+        plt.title(self.name)
+        plt.show()
+
 def main(): # This doesn't run for Q3 of the exam so I initially fed it values to check the numbers for my summary
     rankine1= rankine(8,8000,eff_turbine=0.95,name='Rankine Cycle - Superheated at turbine inlet') #instantiate a rankine object to test it.
     #t_high is specified
@@ -1,10 +1,16 @@
 import sys
+import functools
 from PyQt5.QtWidgets import QWidget, QApplication
 from Rankine_GUI import Ui_Form  # from the GUI file your created
 from Calc_state import Steam_SI as steam
 from Rankine import rankine
 from Steam import steam
+from Steam_backends import backend_names
+from Calc_worker import CalcRunner
+from Rankine_plot import Blitter, CycleTSPlot, EfficiencyPlot, efficiency_curve, POINTS, SWEEPS
 from PyQt5 import QtCore, QtGui, QtWidgets
+from matplotlib.figure import Figure
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg
 
 
 class main_window(QWidget, Ui_Form):
@@ -22,6 +28,43 @@ class main_window(QWidget, Ui_Form):
                       self.le_H2, self.le_H3, self.le_H4, self.le_HeatAdded, self.le_PumpWork, self.le_Efficiency,
                       self.le_TurbineWork]
 
+        # choice of property backend (see Steam_backends.py), added here so Rankine_GUI.py stays generated
+        self.cmb_Backend = QtWidgets.QComboBox(self.gb_Input)
+        for name in backend_names():
+            self.cmb_Backend.addItem(name, None if name == 'table' else name)  # None keeps the steam class table code
+        self.gridLayout.addWidget(self.cmb_Backend, 3, 2, 1, 2)
+
+        # the cycle is calculated on a worker thread (see Calc_worker.py) and comes back to show_cycle
+        self.runner = CalcRunner(self)
+        self.runner.result.connect(self.show_cycle)
+        self.runner.failed.connect(self.show_error)
+
+        # live plots (see Rankine_plot.py): the T-s diagram of the cycle and its efficiency against one parameter,
+        # swept in one batch; the slider moves along the curve and only the changing lines are redrawn
+        self.figure = Figure(figsize=(8, 3.5), tight_layout=True)
+        self.canvas = FigureCanvasQTAgg(self.figure)
+        self.blitter = Blitter(self.canvas)
+        ax_TS, ax_eff = self.figure.subplots(1, 2)
+        self.plot_TS = CycleTSPlot(ax_TS, self.blitter)
+        self.plot_eff = EfficiencyPlot(ax_eff, self.blitter)
+        self.cmb_Sweep = QtWidgets.QComboBox(self)
+        self.cmb_Sweep.addItems(list(SWEEPS))
+        self.sld_Sweep = QtWidgets.QSlider(QtCore.Qt.Horizontal, self)
+        self.sld_Sweep.setRange(0, POINTS - 1)
+        plotControls = QtWidgets.QHBoxLayout()
+        plotControls.addWidget(QtWidgets.QLabel('Efficiency against:', self))
+        plotControls.addWidget(self.cmb_Sweep)
+        plotControls.addWidget(self.sld_Sweep, 1)
+        self.verticalLayout.addLayout(plotControls)
+        self.verticalLayout.addWidget(self.canvas, 1)
+        self.plot_base = None  # arguments of the last calculated cycle, the curve is swept around them
+        self.slider_cycle = None
+        self.plot_runner = CalcRunner(self)  # curves are swept on their own worker, apart from the cycle requests
+        self.plot_runner.result.connect(self.show_curve)
+        self.slider_runner = CalcRunner(self)  # slider cycles of the (slow) equation backends
+        self.slider_runner.result.connect(self.show_slider_cycle)
+        self.slider_runner.failed.connect(self.show_error)
+
         self.assign_widgets()  # connects signals and slots
         self.show()
 
@@ -52,22 +95,68 @@ class main_window(QWidget, Ui_Form):
         self.rdo_Quality.clicked.connect(self.setText)
         # connect clicked signal of radio_THigh to self.setText
         self.rdo_THigh.clicked.connect(self.setText)
+        # recalculate automatically when the user edits an input or changes the turbine inlet condition or backend
+        for le in (self.le_PHigh, self.le_PLow, self.le_TurbineInletCondition, self.le_TurbineEff):
+            le.textEdited.connect(self.Recalculate)
+        self.rdo_Quality.toggled.connect(self.Recalculate)
+        self.cmb_Backend.currentIndexChanged.connect(self.Recalculate)
+        # the live plots
+        self.cmb_Sweep.currentIndexChanged.connect(self.update_curve)
+        self.sld_Sweep.valueChanged.connect(self.move_along_curve)
+
+    def read_inputs(self):
+        """
+        Reads the input values to run through the rankine cycle.
+        :return: dict of arguments for rankine, or None if a value is not a number (e.g., while it is being typed)
+        """
+        try:
+            # if checked, turn the value in the text box into a floating point number
+            # otherwise, leave it as is to fill in after calculated
+            return {'p_high': float(self.le_PHigh.text()) * 100, 'p_low': float(self.le_PLow.text()) * 100,
+                    'eff_turbine': float(self.le_TurbineEff.text()),
+                    'quality': float(self.le_TurbineInletCondition.text()) if self.rdo_Quality.isChecked() else None,
+                    't_high': float(self.le_TurbineInletCondition.text()) if self.rdo_THigh.isChecked() else None,
+                    'backend': self.cmb_Backend.currentData()}  # the selected property backend
+        except ValueError:
+            return None
+
+    @staticmethod
+    def calc_cycle(inputs):
+        """
+        Calculates the cycle.  This runs on the worker thread, so it uses its own rankine object.
+        :param inputs: arguments for rankine (see read_inputs)
+        :return: the rankine object
+        """
+        cycle = rankine(**inputs)
+        cycle.calc_efficiency()
+        return cycle
 
     def Calculate(self):
         """
-        Here, we need to scan through the input values to run through the rankine cycle. Finally, output the results to the line edit widgets.
+        Here, we need to scan through the input values to run through the rankine cycle on the worker thread.
+        The results are output to the line edit widgets by show_cycle.
         :return:
         """
-        # getting values from rankine
-        self.rankine.p_high = float(self.le_PHigh.text()) * 100
-        self.rankine.p_low = float(self.le_PLow.text()) * 100
-        self.rankine.eff_turbine = float(self.le_TurbineEff.text())
-        # if checked, turn the value in the text box into a floating point number
-        # otherwise, leave it as is to fill in after calculated
-        self.rankine.quality = float(self.le_TurbineInletCondition.text()) if self.rdo_Quality.isChecked() else None
-        self.rankine.t_high = float(self.le_TurbineInletCondition.text()) if self.rdo_THigh.isChecked() else None
+        inputs = self.read_inputs()
+        if inputs is None:
+            return
+        self.runner.submit(functools.partial(self.calc_cycle, inputs))
+
+    def Recalculate(self):
+        """
+        Calculates again once the user pauses typing; a calculation still running for the old inputs is dropped.
+        """
+        inputs = self.read_inputs()
+        if inputs is None:
+            self.runner.cancel()
+            return
+        self.runner.schedule(functools.partial(self.calc_cycle, inputs))
 
-        self.rankine.calc_efficiency()
+    def show_cycle(self, cycle):
+        """
+        Receives a calculated cycle from the worker thread and outputs the results to the line edit widgets.
+        """
+        self.rankine = cycle
 
         # fill text boxes with corresponding calculated values for h1, h2, h3, and h4
         self.le_H1.setText(str(round(self.rankine.state1.h, 2)))
@@ -93,9 +182,87 @@ class main_window(QWidget, Ui_Form):
                 self.rankine.p_low / 100, self.rankine.state2.T, self.rankine.state2.hf, self.rankine.state2.hg,
                 self.rankine.state2.sf, self.rankine.state2.sg, self.rankine.state2.vf, self.rankine.state2.vg))
 
+        # redraw the cycle and sweep a new efficiency curve around it
+        self.plot_base = {'p_low': cycle.p_low, 'p_high': cycle.p_high, 't_high': cycle.t_high,
+                          'quality': 1 if cycle.quality is None else cycle.quality, 'eff_turbine': cycle.eff_turbine,
+                          'backend': cycle.backend}
+        self.slider_runner.cancel()  # a slider cycle still coming belongs to the old curve
+        self.plot_TS.set_cycle(cycle)
+        self.blitter.update()
+        self.update_curve()
         return
 
+    @staticmethod
+    def calc_curve(param, base):
+        """
+        Sweeps the efficiency against one parameter on the worker thread.
+        :return: (param, values, efficiency)
+        """
+        return (param,) + efficiency_curve(param, **base)
+
+    def update_curve(self):
+        """
+        Requests the efficiency curve for the selected parameter around the last calculated cycle.
+        """
+        if self.plot_base is None:
+            return
+        self.plot_runner.submit(functools.partial(self.calc_curve, self.cmb_Sweep.currentText(), dict(self.plot_base)))
+
+    def show_curve(self, curve):
+        """
+        Receives a swept curve: draws it and puts the slider at the point nearest the calculated cycle.
+        """
+        param, values, efficiency = curve
+        self.plot_eff.set_curve(param, values, efficiency)
+        current = self.plot_base[param]
+        index = 0 if current is None else int(abs(values - current).argmin())
+        self.sld_Sweep.blockSignals(True)  # the cycle is already drawn
+        self.sld_Sweep.setValue(index)
+        self.sld_Sweep.blockSignals(False)
+        self.plot_eff.set_marker(index)
+        self.slider_cycle = rankine(**self.plot_base)  # moved along the curve; only the states of param change
+        self.canvas.draw_idle()  # the axes changed, so everything is drawn once
+
+    def move_along_curve(self, index):
+        """
+        Moves the marker to a point of the curve and draws that point's cycle on the T-s diagram.  Only the
+        changing lines are redrawn (see Rankine_plot.Blitter).  With the steam tables the cycle is recalculated
+        right away (only the states of the swept parameter); the equation backends take too long for a slider
+        tick, so their cycle is calculated on the worker thread and drawn by show_slider_cycle.
+        """
+        if self.plot_eff.values is None:
+            return
+        value, efficiency = self.plot_eff.set_marker(index)
+        if efficiency == efficiency and self.plot_base['backend'] is not None:
+            inputs = dict(self.plot_base, **{self.plot_eff.param: float(value)})
+            self.slider_runner.submit(functools.partial(self.calc_cycle, inputs))
+        elif efficiency == efficiency:  # no cycle to draw where the efficiency is nan
+            setattr(self.slider_cycle, self.plot_eff.param, float(value))
+            self.slider_cycle.calc_efficiency()
+            self.plot_TS.set_cycle(self.slider_cycle)
+        self.blitter.update()
+
+    def show_slider_cycle(self, cycle):
+        """
+        Receives the cycle of the slider position from the worker thread and draws it on the T-s diagram.
+        """
+        self.plot_TS.set_cycle(cycle)
+        self.blitter.update()
+
+    def show_error(self, message):
+        self.lbl_SatPropHigh.setText(message)
+
+    def shutdown_runners(self):
+        # let running calculations finish before the window goes away
+        for runner in (self.runner, self.plot_runner, self.slider_runner):
+            runner.shutdown()
+
+    def closeEvent(self, event):
+        self.shutdown_runners()
+        super().closeEvent(event)
+
     def ExitApp(self):
+        self.shutdown_runners()
         app.exit()
 
 
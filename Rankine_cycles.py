@@ -0,0 +1,355 @@
+# Reheat and regenerative Rankine cycles: a boiler, a turbine expanding in stages, reheaters and open/closed
+# feedwater heaters, evaluated for whole arrays/grids of design values in one pass (the multi-stage version of
+# Rankine_sweep.py)
+#
+#   cycle = Cycle(p_low=10, p_high=15000, t_high=600, eff_turbine=1,
+#                 reheat=[Reheat(4000, 600)], heaters=[ClosedHeater(4000), OpenHeater(500)])
+#   result = cycle.evaluate()                              one design
+#   result = cycle.evaluate(p_high=np.linspace(8000, 15000, 50), grid=True)    a design grid
+#
+# The components are connected by pressure level.  The turbine expands from the boiler through every reheat and
+# heater pressure down to the condenser, one stage (with the isentropic efficiency eff_turbine) between two levels.
+# A heater takes its steam from the turbine at its own pressure (before a reheat at the same pressure).  An open
+# heater mixes it into the feedwater and leaves saturated liquid, pumped on to the next open heater (or the
+# boiler).  A closed heater heats the feedwater to the saturation temperature of its steam and its drains are
+# throttled back to the heater below it (or the condenser).  Feedwater and drain enthalpies use the saturated
+# liquid estimate of rankine (h = hf + vf*dp).
+#
+# The saturation properties of every isobar (condenser, boiler, heaters, reheats) come from one lookup shared by
+# all the states and design points on it.  The extraction fractions follow from the heater energy balances, one
+# small linear system per design point, all solved in one batched np.linalg.solve.
+
+import numpy as np
+
+from Rankine_sweep import sat_by_isobar, _backend_props
+
+# column positions in the vectors from Steam_sat
+_TSAT, _HF, _HG, _SF, _SG, _VF, _VG = range(7)
+
+
+class Reheat:
+    def __init__(self, p, t):
+        """
+        Reheats the steam leaving a turbine stage.
+        :param p: reheat pressure (kPa), may be an array of design values
+        :param t: temperature after the reheater (C), may be an array
+        """
+        self.p = p
+        self.t = t
+
+
+class OpenHeater:
+    closed = False
+
+    def __init__(self, p):
+        """
+        Open (mixing) feedwater heater.
+        :param p: heater pressure = extraction pressure (kPa), may be an array of design values
+        """
+        self.p = p
+
+
+class ClosedHeater:
+    closed = True
+
+    def __init__(self, p):
+        """
+        Closed feedwater heater, drains cascaded back to the next lower heater or the condenser.
+        :param p: extraction pressure (kPa), may be an array of design values
+        """
+        self.p = p
+
+
+class _Linear:
+    """
+    A flow that is linear in the extraction fractions: const + coef . y, for n design points and m heaters.
+    """
+    def __init__(self, const, coef):
+        self.const = const
+        self.coef = coef
+
+    @classmethod
+    def constant(cls, value, n, m):
+        return cls(np.full(n, float(value)), np.zeros((n, m)))
+
+    @classmethod
+    def fraction(cls, j, n, m):
+        coef = np.zeros((n, m))
+        coef[:, j] = 1.0
+        return cls(np.zeros(n), coef)
+
+    def __add__(self, other):
+        return _Linear(self.const + other.const, self.coef + other.coef)
+
+    def __sub__(self, other):
+        return _Linear(self.const - other.const, self.coef - other.coef)
+
+    def __mul__(self, h):
+        return _Linear(self.const * h, self.coef * h[:, None])
+
+    def value(self, y):
+        return self.const + np.einsum('nm,nm->n', self.coef, y)
+
+
+def cycle_dtype(heaters):
+    """
+    :param heaters: number of feedwater heaters
+    :return: dtype of the results of Cycle.evaluate; y and h_extraction hold one value per heater (highest
+             pressure first)
+    """
+    return np.dtype([('efficiency', float), ('turbine_work', float), ('pump_work', float), ('heat_added', float),
+                     ('reheat_heat', float), ('heat_rejected', float), ('h1', float), ('s1', float),
+                     ('h_feedwater', float), ('h_exit', float), ('x_exit', float),
+                     ('y', float, (heaters,)), ('h_extraction', float, (heaters,))])
+
+
+class Cycle:
+    def __init__(self, p_low=8, p_high=8000, t_high=None, quality=1, eff_turbine=0.95, reheat=(), heaters=(),
+                 method='linear', backend=None, name='Rankine Cycle'):
+        """
+        A Rankine cycle with reheat and feedwater heaters.  Every pressure, temperature and efficiency may be an
+        array of design values (see evaluate); the layout (which components there are) is the same for all.
+        :param p_low: condenser pressure (kPa)
+        :param p_high: boiler pressure (kPa)
+        :param t_high: turbine inlet temperature (C).  None means the inlet is given by quality.
+        :param quality: turbine inlet quality, used where t_high is None/nan
+        :param eff_turbine: isentropic efficiency of every turbine stage
+        :param reheat: Reheat components
+        :param heaters: OpenHeater and ClosedHeater components
+        :param method: interpolation on the superheated table (see Rankine_sweep.calc_cycles)
+        :param backend: None for the steam tables, or the name of a property backend from Steam_backends.py
+        :param name: a convenient name
+        """
+        self.p_low = p_low
+        self.p_high = p_high
+        self.t_high = t_high
+        self.quality = quality
+        self.eff_turbine = eff_turbine
+        self.reheat = list(reheat)
+        self.heaters = list(heaters)
+        self.method = method
+        self.backend = backend
+        self.name = name
+
+    def evaluate(self, grid=False, **values):
+        """
+        Evaluates the cycle for every design point.  The design values are broadcast against each other like
+        Rankine_sweep.sweep, or combined into a Cartesian grid with grid=True (one axis each for p_low, p_high,
+        t_high, quality, eff_turbine, the reheat pressures, the reheat temperatures and the heater pressures).
+        :param values: design values overriding the attributes, e.g. p_high=np.linspace(8000, 15000, 50).  The
+                       component values are set on the components themselves.
+        :return: structured array of cycle_dtype(number of heaters), shaped like the broadcast (or grid) of the
+                 design values.  Designs that cannot be evaluated (e.g., a reheat or heater pressure outside
+                 p_low..p_high, or out of the order of the first design point) are nan.
+        """
+        p_low, p_high, t_high, quality, eff_turbine = [values.get(k, getattr(self, k)) for k in
+                                                       ('p_low', 'p_high', 't_high', 'quality', 'eff_turbine')]
+        args = [p_low, p_high, np.nan if t_high is None else t_high, quality, eff_turbine] + \
+            [r.p for r in self.reheat] + [r.t for r in self.reheat] + [h.p for h in self.heaters]
+        args = [np.asarray(a, dtype=float) for a in args]
+        if grid:
+            args = np.meshgrid(*[a.ravel() for a in args], indexing='ij')
+        args = np.broadcast_arrays(*args)
+        shape = args[0].shape
+        args = [a.ravel() for a in args]
+        k = len(self.reheat)
+        return calc_regenerative(*args[:5], reheat_p=args[5:5 + k], reheat_t=args[5 + k:5 + 2 * k],
+                                 heater_p=args[5 + 2 * k:], closed=[h.closed for h in self.heaters],
+                                 method=self.method, backend=self.backend).reshape(shape)
+
+    def print_summary(self):
+        """
+        Prints the results of a single design.
+        """
+        r = self.evaluate().ravel()[0]
+        print('Cycle Summary for: ', self.name)
+        print('\tEfficiency: {:0.3f}%'.format(r['efficiency']))
+        print('\tTurbine Work: {:0.3f} kJ/kg'.format(r['turbine_work']))
+        print('\tPump Work: {:0.3f} kJ/kg'.format(r['pump_work']))
+        print('\tHeat Added: {:0.3f} kJ/kg (reheat {:0.3f} kJ/kg)'.format(r['heat_added'], r['reheat_heat']))
+        print('\tTurbine Exit Quality: {:0.4f}'.format(r['x_exit']))
+        for heater, y in zip(self.heaters, r['y']):
+            print('\t{} at {:0.1f} kPa: extraction fraction {:0.4f}'.format(type(heater).__name__,
+                                                                           float(np.ravel(heater.p)[0]), y))
+
+
+def calc_regenerative(p_low, p_high, t_high, quality, eff_turbine, reheat_p=(), reheat_t=(), heater_p=(),
+                      closed=(), method='linear', backend=None):
+    """
+    The vectorized evaluation behind Cycle.evaluate.  All arrays are 1-D of the same length n.
+    :param p_low, p_high, t_high, quality, eff_turbine: as in Rankine_sweep.calc_cycles
+    :param reheat_p: one array of pressures (kPa) per reheater
+    :param reheat_t: one array of temperatures (C) per reheater
+    :param heater_p: one array of pressures (kPa) per feedwater heater
+    :param closed: one bool per heater, True for a closed heater
+    :return: structured array of cycle_dtype(len(heater_p))
+    """
+    n, m = len(p_low), len(heater_p)
+    out = np.full(n, np.nan, cycle_dtype(m))
+    if backend is not None:
+        from Steam_backends import get_backend
+        backend = get_backend(backend)
+
+    def props(pair, a, b):
+        from Steam_superheated import superheated_props
+        if backend is None:
+            return superheated_props(pair, a, b, method)
+        return _backend_props(backend, pair, a, b)
+
+    # one saturation lookup for every isobar of every design point
+    isobars = [p_low, p_high] + list(reheat_p) + list(heater_p)
+    sat = sat_by_isobar(np.concatenate(isobars), backend).reshape(len(isobars), n, 7)
+    sat_low, sat_high, sat_reheat, sat_heater = sat[0], sat[1], sat[2:2 + len(reheat_p)], sat[2 + len(reheat_p):]
+
+    # the pressure levels below the boiler, highest first; a heater comes before a reheat at the same pressure
+    levels = [('heater', j, heater_p[j]) for j in range(m)] + \
+        [('reheat', j, reheat_p[j]) for j in range(len(reheat_p))]
+    levels.sort(key=lambda level: (-level[2][0], level[0] == 'reheat'))
+    valid = np.ones(n, bool)
+    upper = p_high
+    for _, _, p in levels:
+        valid &= (p <= upper) & (p > p_low)
+        upper = p
+    order = [j for kind, j, _ in levels if kind == 'heater']  # heaters by pressure, highest first
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        #turbine inlet, saturated at the given quality or superheated at t_high (as in calc_cycles)
+        h = sat_high[:, _HF] + quality * (sat_high[:, _HG] - sat_high[:, _HF])
+        s = sat_high[:, _SF] + quality * (sat_high[:, _SG] - sat_high[:, _SF])
+        given_T = ~np.isnan(t_high)
+        h[given_T] = s[given_T] = np.nan
+        superheated = given_T & (t_high > sat_high[:, _TSAT])
+        if backend is not None:
+            superheated |= given_T & np.isnan(sat_high[:, _TSAT])
+        if superheated.any():
+            inlet = props('PT', p_high[superheated], t_high[superheated])
+            h[superheated], s[superheated] = inlet[:, 2], inlet[:, 3]
+        out['h1'], out['s1'] = h, s
+
+        #expansion through the levels: extraction states and reheats
+        h_extraction = np.full((n, m), np.nan)
+        stage_drops = []  # (level index or None for the last stage, enthalpy drop)
+        reheat_rise = []  # (level index, enthalpy rise)
+        for i, (kind, j, p) in enumerate(levels + [('condenser', None, p_low)]):
+            sat_p = sat_low if kind == 'condenser' else (sat_heater[j] if kind == 'heater' else sat_reheat[j])
+            h_out, s_out = _expand(p, h, s, eff_turbine, sat_p, props)
+            stage_drops.append(h - h_out)
+            h, s = h_out, s_out
+            if kind == 'heater':
+                h_extraction[:, j] = h
+            elif kind == 'reheat':
+                heated = props('PT', p, reheat_t[j])
+                superheated = reheat_t[j] > sat_p[:, _TSAT]
+                rise = np.where(superheated, heated[:, 2] - h, np.nan)
+                reheat_rise.append((i, rise))
+                h, s = h + rise, np.where(superheated, heated[:, 3], np.nan)
+        out['h_exit'] = h
+        out['x_exit'] = (h - sat_low[:, _HF]) / (sat_low[:, _HG] - sat_low[:, _HF])
+
+        #feedwater train from the condenser up: each segment between open heaters is pumped to the pressure of
+        #the next open heater (or the boiler); closed heaters sit in the segment of that pressure
+        segment_p = []  # feedwater pressure at each heater (lowest first)
+        p_next = p_high
+        for j in order:
+            segment_p.append(p_next)
+            if not closed[j]:
+                p_next = heater_p[j]
+        segment_p.reverse()
+        h_fw = sat_low[:, _HF] + sat_low[:, _VF] * (p_next - p_low)  # after the condensate pump
+        h_in, h_leave = {}, {}
+        pump_lift = {}  # open heater -> pumping enthalpy rise after it
+        for j, p_fw in zip(reversed(order), segment_p):
+            h_in[j] = h_fw
+            if closed[j]:
+                h_fw = sat_heater[j][:, _HF] + sat_heater[j][:, _VF] * (p_fw - heater_p[j])
+            else:
+                pump_lift[j] = sat_heater[j][:, _VF] * (p_fw - heater_p[j])
+                h_fw = sat_heater[j][:, _HF] + pump_lift[j]
+            h_leave[j] = h_fw
+        out['h_feedwater'] = h_fw
+
+        #heater energy balances from the boiler down, linear in the extraction fractions y
+        A, b = np.zeros((n, m, m)), np.zeros((n, m))
+        flow = _Linear.constant(1.0, n, m)  # feedwater flow through the current segment (per unit boiler flow)
+        drain, h_drain = _Linear.constant(0.0, n, m), np.zeros(n)  # drains cascading into the next heater
+        pump_flows = {}
+        for row, j in enumerate(order):
+            y = _Linear.fraction(j, n, m)
+            hf = sat_heater[j][:, _HF]
+            if closed[j]:
+                balance = y * h_extraction[:, j] + drain * h_drain - (y + drain) * hf - \
+                    flow * (h_leave[j] - h_in[j])
+                drain, h_drain = drain + y, hf
+            else:
+                pump_flows[j] = flow
+                balance = y * h_extraction[:, j] + drain * h_drain + (flow - y - drain) * (h_in[j]) - \
+                    flow * (h_leave[j] - pump_lift[j])
+                flow = flow - y - drain
+                drain = _Linear.constant(0.0, n, m)
+            A[:, row], b[:, row] = balance.coef, -balance.const
+        fractions = np.full((n, m), np.nan)
+        solvable = valid & np.isfinite(A).all(axis=(1, 2)) & np.isfinite(b).all(axis=1)
+        if m and solvable.any():
+            solved = np.linalg.solve(A[solvable], b[solvable][:, :, None])[:, :, 0]
+            fractions[solvable] = solved  # unknown j is the fraction of heater j
+        elif not m:
+            fractions = np.zeros((n, 0))
+
+        #works and heats with the solved flows
+        turbine_flow = np.ones(n)
+        turbine_work = np.zeros(n)
+        reheat_heat = np.zeros(n)
+        rises = dict(reheat_rise)
+        for i, drop in enumerate(stage_drops):
+            turbine_work = turbine_work + turbine_flow * drop
+            if i < len(levels):
+                kind, j, _ = levels[i]
+                if kind == 'heater':
+                    turbine_flow = turbine_flow - fractions[:, j]
+                else:
+                    reheat_heat = reheat_heat + turbine_flow * rises[i]
+        pump_work = flow.value(fractions) * sat_low[:, _VF] * (p_next - p_low)
+        for j, pumped in pump_flows.items():
+            pump_work = pump_work + pumped.value(fractions) * pump_lift[j]
+        heat_added = out['h1'] - h_fw + reheat_heat
+
+        out['y'], out['h_extraction'] = fractions, h_extraction
+        out['turbine_work'] = turbine_work
+        out['pump_work'] = pump_work
+        out['reheat_heat'] = reheat_heat
+        out['heat_added'] = heat_added
+        out['heat_rejected'] = heat_added - turbine_work + pump_work
+        out['efficiency'] = 100.0 * (turbine_work - pump_work) / heat_added
+    out[~valid] = np.nan
+    return out
+
+
+def _expand(p, h_in, s_in, eff, sat, props):
+    """
+    One turbine stage from (h_in, s_in) down to pressure p.
+    :return: (h, s) at the stage exit
+    """
+    x_s = (s_in - sat[:, _SF]) / (sat[:, _SG] - sat[:, _SF])
+    h_s = sat[:, _HF] + x_s * (sat[:, _HG] - sat[:, _HF])
+    superheated = x_s > 1
+    if superheated.any():
+        h_s[superheated] = props('Ps', p[superheated], s_in[superheated])[:, 2]
+    h = np.where(eff < 1.0, h_in - eff * (h_in - h_s), h_s)
+    x = (h - sat[:, _HF]) / (sat[:, _HG] - sat[:, _HF])
+    s = sat[:, _SF] + x * (sat[:, _SG] - sat[:, _SF])
+    superheated = x > 1
+    if superheated.any():
+        s[superheated] = props('Ph', p[superheated], h[superheated])[:, 3]
+    return h, s
+
+
+def main():
+    cycle = Cycle(p_low=10, p_high=15000, t_high=600, eff_turbine=1, name='Reheat-regenerative cycle',
+                  reheat=[Reheat(4000, 600)], heaters=[ClosedHeater(4000), OpenHeater(500)])
+    cycle.print_summary()
+    result = cycle.evaluate(p_high=np.linspace(8000, 15000, 8))
+    print(np.round(result['efficiency'], 2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,305 @@
+# Sensitivities and bounded optimization of Rankine cycle designs (rankine or Rankine_cycles.Cycle)
+#
+#   values, gradient = sensitivities(rankine(8, 8000, t_high=500), ('p_high', 't_high'))
+#   gradient['efficiency']['p_high']                          d efficiency / d p_high (% per kPa)
+#   result = optimize(cycle, {'p_high': (2000, 20000), 'heater_p0': (100, 2000)}, x_exit_min=0.88)
+#   python Rankine_optimize.py --bound p_high=2000:20000 --bound t_high=300:600 --x-exit-min 0.88
+#
+# The derivatives are central differences, but every perturbed design of a gradient is evaluated together in one
+# batched Cycle.evaluate pass (2k + 1 designs for k parameters), so a gradient costs about as much as one vectorized
+# evaluation instead of 2k + 1 calls of calc_efficiency.  The table interpolants are scipy Delaunay interpolants
+# that expose no derivatives (and dual numbers cannot pass through them), so the differences are taken on the
+# smooth 'cubic' interpolation by default; 'linear' makes the objective piecewise linear.
+#
+# The optimizer is scipy's L-BFGS-B on the parameters scaled to [0, 1] within their bounds.  It typically
+# converges in 10 to 30 gradients, i.e., a few hundred designs evaluated in a few dozen batches, where a grid
+# search fine enough for the same precision evaluates tens of thousands.  Designs the cycle cannot be evaluated at
+# (e.g., t_high below the saturation temperature at p_high) are penalized with their violations (see violations),
+# so the line search backs off from them; only a starting point that cannot be evaluated is an error.
+#
+# Parameters are named after the Cycle arguments: p_low, p_high, t_high, quality, eff_turbine, and for the
+# components reheat_p<i>, reheat_t<i> and heater_p<i> (i indexes cycle.reheat / cycle.heaters).
+
+import argparse
+import json
+import sys
+import numpy as np
+
+from Rankine_cycles import Cycle, Reheat, OpenHeater, ClosedHeater
+from Rankine_sweep import sat_by_isobar
+
+OUTPUTS = ('efficiency', 'turbine_work', 'heat_added')
+REL_STEP = 1e-5  # difference step relative to the parameter value (to its bound range when optimizing)
+INFEASIBLE = 1e6  # objective of a design that cannot be evaluated, raised by how far it is from feasible
+P_CRIT = 22064.0  # kPa, the end of the saturation table
+_CYCLE_PARAMS = ('p_low', 'p_high', 't_high', 'quality', 'eff_turbine')
+
+
+def as_cycle(design, method=None):
+    """
+    :param design: a rankine object or a Rankine_cycles.Cycle
+    :param method: interpolation on the superheated table, None to keep the cycle's
+    :return: a Cycle (a copy, the design is not modified)
+    """
+    if isinstance(design, Cycle):
+        cycle = Cycle(design.p_low, design.p_high, design.t_high, design.quality, design.eff_turbine,
+                      design.reheat, design.heaters, design.method, design.backend, design.name)
+    else:  # rankine
+        cycle = Cycle(design.p_low, design.p_high, design.t_high, design.quality, design.eff_turbine,
+                      backend=design.backend, name=design.name)
+    if method is not None:
+        cycle.method = method
+    return cycle
+
+
+def get_param(cycle, name):
+    """
+    :return: the current value of a named parameter of a Cycle
+    """
+    if name in _CYCLE_PARAMS:
+        value = getattr(cycle, name)
+        return np.nan if value is None else float(value)
+    kind, i = _component(cycle, name)
+    return float(getattr(kind[i], 't' if name.startswith('reheat_t') else 'p'))
+
+
+def _component(cycle, name):
+    for prefix, components in (('reheat_p', cycle.reheat), ('reheat_t', cycle.reheat),
+                               ('heater_p', cycle.heaters)):
+        if name.startswith(prefix) and name[len(prefix):].isdigit() and int(name[len(prefix):]) < len(components):
+            return components, int(name[len(prefix):])
+    raise ValueError('unknown cycle parameter: {}'.format(name))
+
+
+def with_values(cycle, names, columns):
+    """
+    A copy of a Cycle with some parameters replaced by arrays (one design per element).
+    :param names: parameter names
+    :param columns: one array (or value) per name
+    """
+    values = dict(zip(names, columns))
+    for name in names:
+        if name not in _CYCLE_PARAMS:
+            _component(cycle, name)  # raises for an unknown name
+    reheat = [Reheat(values.get('reheat_p{}'.format(i), r.p), values.get('reheat_t{}'.format(i), r.t))
+              for i, r in enumerate(cycle.reheat)]
+    heaters = [type(h)(values.get('heater_p{}'.format(i), h.p)) for i, h in enumerate(cycle.heaters)]
+    args = [values.get(k, getattr(cycle, k)) for k in _CYCLE_PARAMS]
+    return Cycle(*args, reheat=reheat, heaters=heaters, method=cycle.method, backend=cycle.backend,
+                 name=cycle.name)
+
+
+def _perturbed(x, h):
+    # the design x followed by its k perturbations x + h e_i and its k perturbations x - h e_i
+    k = len(x)
+    X = np.repeat(x[None, :], 2 * k + 1, axis=0)
+    X[1:k + 1][np.arange(k), np.arange(k)] += h
+    X[k + 1:][np.arange(k), np.arange(k)] -= h
+    return X
+
+
+def _gradient_batch(cycle, names, x, h):
+    """
+    Evaluates the design x and its 2k central perturbations in one batch.
+    :return: (result at x, results at x + h e_i, results at x - h e_i)
+    """
+    k = len(names)
+    result = with_values(cycle, names, _perturbed(x, h).T).evaluate()
+    return result[0], result[1:k + 1], result[k + 1:]
+
+
+def violations(cycle, names, X):
+    """
+    How far designs are from the conditions a cycle can be evaluated under: a superheated turbine inlet and
+    reheats (t above the saturation temperature), a boiler pressure below the critical pressure (steam tables)
+    and every reheat and heater pressure within p_low..p_high.
+    :param names: parameter names
+    :param X: designs, one row of values (one per name) each
+    :return: {violated condition: array with one violation per design, positive where violated}
+    """
+    designs = with_values(cycle, names, np.asarray(X, dtype=float).T)
+    n = len(X)
+
+    def column(value):
+        return np.broadcast_to(np.asarray(np.nan if value is None else value, dtype=float), (n,))
+
+    backend = None
+    if designs.backend is not None:
+        from Steam_backends import get_backend
+        backend = get_backend(designs.backend)
+    p_low, p_high = column(designs.p_low), column(designs.p_high)
+    out = {'p_low is not below p_high': np.log(p_low / p_high)}
+    if backend is None:
+        out['p_high is above the critical pressure'] = np.log(p_high / P_CRIT)
+    heated = [('t_high', p_high, column(designs.t_high))] + \
+        [('reheat_t{}'.format(i), column(r.p), column(r.t)) for i, r in enumerate(designs.reheat)]
+    for name, p, t in heated:
+        tsat = sat_by_isobar(p, backend)[:, 0]
+        out['{} is below the saturation temperature at its pressure'.format(name)] = (tsat - t) / (tsat + 273.15)
+    levels = [('reheat_p{}'.format(i), r.p) for i, r in enumerate(designs.reheat)] + \
+        [('heater_p{}'.format(i), h.p) for i, h in enumerate(designs.heaters)]
+    for name, p in levels:
+        p = column(p)
+        out['{} is outside p_low..p_high'.format(name)] = np.fmax(np.log(p / p_high), np.log(p_low / p))
+    with np.errstate(invalid='ignore'):
+        return {condition: np.nan_to_num(np.maximum(v, 0.0)) for condition, v in out.items()}
+
+
+def _infeasible(cycle, names, x):
+    # the reason a design cannot be evaluated
+    violated = [condition for condition, v in violations(cycle, names, x[None, :]).items() if v[0] > 0]
+    return ', '.join(violated) or 'it is outside the property tables'
+
+
+def _difference(center, plus, minus, field, h):
+    # central difference, one-sided where a perturbed design cannot be evaluated (e.g., at a table edge)
+    f0, fp, fm = center[field], plus[field], minus[field]
+    d = (fp - fm) / (2 * h)
+    d = np.where(np.isnan(fp), (f0 - fm) / h, d)
+    return np.where(np.isnan(fm), (fp - f0) / h, d)
+
+
+def sensitivities(design, params=('p_low', 'p_high', 't_high'), outputs=OUTPUTS, rel_step=REL_STEP,
+                  method='cubic'):
+    """
+    Derivatives of cycle outputs with respect to cycle parameters.
+    :param design: a rankine object or a Rankine_cycles.Cycle (one design)
+    :param params: parameter names (see the top of this file)
+    :param outputs: fields of Rankine_cycles.cycle_dtype, e.g. 'efficiency' (%), 'turbine_work', 'heat_added'
+    :param rel_step: difference step relative to each parameter value
+    :param method: interpolation on the superheated table ('cubic' is smooth, see the top of this file)
+    :return: ({output: value}, {output: {param: derivative}})
+    """
+    cycle = as_cycle(design, method)
+    names = list(params)
+    x = np.array([get_param(cycle, name) for name in names])
+    if np.isnan(x).any():
+        raise ValueError('the design has no value for: {}'.format(', '.join(n for n, v in zip(names, x) if v != v)))
+    h = rel_step * np.maximum(np.abs(x), 1.0)
+    center, plus, minus = _gradient_batch(cycle, names, x, h)
+    if np.isnan(center['efficiency']):
+        raise ValueError('the cycle cannot be evaluated at this design: {}'.format(_infeasible(cycle, names, x)))
+    values = {field: float(center[field]) for field in outputs}
+    gradient = {field: dict(zip(names, _difference(center, plus, minus, field, h).tolist())) for field in outputs}
+    return values, gradient
+
+
+def optimize(design, bounds, objective='efficiency', maximize=True, x_exit_min=None, method='cubic',
+             rel_step=REL_STEP, maxiter=100, starts=1, seed=0):
+    """
+    Finds the parameters within bounds that maximize (or minimize) a cycle output.
+    :param design: a rankine object or a Rankine_cycles.Cycle; its values are the starting point (clipped into
+                   the bounds, the middle of the bounds where it has none)
+    :param bounds: {parameter name: (low, high)}, the parameters to optimize
+    :param objective: a field of Rankine_cycles.cycle_dtype
+    :param maximize: False to minimize the objective
+    :param x_exit_min: optional lowest turbine exit quality, enforced with a quadratic penalty
+                       (designs that cannot be evaluated at all get the objective INFEASIBLE, increased with their
+                       violations, so the line search backs off from them)
+    :param method: interpolation on the superheated table
+    :param maxiter: iteration limit of L-BFGS-B
+    :param starts: number of starting points; after the design's own, random ones within the bounds.  The table
+                   interpolants wiggle at the 0.01 % efficiency level, so a flat optimum (e.g., a heater pressure)
+                   can stop at a local optimum that close to the best one.
+    :param seed: seed of the random starting points
+    :return: dict with params (the best optimum), the cycle outputs there, evaluations (designs evaluated),
+             batches, iterations, success and message
+    """
+    from scipy.optimize import minimize  # only loaded when optimizing
+    cycle = as_cycle(design, method)
+    names = list(bounds)
+    if not names:
+        raise ValueError('no parameters to optimize')
+    low = np.array([bounds[name][0] for name in names], dtype=float)
+    high = np.array([bounds[name][1] for name in names], dtype=float)
+    if not (high > low).all():
+        raise ValueError('every bound needs low < high')
+    x0 = np.array([get_param(cycle, name) for name in names])
+    x0 = np.clip(np.where(np.isnan(x0), (low + high) / 2, x0), low, high)
+    if np.isnan(with_values(cycle, names, x0).evaluate().ravel()[0][objective]):
+        raise ValueError('the cycle cannot be evaluated at the starting point {}: {}'.format(
+            dict(zip(names, x0.tolist())), _infeasible(cycle, names, x0)))
+    span = high - low
+    sign = -1.0 if maximize else 1.0
+    counts = {'evaluations': 0, 'batches': 0}
+
+    def fun(u):
+        x = low + np.clip(u, 0, 1) * span
+        h = rel_step * span
+        center, plus, minus = _gradient_batch(cycle, names, x, h)
+        counts['evaluations'] += 2 * len(names) + 1
+        counts['batches'] += 1
+        if np.isnan(center[objective]):  # a penalty sloping back toward the designs that can be evaluated
+            k = len(names)
+            v = sum(violations(cycle, names, _perturbed(x, h)).values())
+            return INFEASIBLE * (1 + float(v[0])), INFEASIBLE * (v[1:k + 1] - v[k + 1:]) / (2 * h) * span
+        f = sign * center[objective]
+        g = sign * _difference(center, plus, minus, objective, h)
+        if x_exit_min is not None:
+            short = x_exit_min - center['x_exit']
+            if short > 0:  # penalty in % efficiency per 0.01 of quality squared
+                f += 1e4 * short ** 2
+                g += -2e4 * short * _difference(center, plus, minus, 'x_exit', h)
+        return float(f), np.nan_to_num(g) * span
+
+    rng = np.random.default_rng(seed)
+    res, iterations = None, 0
+    for u0 in [(x0 - low) / span] + [rng.uniform(0, 1, len(names)) for _ in range(starts - 1)]:
+        run = minimize(fun, u0, jac=True, method='L-BFGS-B', bounds=[(0, 1)] * len(names),
+                       options={'maxiter': maxiter, 'ftol': 1e-12, 'gtol': 1e-8})
+        iterations += run.nit
+        if run.fun >= INFEASIBLE:  # a random start that never reached a design that can be evaluated
+            continue
+        if res is None or run.fun < res.fun:
+            res = run
+    x = low + np.clip(res.x, 0, 1) * span
+    best = with_values(cycle, names, x).evaluate().ravel()[0]
+    result = {'params': dict(zip(names, x.tolist()))}
+    result.update({field: float(best[field]) for field in OUTPUTS + ('pump_work', 'x_exit')})
+    result.update(counts, iterations=int(iterations), success=bool(res.success), message=str(res.message))
+    return result
+
+
+def _parse_bound(text):
+    name, _, span = text.partition('=')
+    low, _, high = span.partition(':')
+    try:
+        return name, (float(low), float(high))
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected name=low:high, got {}'.format(text))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Optimizes a Rankine cycle design within bounds.')
+    parser.add_argument('--p-low', type=float, default=8, help='condenser pressure (kPa)')
+    parser.add_argument('--p-high', type=float, default=8000, help='boiler pressure (kPa)')
+    parser.add_argument('--t-high', type=float, default=None, help='turbine inlet temperature (C)')
+    parser.add_argument('--eff-turbine', type=float, default=0.95, help='isentropic turbine efficiency')
+    parser.add_argument('--reheat', type=float, nargs=2, action='append', default=[], metavar=('P', 'T'),
+                        help='a reheater at P kPa to T C (repeatable)')
+    parser.add_argument('--open-heater', type=float, action='append', default=[], metavar='P',
+                        help='an open feedwater heater at P kPa (repeatable)')
+    parser.add_argument('--closed-heater', type=float, action='append', default=[], metavar='P',
+                        help='a closed feedwater heater at P kPa (repeatable)')
+    parser.add_argument('--bound', type=_parse_bound, action='append', required=True, metavar='NAME=LOW:HIGH',
+                        help='a parameter to optimize, e.g. p_high=2000:20000 or heater_p0=100:2000')
+    parser.add_argument('--x-exit-min', type=float, default=None, help='lowest turbine exit quality')
+    parser.add_argument('--starts', type=int, default=1, help='number of starting points')
+    parser.add_argument('--method', default='cubic', help='interpolation on the superheated table')
+    parser.add_argument('--backend', default=None, help='property backend (see Steam_backends.py)')
+    args = parser.parse_args(argv)
+    heaters = [OpenHeater(p) for p in args.open_heater] + [ClosedHeater(p) for p in args.closed_heater]
+    heaters.sort(key=lambda h: -h.p)  # heater_p0 is the highest pressure heater
+    cycle = Cycle(args.p_low, args.p_high, args.t_high, eff_turbine=args.eff_turbine,
+                  reheat=[Reheat(p, t) for p, t in args.reheat], heaters=heaters, backend=args.backend)
+    try:
+        result = optimize(cycle, dict(args.bound), x_exit_min=args.x_exit_min, method=args.method,
+                          starts=args.starts)
+    except ValueError as e:
+        parser.error(str(e))
+    print(json.dumps(result, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,181 @@
+# Plot geometry and redrawable plots of Rankine cycles, for rankine.plot_cycle_TS and the live plots in Rankine_app
+#
+# The vapor dome and the cycle isobars come from the geometry of Steam_diagram.py, computed once and cached (until
+# the tables are reloaded) for the T-s plots here and the property diagrams there alike.  The plot classes draw
+# onto a matplotlib Axes they are given and afterwards only update the data of their artists.  With a Blitter, a
+# redraw after a slider move only repaints those artists over a saved background (a few ms instead of a full draw
+# of the figure).  matplotlib itself is never imported here.
+
+import numpy as np
+
+import Steam_diagram
+from Rankine_sweep import sweep
+
+POINTS = 200  # points of an efficiency curve
+# parameters an efficiency curve can sweep: (values swept, axis label, factor from the swept unit to the axis unit)
+SWEEPS = {'p_high': (np.geomspace(200, 20000, POINTS), 'p_high (bar)', 0.01),
+          't_high': (np.linspace(100, 800, POINTS), 't_high (C)', 1.0),
+          'eff_turbine': (np.linspace(0.5, 1.0, POINTS), 'turbine efficiency', 1.0)}
+
+
+def dome():
+    """
+    The vapor dome of the shared diagram geometry (see Steam_diagram.geometry).
+    :return: (sf, sg, Tsat) arrays
+    """
+    curves = Steam_diagram.geometry().curves
+    liquid, vapor = curves['dome_liquid'], curves['dome_vapor']
+    return liquid[:, Steam_diagram.S], vapor[:, Steam_diagram.S], liquid[:, Steam_diagram.T]
+
+
+def cycle_TS(cycle):
+    """
+    The lines of a calculated cycle on a T-s diagram, along the isobars of its property backend (see
+    Steam_diagram.cycle_legs).
+    :param cycle: a rankine object after calc_efficiency
+    :return: ((s, T) arrays of the p_low isobar from the turbine exit to the pump inlet, (s, T) arrays from the
+             pump inlet along the p_high isobar through the turbine inlet to the turbine exit)
+    """
+    heating, cooling, _ = Steam_diagram.cycle_legs(cycle)
+    S, T = Steam_diagram.S, Steam_diagram.T
+    return (cooling[:, S], cooling[:, T]), (heating[:, S], heating[:, T])
+
+
+def efficiency_curve(param, p_low=8, p_high=8000, t_high=None, quality=1, eff_turbine=0.95, backend=None):
+    """
+    Efficiency against one cycle parameter, all points in one batched sweep (see Rankine_sweep.py).
+    :param param: one of SWEEPS ('p_high', 't_high' or 'eff_turbine'); the other arguments are held fixed
+    :return: (values of param, efficiency in %); the efficiency is nan where the cycle cannot be evaluated
+    """
+    values = SWEEPS[param][0]
+    args = {'p_low': p_low, 'p_high': p_high, 't_high': t_high, 'quality': quality, 'eff_turbine': eff_turbine}
+    args[param] = values
+    return values, sweep(backend=backend, **args)['efficiency']
+
+
+class Blitter:
+    def __init__(self, canvas):
+        """
+        Redraws only some artists (the animated ones) of a figure over the background saved at the last full draw.
+        :param canvas: the figure's canvas (e.g., FigureCanvasQTAgg)
+        """
+        self.canvas = canvas
+        self.artists = []
+        self.background = None
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def add(self, artist):
+        artist.set_animated(True)  # left out of full draws, so it is not part of the background
+        self.artists.append(artist)
+        return artist
+
+    def replace(self, old, new):
+        if old is not None:
+            self.artists.remove(old)
+        return self.add(new)
+
+    def _on_draw(self, event):
+        self.background = self.canvas.copy_from_bbox(self.canvas.figure.bbox)
+        self._draw_artists()
+
+    def _draw_artists(self):
+        for artist in self.artists:
+            self.canvas.figure.draw_artist(artist)
+
+    def update(self):
+        """
+        Shows the current state of the animated artists (a full draw if there is no background yet).
+        """
+        if self.background is None:
+            self.canvas.draw_idle()
+            return
+        self.canvas.restore_region(self.background)
+        self._draw_artists()
+        self.canvas.blit(self.canvas.figure.bbox)
+
+
+class CycleTSPlot:
+    def __init__(self, ax, blitter=None):
+        """
+        A T-s diagram of one cycle: the vapor dome is drawn once and set_cycle only moves the cycle lines.
+        :param ax: matplotlib Axes
+        :param blitter: optional Blitter that redraws the cycle lines
+        """
+        self.ax = ax
+        self.blitter = blitter
+        sf, sg, ts = dome()
+        ax.plot(sf, ts)  # saturated liquid line
+        ax.plot(sg, ts, color='red')  # saturated vapor line
+        ax.set_xlim(0, 8.99)
+        ax.set_ylim(0, 550)
+        ax.set_xlabel(r'S $\left(\frac{kJ}{{kg\cdot K}}\right)$')
+        ax.set_ylabel(r'T $\left(^o C\right)$')
+        self.low, = ax.plot([], [], color='black')
+        self.high, = ax.plot([], [], color='green')
+        self.states, = ax.plot([], [], linestyle='', marker='o', markerfacecolor='white', markeredgecolor='black',
+                               markersize=6)
+        self.fill = None
+        if blitter is not None:
+            for artist in (self.low, self.high, self.states):
+                blitter.add(artist)
+
+    def set_cycle(self, cycle):
+        """
+        :param cycle: a rankine object after calc_efficiency
+        """
+        low, high = cycle_TS(cycle)
+        self.low.set_data(*low)
+        self.high.set_data(*high)
+        self.states.set_data([cycle.state1.s, cycle.state2.s, cycle.state3.s],
+                             [cycle.state1.T, cycle.state2.T, cycle.state3.T])
+        old = self.fill
+        if old is not None:
+            old.remove()
+        self.fill = self.ax.fill_between(high[0], high[1], cycle.state2.T, facecolor='gray', alpha=0.15)
+        if self.blitter is not None:
+            self.blitter.replace(old, self.fill)
+
+
+class EfficiencyPlot:
+    def __init__(self, ax, blitter=None):
+        """
+        Efficiency against a swept parameter, with a marker at the selected point.  A new curve needs a full draw of
+        the canvas (the axes change); moving the marker does not.
+        :param ax: matplotlib Axes
+        :param blitter: optional Blitter that redraws the marker and its label
+        """
+        self.ax = ax
+        self.param = None
+        self.values = self.efficiency = None
+        self.line, = ax.plot([], [], color='green')
+        self.marker, = ax.plot([], [], linestyle='', marker='o', markerfacecolor='white', markeredgecolor='black')
+        self.label = ax.text(0.02, 0.95, '', transform=ax.transAxes, va='top')
+        ax.set_ylabel('efficiency (%)')
+        if blitter is not None:
+            blitter.add(self.marker)
+            blitter.add(self.label)
+
+    def set_curve(self, param, values, efficiency):
+        """
+        :param param: the swept parameter (a key of SWEEPS)
+        :param values: its values
+        :param efficiency: the efficiency at each value (%)
+        """
+        self.param, self.values, self.efficiency = param, values, efficiency
+        label, scale = SWEEPS[param][1:]
+        self.line.set_data(values * scale, efficiency)
+        self.ax.set_xlabel(label)
+        self.ax.set_xscale('log' if param == 'p_high' else 'linear')
+        self.ax.relim()
+        self.ax.autoscale_view()
+
+    def set_marker(self, index):
+        """
+        Moves the marker to one point of the curve.
+        :return: (value of the parameter, efficiency) at that point
+        """
+        value, efficiency = self.values[index], self.efficiency[index]
+        label, scale = SWEEPS[self.param][1:]
+        self.marker.set_data([value * scale], [efficiency])
+        self.label.set_text('{} = {:.4g}\nefficiency = {:.2f}%'.format(label, value * scale, efficiency))
+        return value, efficiency
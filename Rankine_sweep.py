@@ -0,0 +1,135 @@
+# Vectorized Rankine cycle sweeps: evaluates whole arrays/grids of cycle parameters in one pass (see rankine.sweep)
+
+import numpy as np
+
+from Steam_sat import saturation_curve
+from Steam_superheated import superheated_props
+
+CYCLE_DTYPE = np.dtype([('p_low', float), ('p_high', float), ('t_high', float), ('quality', float),
+                        ('eff_turbine', float), ('efficiency', float), ('turbine_work', float), ('pump_work', float),
+                        ('heat_added', float), ('h1', float), ('h2s', float), ('h2', float), ('h3', float),
+                        ('h4', float), ('s1', float), ('T1', float), ('T2', float)])
+
+# column positions in the vectors from Steam_sat
+_TSAT, _HF, _HG, _SF, _SG, _VF, _VG = range(7)
+
+
+def sat_by_isobar(p, backend=None):
+    """
+    Saturated properties for an array of pressures.  Each distinct pressure is only interpolated once and the
+    result is shared by every point on that isobar.
+    :param p: pressures in kPa
+    :param backend: None for the saturation splines, or a Steam_backends.PropertyBackend
+    :return: (n, 7) array [Tsat, hf, hg, sf, sg, vf, vg]
+    """
+    p_unique, index = np.unique(p, return_inverse=True)
+    sat = saturation_curve().by_P(p_unique / 100) if backend is None else backend.sat_props_P(p_unique)
+    return sat[index.ravel()]
+
+
+def _backend_props(backend, pair, a, b):
+    """
+    superheated_props through a property backend.
+    :return: (n, 5) array [P, T, h, s, v]
+    """
+    states = backend.calc_states(pair, a, b)
+    return np.column_stack([states[c] for c in 'PThsv'])
+
+
+def calc_cycles(p_low, p_high, t_high, quality, eff_turbine, method='linear', backend=None):
+    """
+    The vectorized version of rankine.calc_efficiency.  All arguments are 1-D arrays of the same length.
+    :param p_low: low pressure isobar (kPa)
+    :param p_high: high pressure isobar (kPa)
+    :param t_high: turbine inlet temperature (C), nan where the turbine inlet is given by quality instead
+    :param quality: turbine inlet quality (used where t_high is nan)
+    :param eff_turbine: isentropic turbine efficiency
+    :param method: interpolation on the superheated table, 'linear' (same as the steam class), 'cubic', or
+                   'fast'/'fast_linear' for the precomputed grids (see Steam_superheated.superheated_props)
+    :param backend: None for the steam tables (with method), or the name of a property backend from
+                    Steam_backends.py.  With a backend, inlets above the critical pressure are evaluated too.
+    :return: structured array of CYCLE_DTYPE.  Cycles that could not be evaluated (e.g., t_high below the
+             saturation temperature) are nan.
+    """
+    n = len(p_low)
+    out = np.zeros(n, CYCLE_DTYPE)
+    out['p_low'], out['p_high'], out['t_high'], out['quality'], out['eff_turbine'] = \
+        p_low, p_high, t_high, quality, eff_turbine
+    if backend is not None:
+        from Steam_backends import get_backend
+        backend = get_backend(backend)
+    sat_low = sat_by_isobar(p_low, backend)
+    sat_high = sat_by_isobar(p_high, backend)
+
+    def props(pair, a, b):
+        if backend is None:
+            return superheated_props(pair, a, b, method)
+        return _backend_props(backend, pair, a, b)
+
+    with np.errstate(invalid='ignore'):
+        #state 1: turbine inlet, saturated at the given quality or superheated at t_high
+        h1 = sat_high[:, _HF] + quality * (sat_high[:, _HG] - sat_high[:, _HF])
+        s1 = sat_high[:, _SF] + quality * (sat_high[:, _SG] - sat_high[:, _SF])
+        T1 = sat_high[:, _TSAT].copy()
+        given_T = ~np.isnan(t_high)
+        h1[given_T] = s1[given_T] = np.nan  # stays nan unless t_high is above the saturation temperature
+        T1[given_T] = t_high[given_T]
+        superheated = given_T & (t_high > sat_high[:, _TSAT])
+        if backend is not None:
+            superheated |= given_T & np.isnan(sat_high[:, _TSAT])  # supercritical inlets
+        if superheated.any():
+            inlet = props('PT', p_high[superheated], t_high[superheated])
+            h1[superheated], s1[superheated] = inlet[:, 2], inlet[:, 3]
+
+        #state 2s: turbine exit at p_low and s1
+        x2s = (s1 - sat_low[:, _SF]) / (sat_low[:, _SG] - sat_low[:, _SF])
+        h2s = sat_low[:, _HF] + x2s * (sat_low[:, _HG] - sat_low[:, _HF])
+        superheated = x2s > 1
+        if superheated.any():
+            h2s[superheated] = props('Ps', p_low[superheated], s1[superheated])[:, 2]
+
+        #state 2: actual turbine exit, eff=(h1-h2)/(h1-h2s), saturated or superheated at p_low and h2
+        h2 = np.where(eff_turbine < 1.0, h1 - eff_turbine * (h1 - h2s), h2s)
+        T2 = sat_low[:, _TSAT].copy()
+        superheated = h2 > sat_low[:, _HG]
+        if superheated.any():
+            T2[superheated] = props('Ph', p_low[superheated], h2[superheated])[:, 1]
+
+        #state 3: pump inlet, saturated liquid.  state 4: pump exit h4=h3+v3*(p_high-p_low)
+        h3 = sat_low[:, _HF]
+        h4 = h3 + sat_low[:, _VF] * (p_high - p_low)
+
+        out['h1'], out['h2s'], out['h2'], out['h3'], out['h4'], out['s1'], out['T1'], out['T2'] = \
+            h1, h2s, h2, h3, h4, s1, T1, T2
+        out['turbine_work'] = h1 - h2
+        out['pump_work'] = h4 - h3
+        out['heat_added'] = h1 - h4
+        out['efficiency'] = 100.0 * (out['turbine_work'] - out['pump_work']) / out['heat_added']
+    return out
+
+
+def sweep(p_low=8, p_high=8000, t_high=None, quality=1, eff_turbine=0.95, grid=False, method='linear',
+          backend=None):
+    """
+    Evaluates many Rankine cycles at once.  Each argument may be a scalar or an array.
+    With grid=False the arguments are broadcast against each other (e.g., equal-length arrays give one cycle per
+    element).  With grid=True every combination of the argument values is evaluated (a Cartesian grid).
+    :param p_low: low pressure isobar(s) in kPa
+    :param p_high: high pressure isobar(s) in kPa
+    :param t_high: turbine inlet temperature(s) in C.  None (or nan) means the inlet is given by quality.
+    :param quality: turbine inlet quality, used where t_high is None/nan
+    :param eff_turbine: isentropic turbine efficiency
+    :param grid: True to evaluate the Cartesian product of the arguments
+    :param method: interpolation on the superheated table, 'linear' (same as rankine), 'cubic', or
+                   'fast'/'fast_linear' for the precomputed grids (see Steam_superheated.superheated_props)
+    :param backend: None for the steam tables (with method), or the name of a property backend from
+                    Steam_backends.py
+    :return: structured array of CYCLE_DTYPE shaped like the broadcast (or grid) of the arguments
+    """
+    args = [p_low, p_high, np.nan if t_high is None else t_high, quality, eff_turbine]
+    args = [np.asarray(a, dtype=float) for a in args]
+    if grid:
+        args = np.meshgrid(*[a.ravel() for a in args], indexing='ij')
+    args = np.broadcast_arrays(*args)
+    shape = args[0].shape
+    return calc_cycles(*[a.ravel() for a in args], method=method, backend=backend).reshape(shape)
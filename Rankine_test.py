@@ -0,0 +1,95 @@
+# Checks that changing one input of a rankine cycle recalculates only the states calculated from it (see
+# rankine.recompute_counts) and gives the same results as a new cycle with that input.
+#
+#   python -m pytest Rankine_test.py      or      python -m unittest Rankine_test
+
+import unittest
+
+from Rankine import rankine
+
+BASE = {'p_low': 8, 'p_high': 8000, 't_high': 500, 'eff_turbine': 0.9}
+# input changed -> (new value, states it recalculates)
+CHANGES = {
+    'p_low': (10, {'state2s', 'state2', 'state3', 'state4'}),
+    'p_high': (10000, {'state1', 'state2s', 'state2', 'state4'}),
+    't_high': (550, {'state1', 'state2s', 'state2'}),
+    'eff_turbine': (0.85, {'state2'}),
+}
+
+
+def recomputed(cycle, before):
+    # the states calculated since the counts were before
+    return {state for state, count in cycle.recompute_counts.items() if count != before[state]}
+
+
+class RecomputeTest(unittest.TestCase):
+    def assertSameCycle(self, cycle, inputs):
+        fresh = rankine(**inputs)
+        self.assertAlmostEqual(cycle.efficiency, fresh.calc_efficiency(), places=10)
+        for name in ('turbine_work', 'pump_work', 'heat_added'):
+            self.assertAlmostEqual(getattr(cycle, name), getattr(fresh, name), places=8)
+
+    def test_first_calculation(self):
+        cycle = rankine(**BASE)
+        cycle.calc_efficiency()
+        self.assertEqual(cycle.recompute_counts, dict.fromkeys(rankine.STATES, 1))
+
+    def test_single_input_changes(self):
+        for name, (value, states) in CHANGES.items():
+            with self.subTest(input=name):
+                cycle = rankine(**BASE)
+                cycle.calc_efficiency()
+                before = dict(cycle.recompute_counts)
+                setattr(cycle, name, value)
+                cycle.calc_efficiency()
+                self.assertEqual(recomputed(cycle, before), states)
+                self.assertSameCycle(cycle, dict(BASE, **{name: value}))
+
+    def test_same_value_recalculates_nothing(self):
+        cycle = rankine(**BASE)
+        cycle.calc_efficiency()
+        before = dict(cycle.recompute_counts)
+        for name, value in BASE.items():
+            setattr(cycle, name, value)
+        cycle.calc_efficiency()
+        self.assertEqual(recomputed(cycle, before), set())
+
+    def test_quality(self):
+        # the quality only matters for a saturated turbine inlet (t_high None)
+        cycle = rankine(**BASE)
+        cycle.calc_efficiency()
+        before = dict(cycle.recompute_counts)
+        cycle.quality = 0.95
+        cycle.calc_efficiency()
+        self.assertEqual(recomputed(cycle, before), set())
+
+        inputs = dict(BASE, t_high=None)
+        cycle = rankine(**inputs)
+        cycle.calc_efficiency()
+        before = dict(cycle.recompute_counts)
+        cycle.quality = 0.95
+        cycle.calc_efficiency()
+        self.assertEqual(recomputed(cycle, before), {'state1', 'state2s', 'state2'})
+        self.assertSameCycle(cycle, dict(inputs, quality=0.95))
+
+    def test_backend_recalculates_everything(self):
+        cycle = rankine(**BASE)
+        cycle.calc_efficiency()
+        before = dict(cycle.recompute_counts)
+        cycle.backend = 'if97'
+        cycle.calc_efficiency()
+        self.assertEqual(recomputed(cycle, before), set(rankine.STATES))
+        self.assertSameCycle(cycle, dict(BASE, backend='if97'))
+
+    def test_invalidate(self):
+        cycle = rankine(**BASE)
+        cycle.calc_efficiency()
+        before = dict(cycle.recompute_counts)
+        cycle.invalidate('state3')
+        self.assertIsNone(cycle.efficiency)
+        cycle.calc_efficiency()
+        self.assertEqual(recomputed(cycle, before), {'state3', 'state4'})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,226 @@
+# Time-series plant simulation: replays load profiles (p_high, t_high and p_low at every timestep) through the
+# vectorized Rankine cycle (see rankine.simulate)
+#
+#   result = simulate(p_high, t_high, p_low)                      86400 one-second steps in well under a second
+#   result['efficiency'], result['turbine_work'], result['heat_added']
+#   result = simulate(p_high, t_high, p_low, tolerance={'p_high': 5, 't_high': 0.2})
+#   python Rankine_timeseries.py --steps 86400                    throughput on a synthetic 24 hour profile
+#   python Rankine_timeseries.py --input plant.csv --output cycles.csv --columns PT101 TT101 PT201
+#
+# The timesteps are evaluated in chunks with Rankine_sweep.calc_cycles, so memory stays bounded for long series.
+# Plant inputs change slowly, so consecutive timesteps often repeat: each run of timesteps with the same inputs
+# as its first timestep (equal, or within tolerance of them) is evaluated once, at that first timestep, and its
+# result repeated, also across chunk boundaries.  Only the timesteps that differ from the one before them can
+# start a run, so the scan for run starts only visits those.  calc_cycles resolves every state by direct interpolation (no iterative inverse solves), so
+# there is nothing to warm-start between timesteps.
+
+import argparse
+import csv
+import json
+import sys
+import time
+import numpy as np
+
+from Rankine_sweep import calc_cycles, CYCLE_DTYPE
+
+CHUNKSIZE = 100000  # timesteps per chunk
+INPUTS = ('p_low', 'p_high', 't_high', 'quality', 'eff_turbine')
+OUTPUT_FIELDS = ('efficiency', 'turbine_work', 'pump_work', 'heat_added')
+
+
+def _same(a, b):
+    # row-wise equality of inputs, nan equal to nan (t_high is nan where the inlet is given by quality)
+    return ((a == b) | (np.isnan(a) & np.isnan(b))).all(axis=-1)
+
+
+def _within(row, start, tol):
+    # whether a timestep's inputs are within tol of those at the start of a run (nan only matches nan)
+    for value, first, t in zip(row, start, tol):
+        if not (abs(value - first) <= t or (value != value and first != first)):
+            return False
+    return True
+
+
+def run_starts(inputs, tolerance=None, start=None):
+    """
+    Splits timesteps into runs: a run starts where an input differs from its value at the start of the current
+    run by more than its tolerance (by anything, for inputs without one).
+    :param inputs: (n, len(INPUTS)) array of the inputs of each timestep
+    :param tolerance: None, or {input name: absolute tolerance}
+    :param start: the inputs at the start of the run the timesteps continue, None to start a new one
+    :return: (boolean array, True where a run starts; the inputs at the start of the last run)
+    """
+    change = np.empty(len(inputs), bool)
+    change[0] = start is None or not _same(inputs[0], start)
+    change[1:] = ~_same(inputs[1:], inputs[:-1])
+    tol = [(tolerance or {}).get(name) or 0.0 for name in INPUTS]
+    if any(tol):  # a change only starts a run once it strays from the run's start by more than the tolerance
+        candidates = np.flatnonzero(change)
+        change[:] = False
+        for i, row in zip(candidates.tolist(), inputs[candidates].tolist()):
+            if start is None or not _within(row, start, tol):
+                change[i] = True
+                start = row
+    elif change.any():
+        start = inputs[np.flatnonzero(change)[-1]]
+    return change, np.asarray(start, dtype=float)
+
+
+class Simulator:
+    def __init__(self, tolerance=None, method='linear', backend=None):
+        """
+        Evaluates consecutive chunks of a time series, carrying the last run over from one chunk to the next.
+        :param tolerance: None to only reuse results of exactly repeated inputs, or {input name: absolute tolerance}
+                          (names of INPUTS) for inputs that may differ that much from their value at the start of a
+                          run before the cycle is evaluated anew
+        :param method: interpolation on the superheated table (see Rankine_sweep.calc_cycles)
+        :param backend: None for the steam tables, or the name of a property backend from Steam_backends.py
+        """
+        unknown = set(tolerance or ()) - set(INPUTS)
+        if unknown:
+            raise ValueError('unknown inputs in tolerance: {}'.format(', '.join(sorted(unknown))))
+        self.tolerance = tolerance
+        self.method = method
+        self.backend = backend
+        self.steps = 0
+        self.evaluated = 0  # cycles actually evaluated
+        self._run_start = None  # inputs at the start of the last run
+        self._last_result = None
+
+    def run(self, p_high, t_high, p_low, quality=1, eff_turbine=0.95):
+        """
+        Evaluates the next chunk of timesteps.  Arguments are arrays of one value per timestep (or scalars).
+        :param t_high: turbine inlet temperature (C), nan where the inlet is given by quality
+        :return: structured array of Rankine_sweep.CYCLE_DTYPE, one row per timestep
+        """
+        columns = np.broadcast_arrays(*[np.asarray(a, dtype=float).ravel() for a in
+                                        (p_low, p_high, t_high, quality, eff_turbine)])
+        n = len(columns[0])
+        if n == 0:
+            return np.zeros(0, CYCLE_DTYPE)
+        change, run_start = run_starts(np.column_stack(columns), self.tolerance, self._run_start)
+        starts = np.flatnonzero(change)
+        results = calc_cycles(*[c[starts] for c in columns], method=self.method, backend=self.backend)
+        run = np.cumsum(change)
+        if change[0]:
+            run -= 1
+        else:  # the chunk starts in the last run of the previous chunk
+            results = np.concatenate([self._last_result[None], results])
+        out = results[run]
+        for name, column in zip(INPUTS, columns):
+            out[name] = column  # the timestep's own inputs, not those of the run's first timestep
+        self._run_start, self._last_result = run_start, results[-1]
+        self.steps += n
+        self.evaluated += len(starts)
+        return out
+
+
+def simulate(p_high, t_high, p_low, quality=1, eff_turbine=0.95, tolerance=None, chunksize=CHUNKSIZE,
+             method='linear', backend=None):
+    """
+    Evaluates a Rankine cycle at every timestep of a load profile.
+    :param p_high: boiler pressure (kPa) at each timestep
+    :param t_high: turbine inlet temperature (C) at each timestep, None (or nan) where the inlet is given by quality
+    :param p_low: condenser pressure (kPa) at each timestep
+    :param quality: turbine inlet quality, a scalar or one per timestep
+    :param eff_turbine: isentropic turbine efficiency, a scalar or one per timestep
+    :param tolerance: see Simulator
+    :param chunksize: timesteps evaluated together
+    :return: structured array of Rankine_sweep.CYCLE_DTYPE, one row per timestep
+    """
+    if t_high is None:
+        t_high = np.nan
+    columns = np.broadcast_arrays(*[np.asarray(a, dtype=float).ravel() for a in
+                                    (p_high, t_high, p_low, quality, eff_turbine)])
+    sim = Simulator(tolerance, method, backend)
+    n = len(columns[0])
+    out = np.empty(n, CYCLE_DTYPE)
+    for i in range(0, n, chunksize):
+        out[i:i + chunksize] = sim.run(*[c[i:i + chunksize] for c in columns])
+    return out
+
+
+def daily_profile(steps=86400, seed=0):
+    """
+    A synthetic 24 hour load profile with sensor noise and the resolution of plant instruments.
+    :return: (p_high (kPa), t_high (C), p_low (kPa)) arrays
+    """
+    rng = np.random.default_rng(seed)
+    t = np.arange(steps) * 86400 / steps
+    load = 0.7 + 0.25 * np.sin(2 * np.pi * (t / 86400 - 0.3))
+    p_high = np.round(6000 + 6000 * load + rng.normal(0, 20, steps))
+    t_high = np.round(450 + 100 * load + rng.normal(0, 1, steps), 1)
+    p_low = np.round(8 + 2 * np.sin(2 * np.pi * t / 3600) ** 2, 2)
+    return p_high, t_high, p_low
+
+
+def _replay_csv(args):
+    from Steam_stream import CsvSource
+    source = CsvSource(args.input, args.chunksize)
+    missing = [c for c in args.columns if c not in source.columns]
+    if missing:
+        source.close()
+        raise ValueError('columns not in the input: {}'.format(', '.join(missing)))
+    sim = Simulator(args.tolerance, args.method, args.backend)
+    output = sys.stdout if args.output == '-' else open(args.output, 'w', newline='')
+    try:
+        writer = csv.writer(output)
+        writer.writerow(source.columns + list(OUTPUT_FIELDS))
+        for chunk in source.chunks():
+            p_high, t_high, p_low = [source.values(chunk, c) for c in args.columns]
+            result = sim.run(p_high, t_high, p_low, eff_turbine=args.eff_turbine)
+            fields = [[repr(v) if v == v else '' for v in result[name].tolist()] for name in OUTPUT_FIELDS]
+            writer.writerows(row + list(values) for row, values in zip(chunk, zip(*fields)))
+    finally:
+        source.close()
+        if output is not sys.stdout:
+            output.close()
+    return sim
+
+
+def _parse_tolerance(text):
+    name, _, value = text.partition('=')
+    try:
+        return name, float(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError('expected name=tolerance, got {}'.format(text))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replays load profiles through the Rankine cycle.')
+    parser.add_argument('--input', default=None, help='CSV file of timesteps (- for stdin); without it a synthetic '
+                                                      'daily profile is simulated and the throughput reported')
+    parser.add_argument('--output', default='-', help='CSV file for the timesteps with the cycle results')
+    parser.add_argument('--columns', nargs=3, default=['p_high', 't_high', 'p_low'],
+                        metavar=('P_HIGH', 'T_HIGH', 'P_LOW'), help='input columns (kPa, C, kPa)')
+    parser.add_argument('--steps', type=int, default=86400, help='timesteps of the synthetic profile')
+    parser.add_argument('--eff-turbine', type=float, default=0.95, help='isentropic turbine efficiency')
+    parser.add_argument('--tolerance', type=_parse_tolerance, action='append', default=[], metavar='NAME=TOL',
+                        help='reuse results while an input stays within TOL of its value at the start of the run, '
+                             'e.g. p_high=5 (repeatable)')
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help='timesteps per chunk')
+    parser.add_argument('--method', default='linear', help='interpolation on the superheated table')
+    parser.add_argument('--backend', default=None, help='property backend (see Steam_backends.py)')
+    args = parser.parse_args(argv)
+    args.tolerance = dict(args.tolerance) or None
+    start = time.perf_counter()
+    try:
+        if args.input is not None:
+            sim = _replay_csv(args)
+        else:
+            sim = Simulator(args.tolerance, args.method, args.backend)
+            p_high, t_high, p_low = daily_profile(args.steps)
+            for i in range(0, args.steps, args.chunksize):
+                sim.run(p_high[i:i + args.chunksize], t_high[i:i + args.chunksize], p_low[i:i + args.chunksize],
+                        eff_turbine=args.eff_turbine)
+    except ValueError as e:
+        parser.error(str(e))
+    seconds = time.perf_counter() - start
+    report = {'steps': sim.steps, 'evaluated': sim.evaluated, 'seconds': round(seconds, 3),
+              'steps_per_minute': round(sim.steps / seconds * 60) if seconds else None}
+    print(json.dumps(report), file=sys.stderr if args.input is not None else sys.stdout)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,7 +1,11 @@
 # This is Dr. Smay's code for Steam, with a few necessary modifications to work with our code
 
-import numpy as np
-from scipy.interpolate import griddata
+from Steam_superheated import superheated_props
+from Steam_sat import sat_props_P
+from Steam_cache import state_cache
+from Steam_backends import get_backend
+from Steam_batch import region_name
+import Steam_profile
 
 class steam():
     """
@@ -10,7 +14,7 @@ class steam():
     all the other thermodynamic properties.  Hence, the constructor requires press of
     the isobar and one other property.
     """
-    def __init__(self, pressure, T=None, x=None, v=None, h=None, s=None, name=None):
+    def __init__(self, pressure, T=None, x=None, v=None, h=None, s=None, name=None, backend=None):
         '''
         constructor for steam
         :param pressure: pressure in kPa
@@ -20,6 +24,7 @@ class steam():
         :param h: specific enthalpy in kJ/kg
         :param s: specific entropy in kJ/(kg*K)
         :param name: a convenient identifier
+        :param backend: None for the steam tables, or the name of a property backend from Steam_backends.py
         '''
         #assign arguments to class properties
         self.p = pressure #pressure - kPa
@@ -30,9 +35,11 @@ class steam():
         self.s = s #entropy - kj/(kg*K)
         self.name = name #a useful identifier
         self.region = None #'superheated' or 'saturated' or 'two-phase'
+        self.backend = backend #None for the steam tables (see Steam_backends.py)
         if T==None and x==None and v==None and h==None and s==None: return
         else: self.calc()
 
+    @Steam_profile.timed('steam.calc')
     def calc(self):
         '''
         The Rankine cycle operates between two isobars (i.e., p_high (Turbine inlet state 1) & p_low (Turbine exit state 2)
@@ -44,37 +51,48 @@ class steam():
         #2. determine if two-phase/saturated or superheated
         #3. find all unknown thermodynamic properties by interpolation from appropriate steam table
 
-        #read in the thermodynamic data from files
-        ts, ps, hfs, hgs, sfs, sgs, vfs, vgs= np.loadtxt('sat_water_table.txt',skiprows=1, unpack=True) #use np.loadtxt to read the saturated properties
-        tcol, hcol, scol, pcol = np.loadtxt('superheated_water_table.txt', skiprows=1, unpack=True) #use np.loadtxt to read the superheated properties
+        #repeated states come from the LRU cache (see Steam_cache.py)
+        given=next((c for c in 'Txhs' if getattr(self, c) is not None), None)
+        if given is None or not state_cache.enabled:
+            return self._calc()
+        value=getattr(self, given)
+        kind='steam' if self.backend is None else 'steam/'+get_backend(self.backend).name
+        key=state_cache.key(kind, 'p'+given, (self.p, value))
+        cached=state_cache.get(key)
+        if cached is not None:
+            (self.T, self.x, self.v, self.h, self.s, self.region,
+             self.hf, self.hg, self.sf, self.sg, self.vf, self.vg)=cached
+            setattr(self, given, value)
+            return
+        self._calc()
+        state_cache.put(key, (self.T, self.x, self.v, self.h, self.s, self.region,
+                              self.hf, self.hg, self.sf, self.sg, self.vf, self.vg))
 
+    def _calc(self):
+        '''
+        Does the work of calc (without the cache)
+        '''
+        if self.backend is not None:
+            return self._calc_backend()
         R=8.314/(18/1000) #ideal gas constant for water [J/(mol K)]/[kg/mol]
         Pbar=self.p/100 #pressure in bar - 1bar=100kPa roughly
 
-        #get saturated properties
+        #get saturated properties from one evaluation of the shared saturation splines (see Steam_sat.py)
         #note: these are local variables only.  Their scope is only in this function
-        Tsat = float(griddata((ps), ts, (Pbar)))
-        hf=float(griddata((ps),hfs,(Pbar)))
-        hg=float(griddata((ps),hgs,(Pbar)))
-        sf=float(griddata((ps),sfs,(Pbar)))
-        sg=float(griddata((ps),sgs,(Pbar)))
-        vf=float(griddata((ps),vfs,(Pbar)))
-        vg=float(griddata((ps),vgs,(Pbar)))
-        self.hf = float(griddata((ps), hfs, (Pbar)))
-        self.hg = float(griddata((ps), hgs, (Pbar)))
-        self.sf = float(griddata((ps), sfs, (Pbar)))
-        self.sg = float(griddata((ps), sgs, (Pbar)))
-        self.vf = float(griddata((ps), vfs, (Pbar)))
-        self.vg = float(griddata((ps), vgs, (Pbar)))
-
-        self.hf=hf #this creates a member variable for the class that can be accessed from an object
+        Tsat, hf, hg, sf, sg, vf, vg = sat_props_P(Pbar)
+        self.hf = hf #this creates a member variable for the class that can be accessed from an object
+        self.hg = hg
+        self.sf = sf
+        self.sg = sg
+        self.vf = vf
+        self.vg = vg
 
         #region determine which second property is given
         if self.T is not None:
-            if self.T>Tsat: #interpolate with griddata
+            if self.T>Tsat: #interpolate on the superheated table
                 self.region='Superheated'
-                self.h = float(griddata((tcol, pcol), hcol, (self.T, self.p)))  #use griddata to interpolate with T & P the superheated table
-                self.s = float(griddata((tcol, pcol), scol, (self.T, self.p)))  #use griddata to interpolate with T & P the superheated table
+                P, T, h, s, v = superheated_props('PT', self.p, self.T, method='linear')  #interpolate with T & P the superheated table
+                self.h, self.s = h, s
                 self.x=1.0
                 TK = self.T + 273.14  # temperature conversion to Kelvin
                 self.v=R*TK/(self.p*1000)  #ideal gas approximation for volume
@@ -91,10 +109,10 @@ class steam():
                 self.T=Tsat
                 self.s=sf+self.x*(sg-sf)
                 self.v=vf+self.x*(vg-vf)
-            else: #interpolate with griddata
+            else: #interpolate on the superheated table
                 self.region='Superheated'
-                self.T = float(griddata((hcol, pcol), tcol, (self.h, self.p)))  #use griddata to interpolate with h & P the superheated table
-                self.s = float(griddata((hcol, pcol), scol, (self.h, self.p)))  #use griddata to interpolate with h & P the superheated table
+                P, T, h, s, v = superheated_props('Ph', self.p, self.h, method='linear')  #interpolate with h & P the superheated table
+                self.T, self.s = T, s
         elif self.s!=None:
             self.x=(self.s-sf)/(sg-sf)
             if self.x<=1.0: #manual interpolation
@@ -102,12 +120,24 @@ class steam():
                 self.T=Tsat
                 self.h=hf+self.x*(hg-hf)
                 self.v=vf+self.x*(vg-vf)
-            else: #interpolate with griddata
+            else: #interpolate on the superheated table
                 self.region = 'Superheated'
-                self.T = float(griddata((scol, pcol), tcol, (self.s, self.p)))  #use griddata to interpolate with s & P the superheated table
-                self.h = float(griddata((scol, pcol), scol, (self.s, self.p)))  #use griddata to interpolate with s & P the superheated table
+                P, T, h, s, v = superheated_props('Ps', self.p, self.s, method='linear')  #interpolate with s & P the superheated table
+                self.T, self.h = T, h
         #endregion
 
+    def _calc_backend(self):
+        '''
+        calc with a property backend: the state is resolved as a batch of one (see Steam_backends.py)
+        '''
+        backend=get_backend(self.backend)
+        given=next(c for c in 'Txhs' if getattr(self, c) is not None)
+        Tsat, self.hf, self.hg, self.sf, self.sg, self.vf, self.vg = backend.sat_props_P([self.p])[0]
+        state=backend.calc_states('P'+given, [self.p], [getattr(self, given)])[0]
+        self.T, self.x, self.v, self.h, self.s = (float(state[c]) for c in 'Txvhs')
+        region=region_name(state['region'])
+        self.region=None if region is None else region.capitalize() #e.g. 'Superheated', like the tables
+
     def print(self):
         """
         This prints a nicely formatted report of the steam properties.
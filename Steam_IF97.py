@@ -0,0 +1,322 @@
+# IAPWS-IF97 industrial formulation for water and steam, vectorized with numpy (used by Steam_backends.IF97Backend)
+#
+# Units here are the ones of the IF97 release: p in MPa, T in K, h in kJ/kg, s in kJ/(kg*K), v in m^3/kg.
+# Regions: 1 compressed liquid, 2 vapor, 3 near-critical (Helmholtz function of density and T), 4 saturation curve,
+# 5 high temperature vapor.  Valid for 273.15 K <= T <= 1073.15 K at p <= 100 MPa and up to 2273.15 K at p <= 50 MPa.
+
+import numpy as np
+
+from Steam_inverse import first_bracket, solve_bracketed
+
+R = 0.461526  # kJ/(kg*K)
+T_CRIT = 647.096  # K
+P_CRIT = 22.064  # MPa
+RHO_CRIT = 322.0  # kg/m^3
+T_MIN, T_MAX, T_MAX5 = 273.15, 1073.15, 2273.15  # K
+P_MAX, P_MAX5 = 100.0, 50.0  # MPa
+T_13 = 623.15  # K, the boundary between regions 1 and 3
+
+# region 1: Gibbs function gamma(pi, tau) = sum n * (7.1 - pi)**I * (tau - 1.222)**J, pi = p/16.53, tau = 1386/T
+_I1 = np.array([0, 0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 4, 4, 4, 5, 8, 8, 21, 23, 29, 30, 31,
+                32])
+_J1 = np.array([-2, -1, 0, 1, 2, 3, 4, 5, -9, -7, -1, 0, 1, 3, -3, 0, 1, 3, 17, -4, 0, 6, -5, -2, 10, -8, -11, -6, -29,
+                -31, -38, -39, -40, -41])
+_N1 = np.array([0.14632971213167, -0.84548187169114, -0.37563603672040e1, 0.33855169168385e1, -0.95791963387872,
+                0.15772038513228, -0.16616417199501e-1, 0.81214629983568e-3, 0.28319080123804e-3,
+                -0.60706301565874e-3, -0.18990068218419e-1, -0.32529748770505e-1, -0.21841717175414e-1,
+                -0.52838357969930e-4, -0.47184321073267e-3, -0.30001780793026e-3, 0.47661393906987e-4,
+                -0.44141845330846e-5, -0.72694996297594e-15, -0.31679644845054e-4, -0.28270797985312e-5,
+                -0.85205128120103e-9, -0.22425281908000e-5, -0.65171222895601e-6, -0.14341729937924e-12,
+                -0.40516996860117e-6, -0.12734301741641e-8, -0.17424871230634e-9, -0.68762131295531e-18,
+                0.14478307828521e-19, 0.26335781662795e-22, -0.11947622640071e-22, 0.18228094581404e-23,
+                -0.93537087292458e-25])
+
+# region 2: gamma = ln(pi) + sum n0 * tau**J0 + sum n * pi**I * (tau - 0.5)**J, pi = p/1, tau = 540/T
+_J02 = np.array([0, 1, -5, -4, -3, -2, -1, 2, 3])
+_N02 = np.array([-0.96927686500217e1, 0.10086655968018e2, -0.56087911283020e-2, 0.71452738081455e-1,
+                 -0.40710498223928, 0.14240819171444e1, -0.43839511319450e1, -0.28408632460772, 0.21268463753307e-1])
+_I2 = np.array([1, 1, 1, 1, 1, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 4, 4, 4, 5, 6, 6, 6, 7, 7, 7, 8, 8, 9, 10, 10, 10, 16, 16,
+                18, 20, 20, 20, 21, 22, 23, 24, 24, 24])
+_J2 = np.array([0, 1, 2, 3, 6, 1, 2, 4, 7, 36, 0, 1, 3, 6, 35, 1, 2, 3, 7, 3, 16, 35, 0, 11, 25, 8, 36, 13, 4, 10, 14,
+                29, 50, 57, 20, 35, 48, 21, 53, 39, 26, 40, 58])
+_N2 = np.array([-0.17731742473213e-2, -0.17834862292358e-1, -0.45996013696365e-1, -0.57581259083432e-1,
+                -0.50325278727930e-1, -0.33032641670203e-4, -0.18948987516315e-3, -0.39392777243355e-2,
+                -0.43797295650573e-1, -0.26674547914087e-4, 0.20481737692309e-7, 0.43870667284435e-6,
+                -0.32277677238570e-4, -0.15033924542148e-2, -0.40668253562649e-1, -0.78847309559367e-9,
+                0.12790717852285e-7, 0.48225372718507e-6, 0.22922076337661e-5, -0.16714766451061e-10,
+                -0.21171472321355e-2, -0.23895741934104e2, -0.59059564324270e-17, -0.12621808899101e-5,
+                -0.38946842435739e-1, 0.11256211360459e-10, -0.82311340897998e1, 0.19809712802088e-7,
+                0.10406965210174e-18, -0.10234747095929e-12, -0.10018179379511e-8, -0.80882908646985e-10,
+                0.10693031879409, -0.33662250574171, 0.89185845355421e-24, 0.30629316876232e-12,
+                -0.42002467698208e-5, -0.59056029685639e-25, 0.37826947613457e-5, -0.12768608934681e-14,
+                0.73087610595061e-28, 0.55414715350778e-16, -0.94369707241210e-6])
+
+# region 3: Helmholtz function phi = n1 * ln(delta) + sum n * delta**I * tau**J, delta = rho/322, tau = 647.096/T
+_N31 = 0.10658070028513e1
+_I3 = np.array([0, 0, 0, 0, 0, 0, 0, 1, 1, 1, 1, 2, 2, 2, 2, 2, 2, 3, 3, 3, 3, 3, 4, 4, 4, 4, 5, 5, 5, 6, 6, 6, 7, 8, 9,
+                9, 10, 10, 11])
+_J3 = np.array([0, 1, 2, 7, 10, 12, 23, 2, 6, 15, 17, 0, 2, 6, 7, 22, 26, 0, 2, 4, 16, 26, 0, 2, 4, 26, 1, 3, 26, 0, 2,
+                26, 2, 26, 2, 26, 0, 1, 26])
+_N3 = np.array([-0.15732845290239e2, 0.20944396974307e2, -0.76867707878716e1, 0.26185947787954e1,
+                -0.28080781148620e1, 0.12053369696517e1, -0.84566812812502e-2, -0.12654315477714e1,
+                -0.11524407806681e1, 0.88521043984318, -0.64207765181607, 0.38493460186671, -0.85214708824206,
+                0.48972281541877e1, -0.30502617256965e1, 0.39420536879154e-1, 0.12558408424308,
+                -0.27999329698710, 0.13899799569460e1, -0.20189915023570e1, -0.82147637173963e-2,
+                -0.47596035734923, 0.43984074473500e-1, -0.44476435428739, 0.90572070719733, 0.70522450087967,
+                0.10770512626332, -0.32913623258954, -0.50871062041158, -0.22175400873096e-1, 0.94260751665092e-1,
+                0.16436278447961, -0.13503372241348e-1, -0.14834345352472e-1, 0.57922953628084e-3,
+                0.32308904703711e-2, 0.80964802996215e-4, -0.16557679795037e-3, -0.44923899061815e-4])
+
+# region 5: like region 2 with pi = p/1, tau = 1000/T and a residual part in tau (not tau - 0.5)
+_J05 = np.array([0, 1, -3, -2, -1, 2])
+_N05 = np.array([-0.13179983674201e2, 0.68540841634434e1, -0.24805148933466e-1, 0.36901534980333,
+                 -0.31161318213925e1, -0.32961626538917])
+_I5 = np.array([1, 1, 1, 2, 2, 3])
+_J5 = np.array([1, 2, 3, 3, 9, 7])
+_N5 = np.array([0.15736404855259e-2, 0.90153761673944e-3, -0.50270077677648e-2, 0.22440037409485e-5,
+                -0.41163275453471e-5, 0.37940977878020e-7])
+
+# region 4 (saturation curve) and the boundary between regions 2 and 3
+_N4 = np.array([0.11670521452767e4, -0.72421316703206e6, -0.17073846940092e2, 0.12020824702470e5,
+                -0.32325550322333e7, 0.14915108613530e2, -0.48232657361591e4, 0.40511340542057e6,
+                -0.23855557567849, 0.65017534844798e3])
+_N23 = np.array([0.34805185628969e3, -0.11671859879975e1, 0.10192970039326e-2, 0.57254459862746e3,
+                 0.13918839778870e2])
+
+
+def psat(T):
+    """
+    Saturation pressure (region 4).
+    :param T: temperature (K), 273.15 <= T <= 647.096
+    :return: pressure (MPa), nan outside the saturation curve
+    """
+    T = np.asarray(T, dtype=float)
+    n = _N4
+    with np.errstate(invalid='ignore'):
+        theta = T + n[8] / (T - n[9])
+        A = theta ** 2 + n[0] * theta + n[1]
+        B = n[2] * theta ** 2 + n[3] * theta + n[4]
+        C = n[5] * theta ** 2 + n[6] * theta + n[7]
+        p = (2 * C / (-B + np.sqrt(B ** 2 - 4 * A * C))) ** 4
+        return np.where((T >= T_MIN) & (T <= T_CRIT), p, np.nan)
+
+
+def tsat(p):
+    """
+    Saturation temperature (region 4).
+    :param p: pressure (MPa), 611.213 Pa <= p <= 22.064 MPa
+    :return: temperature (K), nan outside the saturation curve
+    """
+    p = np.asarray(p, dtype=float)
+    n = _N4
+    with np.errstate(invalid='ignore'):
+        beta = p ** 0.25
+        E = beta ** 2 + n[2] * beta + n[5]
+        F = n[0] * beta ** 2 + n[3] * beta + n[6]
+        G = n[1] * beta ** 2 + n[4] * beta + n[7]
+        D = 2 * G / (-F - np.sqrt(F ** 2 - 4 * E * G))
+        T = (n[9] + D - np.sqrt((n[9] + D) ** 2 - 4 * (n[8] + n[9] * D))) / 2
+        return np.where((p >= 611.212677e-6) & (p <= P_CRIT), T, np.nan)
+
+
+def b23_p(T):
+    """
+    Pressure (MPa) on the boundary between regions 2 and 3 at T (K).
+    """
+    return _N23[0] + _N23[1] * T + _N23[2] * T ** 2
+
+
+def _powers(base, exponents):
+    """
+    base[..., None] ** exponents without 0**negative warnings (the bases here are never 0 where it matters).
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.asarray(base, dtype=float)[..., None] ** exponents
+
+
+def _region1(p, T):
+    """
+    :return: (h, s, v) from the region 1 Gibbs function
+    """
+    pi, tau = p / 16.53, 1386.0 / T
+    a, b = 7.1 - pi, tau - 1.222
+    aI, bJ = _powers(a, _I1), _powers(b, _J1)
+    aI1, bJ1 = _powers(a, _I1 - 1), _powers(b, _J1 - 1)
+    g = np.sum(_N1 * aI * bJ, axis=-1)
+    g_pi = np.sum(-_N1 * _I1 * aI1 * bJ, axis=-1)
+    g_tau = np.sum(_N1 * aI * _J1 * bJ1, axis=-1)
+    h = R * T * tau * g_tau
+    s = R * (tau * g_tau - g)
+    v = R * T / (p * 1000) * pi * g_pi
+    return h, s, v
+
+
+def _region2(p, T):
+    """
+    :return: (h, s, v) from the region 2 Gibbs function
+    """
+    pi, tau = p, 540.0 / T
+    b = tau - 0.5
+    g0 = np.log(pi) + np.sum(_N02 * _powers(tau, _J02), axis=-1)
+    g0_tau = np.sum(_N02 * _J02 * _powers(tau, _J02 - 1), axis=-1)
+    piI, bJ = _powers(pi, _I2), _powers(b, _J2)
+    gr = np.sum(_N2 * piI * bJ, axis=-1)
+    gr_pi = np.sum(_N2 * _I2 * _powers(pi, _I2 - 1) * bJ, axis=-1)
+    gr_tau = np.sum(_N2 * piI * _J2 * _powers(b, _J2 - 1), axis=-1)
+    h = R * T * tau * (g0_tau + gr_tau)
+    s = R * (tau * (g0_tau + gr_tau) - (g0 + gr))
+    v = R * T / (p * 1000) * pi * (1 / pi + gr_pi)
+    return h, s, v
+
+
+def _region5(p, T):
+    """
+    :return: (h, s, v) from the region 5 Gibbs function
+    """
+    pi, tau = p, 1000.0 / T
+    g0 = np.log(pi) + np.sum(_N05 * _powers(tau, _J05), axis=-1)
+    g0_tau = np.sum(_N05 * _J05 * _powers(tau, _J05 - 1), axis=-1)
+    piI, tJ = _powers(pi, _I5), _powers(tau, _J5)
+    gr = np.sum(_N5 * piI * tJ, axis=-1)
+    gr_pi = np.sum(_N5 * _I5 * _powers(pi, _I5 - 1) * tJ, axis=-1)
+    gr_tau = np.sum(_N5 * piI * _J5 * _powers(tau, _J5 - 1), axis=-1)
+    h = R * T * tau * (g0_tau + gr_tau)
+    s = R * (tau * (g0_tau + gr_tau) - (g0 + gr))
+    v = R * T / (p * 1000) * pi * (1 / pi + gr_pi)
+    return h, s, v
+
+
+def _region3(rho, T):
+    """
+    :return: (p, h, s, dp/drho) from the region 3 Helmholtz function
+    """
+    delta, tau = rho / RHO_CRIT, T_CRIT / T
+    dI, tJ = _powers(delta, _I3), _powers(tau, _J3)
+    dI1 = _powers(delta, _I3 - 1)
+    phi = _N31 * np.log(delta) + np.sum(_N3 * dI * tJ, axis=-1)
+    phi_d = _N31 / delta + np.sum(_N3 * _I3 * dI1 * tJ, axis=-1)
+    phi_dd = -_N31 / delta ** 2 + np.sum(_N3 * _I3 * (_I3 - 1) * _powers(delta, _I3 - 2) * tJ, axis=-1)
+    phi_t = np.sum(_N3 * dI * _J3 * _powers(tau, _J3 - 1), axis=-1)
+    p = rho * R * T * delta * phi_d / 1000
+    h = R * T * (tau * phi_t + delta * phi_d)
+    s = R * (tau * phi_t - phi)
+    dp = R * T * (2 * delta * phi_d + delta ** 2 * phi_dd) / 1000
+    return p, h, s, dp
+
+
+_RHO_NODES = np.linspace(60.0, 800.0, 75)  # density nodes for bracketing the region 3 density (kg/m^3)
+
+
+def region3_density(p, T, liquid):
+    """
+    Solves the region 3 Helmholtz function for the density at p and T.
+    :param p: pressures (MPa) (n,)
+    :param T: temperatures (K) (n,)
+    :param liquid: (n,) True to take the densest root, False the lightest.  Below the critical temperature
+                   the Helmholtz function has a liquid and a vapor root; above it there is only one.
+    :return: densities (kg/m^3), nan where there is no root
+    """
+    p, T, liquid = np.broadcast_arrays(np.asarray(p, dtype=float), np.asarray(T, dtype=float), np.asarray(liquid))
+    p, T, liquid = p.ravel(), T.ravel(), liquid.ravel()
+    # z = rho for the vapor root and z = -rho for the liquid root, so the first bracket in increasing z is the
+    # root wanted in both cases
+    sign = np.where(liquid, -1.0, 1.0)
+    nodes = np.concatenate((-_RHO_NODES[::-1], _RHO_NODES))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        node_p = _region3(np.abs(nodes), T[:, None])[0]
+    node_residuals = node_p - p[:, None]
+    node_residuals[(nodes[None, :] < 0) != liquid[:, None]] = np.nan  # only search the half of the wanted root
+    rows, lo, hi, r_lo = first_bracket(nodes, node_residuals)
+    rho = np.full(len(p), np.nan)
+    if len(rows):
+        def fun(z, sub):
+            r = rows[sub]
+            pz, h, s, dp = _region3(np.abs(z), T[r])
+            return pz - p[r], dp * sign[r]
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            rho[rows] = np.abs(solve_bracketed(fun, lo, hi, r_lo).root)
+    return rho
+
+
+def region(p, T):
+    """
+    The IF97 region of single-phase states (on the saturation curve, liquid is region 1 or 3).
+    :param p: pressure (MPa)
+    :param T: temperature (K)
+    :return: int array: 1, 2, 3 or 5, and 0 outside the range of IF97
+    """
+    p, T = np.broadcast_arrays(np.asarray(p, dtype=float), np.asarray(T, dtype=float))
+    with np.errstate(invalid='ignore'):
+        r = np.zeros(p.shape, int)
+        ok = (p > 0) & (p <= P_MAX)
+        r[ok & (T >= T_MIN) & (T <= T_13)] = 2
+        r[ok & (T >= T_MIN) & (T <= T_13) & (p >= psat(np.minimum(T, T_13)))] = 1
+        r[ok & (T > T_13) & (T <= 863.15)] = 2
+        r[ok & (T > T_13) & (T <= 863.15) & (p > b23_p(T))] = 3
+        r[ok & (T > 863.15) & (T <= T_MAX)] = 2
+        r[(p > 0) & (p <= P_MAX5) & (T > T_MAX) & (T <= T_MAX5)] = 5
+    return r
+
+
+def props_pT(p, T, liquid=None):
+    """
+    Single-phase properties at p and T.
+    :param p: pressure (MPa)
+    :param T: temperature (K)
+    :param liquid: optional boolean array to pick the phase of states on the saturation curve (otherwise liquid)
+    :return: (h, s, v) arrays, nan outside the range of IF97
+    """
+    p, T = np.broadcast_arrays(np.asarray(p, dtype=float), np.asarray(T, dtype=float))
+    shape = p.shape
+    p, T = p.ravel(), T.ravel()
+    r = region(p, T)
+    if liquid is not None:
+        liquid = np.broadcast_to(liquid, shape).ravel()
+        with np.errstate(invalid='ignore'):
+            on_curve = np.abs(p - psat(T)) <= 1e-12 * p
+        vapor = on_curve & ~liquid
+        r[vapor & (r == 1)] = 2
+    h, s, v = (np.full(len(p), np.nan) for i in range(3))
+    for code, fun in ((1, _region1), (2, _region2), (5, _region5)):
+        m = r == code
+        if m.any():
+            h[m], s[m], v[m] = fun(p[m], T[m])
+    m = r == 3
+    if m.any():
+        is_liquid = T[m] < T_CRIT
+        with np.errstate(invalid='ignore'):
+            is_liquid &= p[m] >= psat(np.minimum(T[m], T_CRIT))
+        if liquid is not None:
+            is_liquid = np.where(vapor[m], False, is_liquid)
+        rho = region3_density(p[m], T[m], is_liquid)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            h[m], s[m] = _region3(rho, T[m])[1:3]
+        v[m] = 1 / rho
+    return h.reshape(shape), s.reshape(shape), v.reshape(shape)
+
+
+def saturation_T(T):
+    """
+    Saturated liquid and vapor properties at T.
+    :param T: temperature (K)
+    :return: (n, 7) array [psat (MPa), hf, hg, sf, sg, vf, vg], nan off the saturation curve
+    """
+    T = np.atleast_1d(np.asarray(T, dtype=float))
+    p = psat(T)
+    hf, sf, vf = props_pT(p, T, liquid=np.ones(T.shape, bool))
+    hg, sg, vg = props_pT(p, T, liquid=np.zeros(T.shape, bool))
+    return np.stack((p, hf, hg, sf, sg, vf, vg), axis=-1)
+
+
+def saturation_p(p):
+    """
+    Saturated liquid and vapor properties at p.
+    :param p: pressure (MPa)
+    :return: (n, 7) array [Tsat (K), hf, hg, sf, sg, vf, vg], nan off the saturation curve
+    """
+    p = np.atleast_1d(np.asarray(p, dtype=float))
+    T = tsat(p)
+    sat = saturation_T(T)
+    sat[..., 0] = T
+    return sat
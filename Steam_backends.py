@@ -0,0 +1,442 @@
+# Interchangeable property backends: every backend resolves batches of states into Steam_batch.STATE_DTYPE rows
+#
+#   'table'        steam tables and saturation splines, Clough-Tocher on the superheated table (Steam_batch)
+#   'table_linear' the same with linear interpolation on the superheated table
+#   'table_fast'   the same with the precomputed bicubic grids (Steam_fastgrid.py)
+#   'if97'         the IAPWS-IF97 equations (Steam_IF97.py), also covers compressed liquid and supercritical states
+#   'xsteam'       pyXSteam, one state at a time (a reference to check the others against)
+#
+# Steam_SI, steam, rankine and the sweeps take a backend name (or a PropertyBackend) as their backend argument.
+
+import threading
+from abc import ABC, abstractmethod
+import numpy as np
+
+from Steam_batch import (calc_states, prepare_inputs, empty_states, finish_states, fill_saturated, quality,
+                         mix, REGION_LIQUID, REGION_SUPERHEATED, REGION_SUPERCRITICAL)
+from Steam_inverse import solve_on_nodes
+
+DEFAULT_BACKEND = 'table'
+
+# column positions in the saturated property vectors (first column is Tsat or Psat)
+_TSAT = 0
+
+
+class PropertyBackend(ABC):
+    """
+    The interface of a backend; a backend missing one of its abstract methods cannot be created.  Units are the
+    ones of Steam_SI: P in kPa, T in C, v in m^3/kg, h in kJ/kg, s in kJ/(kg*K).
+    """
+    name = None
+
+    @abstractmethod
+    def calc_states(self, case, a, b):
+        """
+        Resolves many states given by the same pair of properties.
+        :param case: one of Steam_batch.CASES (the letters may be in either order)
+        :param a: values of the first property of case
+        :param b: values of the second property of case (same length as a)
+        :return: structured array of Steam_batch.STATE_DTYPE; rows that could not be resolved have region
+                 REGION_NONE
+        """
+
+    @abstractmethod
+    def sat_props_P(self, P):
+        """
+        :param P: pressures (kPa)
+        :return: (n, 7) array [Tsat (C), hf, hg, sf, sg, vf, vg], nan above the critical point
+        """
+
+    @abstractmethod
+    def sat_props_T(self, T):
+        """
+        :param T: temperatures (C)
+        :return: (n, 7) array [Psat (kPa), hf, hg, sf, sg, vf, vg], nan above the critical point
+        """
+
+
+class TableBackend(PropertyBackend):
+    def __init__(self, method='cubic'):
+        """
+        The steam tables: Steam_batch.calc_states with a fixed interpolation method.
+        :param method: 'cubic', 'linear', 'fast' or 'fast_linear' (see Steam_superheated.superheated_props)
+        """
+        self.method = method
+        self.name = 'table' if method == 'cubic' else 'table_' + method
+
+    def calc_states(self, case, a, b):
+        return calc_states(case, a, b, self.method)
+
+    def sat_props_P(self, P):
+        from Steam_sat import saturation_curve
+        return saturation_curve().by_P(np.atleast_1d(np.asarray(P, dtype=float)) / 100)
+
+    def sat_props_T(self, T):
+        from Steam_sat import saturation_curve
+        sat = saturation_curve().by_T(np.atleast_1d(np.asarray(T, dtype=float)))
+        sat[:, _TSAT] *= 100  # bar to kPa
+        return sat
+
+
+class EquationBackend(PropertyBackend):
+    """
+    Resolves all 15 cases from three primitives of an equation of state: single_phase (h, s and v at P and T),
+    sat_props_P and sat_props_T.  Cases that are not explicit in P and T are found with the bracketed solver
+    of Steam_inverse.py: each row's interval is scanned on SCAN points for the first sign change, which is then
+    refined by safeguarded Newton steps with finite difference slopes.  The vh, vs and hs cases solve for the
+    pressure with a nested solve for the temperature, so they are much slower than the others.
+    """
+    P_MIN, P_MAX = 0.1, 100000.0  # kPa
+    T_MIN, T_MAX = 0.0, 800.0  # C
+    P_CRIT, T_CRIT = 22064.0, 373.946  # kPa, C
+    SCAN = np.linspace(0.0, 1.0, 17)
+    PAIR_SCAN = np.linspace(0.0, 1.0, 65)  # the pressure range of a line of constant v or h can be narrow
+    XTOL = 1e-12  # relative to the scanned interval
+    _DU = 1e-7  # step of the finite difference slopes, relative to the scanned interval
+
+    @abstractmethod
+    def single_phase(self, P, T, liquid):
+        """
+        :param P: pressures (kPa)
+        :param T: temperatures (C)
+        :param liquid: boolean array picking the phase of states on the saturation curve
+        :return: (h, s, v) arrays, nan outside the range of the equations
+        """
+
+    def t_max(self, P):
+        """
+        :return: highest temperature (C) of the equations at pressures P (kPa)
+        """
+        return np.full(np.shape(P), self.T_MAX)
+
+    def p_max(self, T):
+        """
+        :return: highest pressure (kPa) of the equations at temperatures T (C)
+        """
+        return np.full(np.shape(T), self.P_MAX)
+
+    def calc_states(self, case, a, b):
+        case, a, b = prepare_inputs(case, a, b)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if case[0] == 'P':
+                out = self._at_P(case[1], a, b)
+            elif case[0] == 'T':
+                out = self._at_T(case[1], a, b)
+            elif case[0] == 'x':
+                out = self._at_x(case[1], a, b)
+            else:
+                out = self._pair(case, a, b)
+            return finish_states(out, case, a, b)
+
+    def solve(self, fun, lo, hi, log=False, scan=None):
+        """
+        Finds the first root of fun between lo and hi for every row.
+        :param fun: function(z, rows) -> residuals at z for the given rows (nan where undefined)
+        :param lo: lower ends of the intervals (n,)
+        :param hi: upper ends of the intervals (n,)
+        :param log: True to scan and solve in log(z) (for pressures)
+        :param scan: points in [0, 1] where each interval is scanned, default SCAN
+        :return: roots (n,), nan where the interval has no sign change
+        """
+        n = len(lo)
+        if n == 0:
+            return np.zeros(0)
+        scan = self.SCAN if scan is None else scan
+        z_lo, z_hi = lo, hi
+        if log:
+            lo, hi = np.log(lo), np.log(hi)
+        width = hi - lo
+
+        def z_of(u, rows):
+            z = lo[rows] + u * width[rows]
+            if log:
+                z = np.exp(z)
+            return np.clip(z, z_lo[rows], z_hi[rows])  # exactly the ends, not a rounding error outside
+
+        m = len(scan)
+        rows = np.repeat(np.arange(n), m)
+        node_residuals = fun(z_of(np.tile(scan, n), rows), rows).reshape(n, m)
+
+        def fun_u(u, rows):
+            # the residual and its finite difference slope from one call
+            both = np.concatenate((rows, rows))
+            r = fun(z_of(np.concatenate((u, u + self._DU)), both), both)
+            return r[:len(u)], (r[len(u):] - r[:len(u)]) / self._DU
+
+        u = solve_on_nodes(fun_u, scan, node_residuals, self.XTOL, 60).root
+        return z_of(u, np.arange(n))
+
+    def _fill_single(self, out, mask, P, T, liquid):
+        """
+        Fills the rows in mask with single-phase states at P and T.
+        """
+        P, T, liquid = P[mask], T[mask], liquid[mask]
+        h, s, v = self.single_phase(P, T, liquid)
+        code = np.where(P >= self.P_CRIT, np.where(T >= self.T_CRIT, REGION_SUPERCRITICAL, REGION_LIQUID),
+                        np.where(liquid, REGION_LIQUID, REGION_SUPERHEATED))
+        out['P'][mask], out['T'][mask], out['h'][mask], out['s'][mask], out['v'][mask] = P, T, h, s, v
+        out['x'][mask] = np.select([code == REGION_LIQUID, code == REGION_SUPERHEATED], [0.0, 1.0], np.nan)
+        out['region'][mask] = code
+
+    def _at_P(self, prop, P, b):
+        """
+        States at pressures P with the temperature, quality, v, h or s given in b.
+        """
+        out = empty_states(len(P))
+        out['P'] = P
+        sat = self.sat_props_P(P)
+        tsat = sat[:, _TSAT]
+        if prop == 'x':
+            out['T'] = tsat
+            fill_saturated(out, ~np.isnan(tsat), sat, b)
+            return out
+        if prop == 'T':
+            vapor = b == tsat  # indeterminate, but assume saturated vapor (like the tables)
+            fill_saturated(out, vapor, sat, np.ones(len(P)))
+            self._fill_single(out, ~vapor, P, b, b < tsat)
+            return out
+        x = quality(sat, b, prop)
+        two_phase = (x >= 0) & (x <= 1)
+        out['T'][two_phase] = tsat[two_phase]
+        fill_saturated(out, two_phase, sat, x)
+        single = ~two_phase  # includes every state above the critical pressure
+        liquid = x < 0
+        known = ~np.isnan(tsat)
+        lo = np.where(known & ~liquid, tsat, self.T_MIN)[single]
+        hi = np.where(known & liquid, tsat, self.t_max(P))[single]
+        Ps, bs, ls = P[single], b[single], liquid[single]
+        column = 'hsv'.index(prop)
+
+        def residual(T, rows):
+            return self.single_phase(Ps[rows], T, ls[rows])[column] - bs[rows]
+
+        T = np.full(len(P), np.nan)
+        T[single] = self.solve(residual, lo, hi)
+        self._fill_single(out, single, P, T, liquid)
+        return out
+
+    def _at_T(self, prop, T, b):
+        """
+        States at temperatures T with the quality, v, h or s given in b.
+        """
+        out = empty_states(len(T))
+        out['T'] = T
+        sat = self.sat_props_T(T)
+        psat = sat[:, _TSAT]
+        if prop == 'x':
+            out['P'] = psat
+            fill_saturated(out, ~np.isnan(psat), sat, b)
+            return out
+        x = quality(sat, b, prop)
+        two_phase = (x >= 0) & (x <= 1)
+        out['P'][two_phase] = psat[two_phase]
+        fill_saturated(out, two_phase, sat, x)
+        single = ~two_phase  # includes every state above the critical temperature
+        liquid = x < 0
+        known = ~np.isnan(psat)
+        lo = np.where(known & liquid, psat, self.P_MIN)[single]
+        hi = np.where(known & ~liquid, psat, self.p_max(T))[single]
+        Ts, bs, ls = T[single], b[single], liquid[single]
+        column = 'hsv'.index(prop)
+
+        def residual(P, rows):
+            return self.single_phase(P, Ts[rows], ls[rows])[column] - bs[rows]
+
+        P = np.full(len(T), np.nan)
+        P[single] = self.solve(residual, lo, hi, log=True)
+        self._fill_single(out, single, P, T, liquid)
+        return out
+
+    def _at_x(self, prop, x, b):
+        """
+        Saturated states with the quality and one of v, h or s: the lowest saturation temperature that matches.
+        """
+        n = len(x)
+
+        def residual(T, rows):
+            return mix(self.sat_props_T(T), x[rows], prop) - b[rows]
+
+        T = self.solve(residual, np.full(n, self.T_MIN), np.full(n, self.T_CRIT - 1e-6))
+        sat = self.sat_props_T(T)
+        out = empty_states(n)
+        out['T'], out['P'] = T, sat[:, _TSAT]
+        fill_saturated(out, ~np.isnan(T), sat, x)
+        return out
+
+    def _pair(self, case, a, b):
+        """
+        The vh, vs and hs cases: the pressure where the state at (P, a) has the given b.  Along a line of
+        constant v or h the other property is monotone in P, through the two-phase region as well.
+        """
+        n = len(a)
+
+        def residual(P, rows):
+            return self._at_P(case[0], P, a[rows])[case[1]] - b[rows]
+
+        P = self.solve(residual, np.full(n, self.P_MIN), np.full(n, self.P_MAX), log=True, scan=self.PAIR_SCAN)
+        return self._at_P(case[0], P, a)
+
+
+class IF97Backend(EquationBackend):
+    """
+    The IAPWS-IF97 equations (Steam_IF97.py).  Covers 0-800 C up to 100 MPa and 800-2000 C up to 50 MPa,
+    including compressed liquid and supercritical states that are outside the steam tables.
+    """
+    name = 'if97'
+    T_MAX5 = 2000.0  # C, region 5
+    P_MAX5 = 50000.0  # kPa, region 5
+
+    def single_phase(self, P, T, liquid):
+        from Steam_IF97 import props_pT
+        return props_pT(np.asarray(P) / 1000, np.asarray(T) + 273.15, liquid)
+
+    def t_max(self, P):
+        return np.where(np.asarray(P) <= self.P_MAX5, self.T_MAX5, self.T_MAX)
+
+    def p_max(self, T):
+        return np.where(np.asarray(T) <= self.T_MAX, self.P_MAX, self.P_MAX5)
+
+    def sat_props_P(self, P):
+        from Steam_IF97 import saturation_p
+        sat = saturation_p(np.atleast_1d(np.asarray(P, dtype=float)) / 1000)
+        sat[:, _TSAT] -= 273.15
+        return sat
+
+    def sat_props_T(self, T):
+        from Steam_IF97 import saturation_T
+        sat = saturation_T(np.atleast_1d(np.asarray(T, dtype=float)) + 273.15)
+        sat[:, _TSAT] *= 1000  # MPa to kPa
+        return sat
+
+
+class XSteamBackend(EquationBackend):
+    """
+    pyXSteam (m/kg/sec/C/bar/W units), called once per state.  The Ph, Ps and hs cases use the XSteam inverse
+    functions directly; the other cases are solved by EquationBackend on the XSteam primitives.
+    """
+    name = 'xsteam'
+    T_MAX = 2000.0
+
+    def __init__(self):
+        from Calc_state import xsteam
+        self.steam = xsteam()
+
+    def _each(self, fun, *args):
+        """
+        Calls an XSteam function for every element (nan where XSteam has no value).
+        """
+        args = np.broadcast_arrays(*[np.atleast_1d(np.asarray(arg, dtype=float)) for arg in args])
+        out = np.full(args[0].shape, np.nan)
+        for i, values in enumerate(zip(*args)):
+            if any(value != value for value in values):  # value != value for nan
+                continue
+            try:
+                out[i] = fun(*values)
+            except (ValueError, ZeroDivisionError, OverflowError):  # e.g., log of a negative density at the edges
+                pass
+        return out
+
+    def single_phase(self, P, T, liquid):
+        st = self.steam
+        P, T, liquid = np.broadcast_arrays(np.atleast_1d(P), np.atleast_1d(T), np.atleast_1d(liquid))
+        h, s, v = self._each(st.h_pt, P / 100, T), self._each(st.s_pt, P / 100, T), self._each(st.v_pt, P / 100, T)
+        # h_pt and the others pick one phase on the saturation curve; use the phase asked for instead
+        below = P < self.P_CRIT
+        on_curve = np.nonzero(below & (T == self._each(st.tsat_p, np.where(below, P, np.nan) / 100)))[0]
+        for i in on_curve:
+            p = P[i] / 100
+            if liquid[i]:
+                h[i], s[i], v[i] = st.hL_p(p), st.sL_p(p), st.vL_p(p)
+            else:
+                h[i], s[i], v[i] = st.hV_p(p), st.sV_p(p), st.vV_p(p)
+        return h, s, v
+
+    def sat_props_P(self, P):
+        st = self.steam
+        p = np.atleast_1d(np.asarray(P, dtype=float)) / 100
+        funs = (st.tsat_p, st.hL_p, st.hV_p, st.sL_p, st.sV_p, st.vL_p, st.vV_p)
+        sat = np.stack([self._each(fun, p) for fun in funs], axis=-1)
+        sat[~(p * 100 < self.P_CRIT)] = np.nan
+        return sat
+
+    def sat_props_T(self, T):
+        st = self.steam
+        T = np.atleast_1d(np.asarray(T, dtype=float))
+        funs = (st.psat_t, st.hL_t, st.hV_t, st.sL_t, st.sV_t, st.vL_t, st.vV_t)
+        sat = np.stack([self._each(fun, T) for fun in funs], axis=-1)
+        sat[:, _TSAT] *= 100  # bar to kPa
+        sat[~(T < self.T_CRIT)] = np.nan
+        return sat
+
+    def _at_P(self, prop, P, b):
+        if prop not in 'hs':
+            return super()._at_P(prop, P, b)
+        out = empty_states(len(P))
+        out['P'] = P
+        sat = self.sat_props_P(P)
+        x = quality(sat, b, prop)
+        two_phase = (x >= 0) & (x <= 1)
+        out['T'][two_phase] = sat[two_phase, _TSAT]
+        fill_saturated(out, two_phase, sat, x)
+        single = ~two_phase
+        T = np.full(len(P), np.nan)
+        T[single] = self._each(self.steam.t_ph if prop == 'h' else self.steam.t_ps, P[single] / 100, b[single])
+        self._fill_single(out, single, P, T, x < 0)
+        return out
+
+    def _pair(self, case, a, b):
+        if case != 'hs':
+            return super()._pair(case, a, b)
+        return self._at_P('h', self._each(self.steam.p_hs, a, b) * 100, a)
+
+
+# name -> function that creates the backend (called once, on first use)
+BACKENDS = {
+    'table': lambda: TableBackend('cubic'),
+    'table_linear': lambda: TableBackend('linear'),
+    'table_fast': lambda: TableBackend('fast'),
+    'if97': IF97Backend,
+    'xsteam': XSteamBackend,
+}
+
+_lock = threading.Lock()
+_instances = {}
+
+
+def register_backend(name, factory):
+    """
+    Adds (or replaces) a backend that can then be chosen by name.
+    :param name: the name callers pass as backend
+    :param factory: function with no arguments that returns a PropertyBackend
+    """
+    with _lock:
+        BACKENDS[name] = factory
+        _instances.pop(name, None)
+
+
+def backend_names():
+    """
+    :return: the names of the registered backends
+    """
+    return list(BACKENDS)
+
+
+def get_backend(backend=None):
+    """
+    Returns the shared instance of a backend, creating it on first use.
+    :param backend: a name from BACKENDS, a PropertyBackend (returned as is) or None for DEFAULT_BACKEND
+    :return: PropertyBackend
+    """
+    if isinstance(backend, PropertyBackend):
+        return backend
+    name = DEFAULT_BACKEND if backend is None else backend
+    instance = _instances.get(name)
+    if instance is None:
+        with _lock:
+            instance = _instances.get(name)
+            if instance is None:
+                if name not in BACKENDS:
+                    raise ValueError('unknown property backend: {}'.format(name))
+                instance = BACKENDS[name]()
+                _instances[name] = instance
+    return instance
@@ -0,0 +1,251 @@
+# Vectorized state resolution: resolves whole arrays of property pairs at once (see Steam_SI.calc_many)
+
+import numpy as np
+
+import Steam_profile
+
+from Steam_sat import saturation_curve
+from Steam_inverse import quality_pressure, two_phase_temperature
+from Steam_superheated import superheated_props
+
+# the 15 supported property pairs (same as Steam_SI.calc)
+CASES = ('PT', 'Px', 'Pv', 'Ph', 'Ps', 'Tx', 'Tv', 'Th', 'Ts', 'xv', 'xh', 'xs', 'vh', 'vs', 'hs')
+_ORDER = 'PTxvhs'  # the order Steam_SI.calc checks the properties in
+
+# region codes stored in the 'region' field
+REGION_NONE = 0  # could not be resolved (e.g., outside the tables)
+REGION_SATURATED = 1
+REGION_SUPERHEATED = 2
+REGION_LIQUID = 3  # compressed liquid (equation backends only, the tables estimate it as saturated)
+REGION_SUPERCRITICAL = 4  # above the critical pressure and temperature (equation backends only)
+REGION_NAMES = {REGION_NONE: None, REGION_SATURATED: 'saturated', REGION_SUPERHEATED: 'superheated',
+                REGION_LIQUID: 'compressed liquid', REGION_SUPERCRITICAL: 'supercritical'}
+
+STATE_DTYPE = np.dtype([('P', float), ('T', float), ('x', float), ('h', float), ('s', float), ('v', float),
+                        ('region', np.int8)])
+
+# column positions in the vectors from Steam_sat (first column is Tsat or Psat)
+_HF, _HG, _SF, _SG, _VF, _VG = 1, 2, 3, 4, 5, 6
+_SAT_COLUMN = {'h': (_HF, _HG), 's': (_SF, _SG), 'v': (_VF, _VG)}
+
+
+def normalize_case(case):
+    """
+    Puts the letters of a case in the order Steam_SI uses (e.g., 'TP' -> 'PT').
+    :param case: two property letters from P, T, x, v, h, s
+    :return: (canonical case, True if the two inputs must be swapped)
+    """
+    if len(case) != 2 or case[0] not in _ORDER or case[1] not in _ORDER or case[0] == case[1]:
+        raise ValueError('unsupported property pair: {}'.format(case))
+    if _ORDER.index(case[0]) < _ORDER.index(case[1]):
+        return case, False
+    return case[::-1], True
+
+
+def region_name(code):
+    """
+    :param code: a region code from the 'region' field
+    :return: 'saturated', 'superheated', 'compressed liquid', 'supercritical' or None
+    """
+    return REGION_NAMES.get(int(code))
+
+
+def mix(sat, x, prop):
+    """
+    Two-phase value of a property from the quality.
+    :param sat: saturated property vectors (n, 7)
+    :param x: qualities (n,)
+    :param prop: 'h', 's' or 'v'
+    :return: (n,) array
+    """
+    f, g = _SAT_COLUMN[prop]
+    return x * (sat[:, g] - sat[:, f]) + sat[:, f]
+
+
+def quality(sat, value, prop):
+    """
+    Quality from a known two-phase property.
+    """
+    f, g = _SAT_COLUMN[prop]
+    return (value - sat[:, f]) / (sat[:, g] - sat[:, f])
+
+
+def _fill_superheated(out, mask, pair, a, b, method):
+    """
+    Fills the rows in mask from the superheated table.
+    """
+    if mask.any():
+        props = superheated_props(pair, a[mask], b[mask], method)
+        out['P'][mask], out['T'][mask], out['h'][mask], out['s'][mask], out['v'][mask] = props.T
+        out['x'][mask] = 1.0
+        out['region'][mask] = REGION_SUPERHEATED
+
+
+def fill_saturated(out, mask, sat, x):
+    """
+    Fills h, s, v and the region of the rows in mask from the quality.
+    """
+    out['x'][mask] = x[mask]
+    for prop in 'hsv':
+        out[prop][mask] = mix(sat[mask], x[mask], prop)
+    out['region'][mask] = REGION_SATURATED
+
+
+def _calc_P(case, P, b, out, method):
+    curve = saturation_curve()
+    sat = curve.by_P(P / 100)
+    tsat = sat[:, 0]
+    other = case[1]
+    if other == 'x':
+        out['T'] = tsat
+        fill_saturated(out, np.ones(len(P), bool), sat, b)
+    elif other in 'vhs':
+        x = quality(sat, b, other)
+        two_phase = x <= 1
+        out['T'][two_phase] = tsat[two_phase]
+        fill_saturated(out, two_phase, sat, x)
+        _fill_superheated(out, ~two_phase, case, P, b, method)  # includes states above the critical point
+    else:  # T
+        vapor = b == tsat  # indeterminate, but assume saturated vapor
+        fill_saturated(out, vapor, sat, np.ones(len(P)))
+        superheated = (b > tsat) | np.isnan(tsat)  # includes states above the critical point
+        _fill_superheated(out, superheated, case, P, b, method)
+        subcooled = b < tsat  # estimate the properties of the compressed liquid
+        psat = curve.by_T(b[subcooled])[:, 0] * 100
+        out['x'][subcooled] = 0.0
+        out['h'][subcooled] = sat[subcooled, _HF] + (P[subcooled] - psat) * sat[subcooled, _VF]
+        out['s'][subcooled] = sat[subcooled, _SF]
+        out['v'][subcooled] = sat[subcooled, _VF]
+        out['region'][subcooled] = REGION_SATURATED
+
+
+def _calc_T(case, T, b, out, method):
+    sat = saturation_curve().by_T(T)
+    psat = sat[:, 0] * 100  # bar to kPa
+    other = case[1]
+    if other == 'x':
+        out['P'] = psat
+        fill_saturated(out, np.ones(len(T), bool), sat, b)
+    else:
+        x = quality(sat, b, other)
+        two_phase = x <= 1
+        out['P'][two_phase] = psat[two_phase]
+        fill_saturated(out, two_phase, sat, x)
+        _fill_superheated(out, ~two_phase, case, T, b, method)  # includes states above the critical point
+
+
+def _calc_x(case, x, b, out):
+    """
+    Saturated states with the quality and one of v, h or s: search the saturation curve for the pressure.
+    """
+    Pbar = quality_pressure(x, case[1], b).root
+    sat = saturation_curve().by_P(Pbar)
+    out['P'] = Pbar * 100
+    out['T'] = sat[:, 0]
+    fill_saturated(out, ~np.isnan(Pbar), sat, x)
+
+
+def _calc_pair(case, a, b, out, method):
+    """
+    The vh, vs and hs cases.  First decide which rows are two-phase, then solve those on the saturation curve
+    and look the rest up in the superheated table.
+    """
+    curve = saturation_curve()
+    if case[0] == 'v':
+        two_phase = a < curve.critical[_VF]
+        tmax = curve.T_by_vg(a)  # temperature for x=1
+        sat_max = curve.by_T(tmax)
+        limit = sat_max[:, _HG] if case[1] == 'h' else sat_max[:, _SG]
+        two_phase |= b <= limit
+    else:  # hs
+        # hg has a maximum, so a line of constant h above the critical point crosses the saturated vapor line
+        # twice (or once if h is below hg at the triple point).  The state is two-phase between the crossings.
+        left = curve.by_T(curve.T_by_hg_high(a))[:, _SG]
+        right = curve.by_T(curve.T_by_hg(a))[:, _SG]
+        right[a < curve.T_by_hg.x[0]] = np.inf
+        two_phase = (a < curve.critical[_HF]) | ((b > left) & (b <= right))
+
+    rows = np.nonzero(two_phase)[0]
+    T = two_phase_temperature(case, a[rows], b[rows]).root
+    sat = curve.by_T(T)
+    x = quality(sat, a[rows], case[0])
+    mask = np.zeros(len(a), bool)
+    mask[rows] = ~np.isnan(T)
+    out['T'][rows] = T
+    out['P'][rows] = sat[:, 0] * 100
+    x_all = np.full(len(a), np.nan)
+    x_all[rows] = x
+    sat_all = np.full((len(a), 7), np.nan)
+    sat_all[rows] = sat
+    fill_saturated(out, mask, sat_all, x_all)
+
+    _fill_superheated(out, ~two_phase, case, a, b, method)
+
+
+def prepare_inputs(case, a, b):
+    """
+    Checks the inputs of a batch and puts them in the order of the canonical case.
+    :return: (canonical case, a, b) with a and b flat float arrays of the same length
+    """
+    case, swap = normalize_case(case)
+    a = np.atleast_1d(np.asarray(a, dtype=float)).ravel()
+    b = np.atleast_1d(np.asarray(b, dtype=float)).ravel()
+    if swap:
+        a, b = b, a
+    if len(a) != len(b):
+        raise ValueError('the two property arrays must be the same length')
+    return case, a, b
+
+
+def empty_states(n):
+    """
+    :return: structured array of n STATE_DTYPE rows with every property nan and region REGION_NONE
+    """
+    out = np.zeros(n, STATE_DTYPE)
+    for name in 'PTxhsv':
+        out[name] = np.nan
+    return out
+
+
+def finish_states(out, case, a, b):
+    """
+    Puts the given properties back exactly.  The rows where a property is missing are marked REGION_NONE and
+    keep only the given properties, every other one (x included) is nan as in empty_states.
+    """
+    out[case[0]], out[case[1]] = a, b
+    unresolved = np.zeros(len(a), bool)
+    for name in 'PThsv':
+        unresolved |= np.isnan(out[name])
+    for name in 'PTxhsv':
+        if name not in case:
+            out[name][unresolved] = np.nan
+    out['region'][unresolved] = REGION_NONE
+    return out
+
+
+@Steam_profile.timed('Steam_batch.calc_states')
+def calc_states(case, a, b, method='cubic'):
+    """
+    Resolves many states at once.  This is the vectorized version of Steam_SI.calc: the region of every row is
+    classified with array operations and each region is interpolated in one call.
+    :param case: one of CASES (the letters may be in either order, e.g. 'TP')
+    :param a: values of the first property of case (P in kPa, T in C, x, v in m^3/kg, h in kJ/kg, s in kJ/(kg*K))
+    :param b: values of the second property of case (same length as a)
+    :param method: interpolation on the superheated table: 'cubic' (same as Steam_SI.calc), 'linear', or
+                   'fast'/'fast_linear' for the precomputed grids (see Steam_superheated.superheated_props)
+    :return: structured array with fields P, T, x, h, s, v and region (see REGION_NAMES).  Rows that could not be
+             resolved have region REGION_NONE.
+    """
+    case, a, b = prepare_inputs(case, a, b)
+    Steam_profile.count('batch rows', len(a))
+    out = empty_states(len(a))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if case[0] == 'P':
+            _calc_P(case, a, b, out, method)
+        elif case[0] == 'T':
+            _calc_T(case, a, b, out, method)
+        elif case[0] == 'x':
+            _calc_x(case, a, b, out)
+        else:
+            _calc_pair(case, a, b, out, method)
+        return finish_states(out, case, a, b)
@@ -0,0 +1,104 @@
+# Bounded LRU cache of resolved steam states, shared by Steam_SI.calc and steam.calc
+
+import threading
+from collections import OrderedDict
+
+import Steam_profile
+import Steam_tables
+
+
+class StateCache:
+    def __init__(self, maxsize=4096, tolerance=1e-9, enabled=True):
+        """
+        Remembers resolved states keyed on (kind, case, input values rounded to a multiple of tolerance,
+        table version), so repeated evaluations of the same state skip the interpolation entirely.
+        :param maxsize: maximum number of states kept; the least recently used state is evicted first
+        :param tolerance: inputs closer than this share a cache entry
+        :param enabled: False to bypass the cache
+        """
+        self.maxsize = maxsize
+        self.tolerance = tolerance
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def key(self, kind, case, values):
+        """
+        :param kind: which calculator the entry belongs to (e.g., 'Steam_SI' or 'steam')
+        :param case: the pair of given properties (e.g., 'Ph')
+        :param values: the given property values
+        :return: a hashable key
+        """
+        rounded = tuple(None if v != v else round(v / self.tolerance) for v in values)  # v != v for nan
+        return (kind, case, rounded, Steam_tables.table_version())
+
+    def get(self, key):
+        """
+        :return: the cached value, or None on a miss
+        """
+        with self._lock:
+            value = self._entries.get(key)
+            if value is None:
+                self.misses += 1
+                if Steam_profile.enabled:
+                    Steam_profile.stats.count('cache misses')
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            if Steam_profile.enabled:
+                Steam_profile.stats.count('cache hits')
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Drops every entry and resets the counters.
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = self.evictions = 0
+
+    def configure(self, maxsize=None, tolerance=None, enabled=None):
+        """
+        Changes the settings.  Changing the tolerance clears the cache because the keys change.
+        """
+        with self._lock:
+            if maxsize is not None:
+                self.maxsize = maxsize
+                while len(self._entries) > self.maxsize:
+                    self._entries.popitem(last=False)
+                    self.evictions += 1
+            if tolerance is not None and tolerance != self.tolerance:
+                self.tolerance = tolerance
+                self._entries.clear()
+            if enabled is not None:
+                self.enabled = enabled
+
+    def stats(self):
+        """
+        :return: dict of size, maxsize, hits, misses and evictions
+        """
+        with self._lock:
+            return {'size': len(self._entries), 'maxsize': self.maxsize, 'hits': self.hits, 'misses': self.misses,
+                    'evictions': self.evictions}
+
+    def __len__(self):
+        return len(self._entries)
+
+
+state_cache = StateCache()  # the cache used by Steam_SI.calc and steam.calc
+
+
+@Steam_tables.on_reload
+def _clear_on_reload():
+    state_cache.clear()
@@ -0,0 +1,241 @@
+# Compiled table file: the steam tables, saturation spline coefficients and fast grids in one memory-mappable .npy
+#
+# Rebuild it after editing the text tables with:  python Steam_compiled.py build
+# Until it is rebuilt the text tables are used (the file records a checksum of the text tables it came from).
+
+import argparse
+import os
+import sys
+import threading
+import zlib
+import numpy as np
+
+import Steam_tables
+
+COMPILED_TABLE_FILE = os.path.join(Steam_tables.TABLE_DIR, 'steam_tables.npy')
+FORMAT_VERSION = 1
+_MAGIC = 7.0e5 + 98  # first number in a compiled table file
+_HEADER = 8  # magic, version, checksums of the two text tables, number of sections, 3 unused
+_DIRECTORY = 4  # numbers per section in the directory: offset, then up to 3 dimensions (-1 where unused)
+
+# the sections of the file, in order.  The spline names are the ones in Steam_sat.SPLINES.
+_SPLINES = ('by_P', 'by_T', 'T_by_vg', 'T_by_hg', 'T_by_hg_high')
+SECTIONS = (('sat', 'superheated') + tuple(name + part for name in _SPLINES for part in ('.x', '.c'))
+            + ('fast_grid',))
+
+
+def source_fingerprint(sat_file=Steam_tables.SAT_TABLE_FILE,
+                       superheated_file=Steam_tables.SUPERHEATED_TABLE_FILE):
+    """
+    Checksums of the text tables (of the file contents, so nothing has to be parsed to check them).
+    :return: (sat checksum, superheated checksum), None for a file that does not exist
+    """
+    sums = []
+    for path in (sat_file, superheated_file):
+        if os.path.exists(path):
+            with open(path, 'rb') as f:
+                sums.append(float(zlib.crc32(f.read())))
+        else:
+            sums.append(None)
+    return tuple(sums)
+
+
+class CompiledTables:
+    def __init__(self, data):
+        """
+        A view of a compiled table file.  Every section is a view into data, so when data is memory-mapped
+        the table columns, spline coefficients and grids are read from the page cache that every process
+        using the file shares.
+        :param data: the flat float array of the file (see build)
+        """
+        self.data = data
+        self.fingerprint = (float(data[2]), float(data[3]))
+        self.sections = {}
+        directory = data[_HEADER:_HEADER + _DIRECTORY * len(SECTIONS)].reshape(len(SECTIONS), _DIRECTORY)
+        for name, entry in zip(SECTIONS, directory):
+            offset = int(entry[0])
+            shape = tuple(int(d) for d in entry[1:] if d >= 0)
+            self.sections[name] = data[offset:offset + int(np.prod(shape))].reshape(shape)
+
+    @classmethod
+    def load(cls, path=COMPILED_TABLE_FILE, mmap_mode='r'):
+        """
+        Opens a compiled table file.
+        :param path: the .npy file
+        :param mmap_mode: passed to np.load; 'r' maps the file instead of reading it
+        :return: CompiledTables, or None if the file is missing or has another format version
+        """
+        if not os.path.exists(path):
+            return None
+        data = np.load(path, mmap_mode=mmap_mode)
+        if data.ndim != 1 or len(data) < _HEADER or data[0] != _MAGIC or data[1] != FORMAT_VERSION:
+            return None
+        if int(data[4]) != len(SECTIONS):
+            return None
+        return cls(data.view(np.ndarray))  # a plain array view of the map (arithmetic on memmaps returns memmaps)
+
+    def is_current(self):
+        """
+        :return: True if the file was built from the text tables as they are now (a missing text table counts
+                 as current, so the compiled file can be shipped on its own)
+        """
+        return all(now is None or now == then for now, then in zip(source_fingerprint(), self.fingerprint))
+
+    def sat_table(self):
+        """
+        :return: Steam_tables.SatTable
+        """
+        return Steam_tables.SatTable(*self.sections['sat'])
+
+    def superheated_table(self):
+        """
+        :return: Steam_tables.SuperheatedTable
+        """
+        return Steam_tables.SuperheatedTable(*self.sections['superheated'])
+
+    def splines(self):
+        """
+        :return: dict of spline name -> (breakpoints, coefficients) for Steam_sat.SaturationCurve
+        """
+        return {name: (self.sections[name + '.x'], self.sections[name + '.c']) for name in _SPLINES}
+
+    def fast_grid(self, resolution=None):
+        """
+        :param resolution: expected (nP, n) of the grids, or None to accept the compiled one
+        :return: Steam_fastgrid.FastGrid, or None if the compiled grids have another resolution
+        """
+        from Steam_fastgrid import FastGrid
+        return FastGrid.from_array(self.sections['fast_grid'], resolution)
+
+
+def build(path=COMPILED_TABLE_FILE, resolution=None):
+    """
+    Regenerates the compiled table file from the text tables.
+    :param path: the .npy file to write
+    :param resolution: (nP, n) of the fast grids, None for Steam_fastgrid.DEFAULT_RESOLUTION
+    :return: the path
+    """
+    from Steam_sat import fit_splines
+    from Steam_fastgrid import FastGrid, DEFAULT_RESOLUTION
+
+    sat = Steam_tables.read_sat_table()
+    sup = Steam_tables.read_superheated_table()
+    sections = {'sat': np.stack((sat.ts, sat.ps, sat.hf, sat.hg, sat.sf, sat.sg, sat.vf, sat.vg)),
+                'superheated': np.stack((sup.t, sup.h, sup.s, sup.p))}
+    for name, (x, c) in fit_splines(sat).items():
+        sections[name + '.x'], sections[name + '.c'] = x, c
+    grid = FastGrid.build(resolution or DEFAULT_RESOLUTION)
+    sections['fast_grid'] = grid.to_array()
+
+    header = np.zeros(_HEADER)
+    header[:5] = _MAGIC, FORMAT_VERSION, *source_fingerprint(), len(SECTIONS)
+    directory = np.full((len(SECTIONS), _DIRECTORY), -1.0)
+    offset = _HEADER + directory.size
+    for entry, name in zip(directory, SECTIONS):
+        entry[0] = offset
+        entry[1:1 + sections[name].ndim] = sections[name].shape
+        offset += sections[name].size
+    data = np.concatenate([header, directory.ravel()] + [sections[name].ravel() for name in SECTIONS])
+    tmp = path + '.tmp.npy'
+    np.save(tmp, data)
+    os.replace(tmp, path)  # processes that have the old file mapped keep reading the old file
+    return path
+
+
+def validate(path=COMPILED_TABLE_FILE):
+    """
+    Checks a compiled table file against the text tables.
+    :return: list of problems (empty if the file is good)
+    """
+    from Steam_sat import fit_splines, PiecewisePolynomial
+
+    compiled = CompiledTables.load(path)
+    if compiled is None:
+        return ['{} is missing or not a compiled table file of format version {}'.format(path, FORMAT_VERSION)]
+    problems = []
+    if not compiled.is_current():
+        problems.append('built from other text tables (rebuild it)')
+    sat, sup = Steam_tables.read_sat_table(), Steam_tables.read_superheated_table()
+    csat, csup = compiled.sat_table(), compiled.superheated_table()
+    for c in ('ts', 'ps', 'hf', 'hg', 'sf', 'sg', 'vf', 'vg'):
+        if not np.array_equal(getattr(sat, c), getattr(csat, c)):
+            problems.append('saturated column {} differs from the text table'.format(c))
+    for c in ('t', 'h', 's', 'p'):
+        if not np.array_equal(getattr(sup, c), getattr(csup, c)):
+            problems.append('superheated column {} differs from the text table'.format(c))
+    splines = compiled.splines()
+    for name, (x, c) in fit_splines(sat).items():
+        points = np.concatenate((x, 0.5 * (x[1:] + x[:-1])))  # the nodes and the middle of every interval
+        expected = PiecewisePolynomial(x, c)(points)
+        if not np.allclose(PiecewisePolynomial(*splines[name])(points), expected, rtol=1e-12, atol=0.0):
+            problems.append('spline {} differs from a fit to the text table'.format(name))
+    grid = compiled.fast_grid()
+    if grid is None:
+        problems.append('the fast grids do not match the superheated table')
+    return problems
+
+
+_lock = threading.Lock()
+_compiled = None
+_loaded = False
+_settings = {'path': COMPILED_TABLE_FILE, 'enabled': True}
+
+
+def configure(path=None, enabled=None):
+    """
+    Chooses the compiled table file (or turns it off).  Call Steam_tables.reload_tables() afterwards if tables
+    were already loaded.
+    :param path: the .npy file
+    :param enabled: False to always read the text tables
+    """
+    global _compiled, _loaded
+    with _lock:
+        if path is not None:
+            _settings['path'] = path
+        if enabled is not None:
+            _settings['enabled'] = enabled
+        _compiled, _loaded = None, False
+
+
+def compiled_tables():
+    """
+    Returns the shared CompiledTables, opening the file on first use.
+    :return: CompiledTables, or None if there is no current compiled table file (or it is turned off)
+    """
+    global _compiled, _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                compiled = CompiledTables.load(_settings['path']) if _settings['enabled'] else None
+                _compiled = compiled if compiled is not None and compiled.is_current() else None
+                _loaded = True
+    return _compiled
+
+
+@Steam_tables.on_reload
+def _discard_compiled():
+    global _compiled, _loaded
+    _compiled, _loaded = None, False
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Builds or checks the compiled steam table file.')
+    parser.add_argument('command', choices=('build', 'check'),
+                        help='build: regenerate the file from the text tables and validate it.  check: validate only.')
+    parser.add_argument('-o', '--output', default=COMPILED_TABLE_FILE, help='compiled table file')
+    parser.add_argument('--resolution', type=int, nargs=2, metavar=('NP', 'N'),
+                        help='fast grid resolution (pressures, nodes along T/h/s)')
+    args = parser.parse_args(argv)
+    if args.command == 'build':
+        build(args.output, args.resolution)
+        print('wrote {} ({} bytes)'.format(args.output, os.path.getsize(args.output)))
+    problems = validate(args.output)
+    for problem in problems:
+        print('error: ' + problem, file=sys.stderr)
+    if not problems:
+        print('{} matches the text tables'.format(args.output))
+    return 1 if problems else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
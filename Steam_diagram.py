@@ -0,0 +1,410 @@
+# Property diagrams (T-s, h-s Mollier and P-v) with Rankine cycle overlays, drawn from precomputed geometry
+#
+#   Diagram('hs', ax).overlay(cycle)                      one diagram on a matplotlib Axes
+#   rankine.plot_cycle('Pv')                              the same through pyplot
+#   render_cycles(cycles, 'reports', kind='Ts')           a PNG per cycle, for batch reports
+#   python Steam_diagram.py build                         (re)build the on-disk geometry cache
+#
+# The vapor dome and the isobars, isotherms and lines of constant quality are computed once from the saturation
+# splines and the superheated table and kept in memory.  The build command also saves them to DIAGRAM_CACHE_FILE,
+# which is then loaded instead of building them (and ignored once the text tables or the geometry settings
+# change); plotting never writes it.  Every curve holds all five properties [P, T, h, s, v], so the three diagrams
+# are projections of the same geometry.  A cycle overlay follows the real p_high and p_low isobars of the cycle's
+# property backend (cached per pressure and backend) instead of straight lines.  Rankine_plot.py draws its T-s
+# plots from the same geometry.  render_cycles draws the background of the figure once and then
+# only blits each cycle's overlay onto it, so a report of thousands of cycles pays for little more than the
+# overlay and the PNG encoding of each.  matplotlib is only imported to draw.
+
+import argparse
+import json
+import os
+import sys
+import threading
+import time
+import numpy as np
+
+import Steam_tables
+
+DIAGRAM_CACHE_FILE = os.path.join(Steam_tables.TABLE_DIR, 'steam_diagram_cache.npz')
+FORMAT_VERSION = 1
+DOME_POINTS = 300  # temperatures along the vapor dome (denser towards the critical point)
+CURVE_POINTS = 200  # points along the superheated part of an isobar or isotherm
+T_MIN, T_MAX = 0.01, 800.0  # C
+P_MIN, P_MAX = 6.0, 32000.0  # kPa, the range of the superheated table
+ISOBARS = (10, 50, 100, 500, 1000, 2000, 5000, 10000, 20000, 30000)  # kPa
+ISOTHERMS = (100, 200, 300, 400, 500, 600, 700)  # C
+QUALITIES = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+MAX_ISOBARS = 256  # isobars cached for cycle overlays
+
+# column positions of the curves, and of the vectors from Steam_sat
+P, T, H, S, V = range(5)
+_TSAT, _HF, _HG, _SF, _SG, _VF, _VG = range(7)
+
+# diagram: (x column, y column, x label, y label, log scale of x and y)
+DIAGRAMS = {
+    'Ts': (S, T, r'S $\left(\frac{kJ}{{kg\cdot K}}\right)$', r'T $\left(^o C\right)$', False),
+    'hs': (S, H, r'S $\left(\frac{kJ}{{kg\cdot K}}\right)$', r'h $\left(\frac{kJ}{kg}\right)$', False),
+    'Pv': (V, P, r'v $\left(\frac{m^3}{kg}\right)$', 'P (kPa)', True),
+}
+
+_geometry = None
+_isobars = {}  # (pressure, backend) -> curve, for overlays
+_lock = threading.Lock()
+
+
+def _superheated(pair, a, b):
+    from Steam_superheated import superheated_props
+    curve = superheated_props(pair, a, b, 'linear')  # the cubic interpolant overshoots in v between the isobars
+    return curve[~np.isnan(curve).any(axis=1)]
+
+
+def _sat_points(sat, P, T, column_h, column_s, column_v, x=None):
+    # points along the saturation curve: a saturated side (x None) or a constant quality between them
+    if x is None:
+        h, s, v = sat[:, column_h], sat[:, column_s], sat[:, column_v]
+    else:
+        h = sat[:, _HF] + x * (sat[:, _HG] - sat[:, _HF])
+        s = sat[:, _SF] + x * (sat[:, _SG] - sat[:, _SF])
+        v = sat[:, _VF] + x * (sat[:, _VG] - sat[:, _VF])
+    return np.column_stack([P, T, h, s, v])
+
+
+def isobar(p, liquid_T=None, backend=None):
+    """
+    The curve of one isobar: along the saturated liquid line (the tables estimate compressed liquid as saturated)
+    up to the saturation temperature, across the dome and on through the superheated region up to T_MAX.
+    :param p: pressure (kPa)
+    :param liquid_T: temperatures of the liquid part (None for those of the dome)
+    :param backend: None for the steam tables, or a property backend (see Steam_backends.py)
+    :return: (n, 5) array [P, T, h, s, v] with s increasing
+    """
+    if backend is None:
+        from Steam_sat import saturation_curve
+        curve = saturation_curve()
+        sat = curve.by_P(np.array([p / 100.0]))[0]
+        sat_by_T, superheated = curve.by_T, _superheated
+    else:
+        from Steam_backends import get_backend
+        from Rankine_sweep import _backend_props
+        backend = get_backend(backend)
+        sat = backend.sat_props_P(np.array([float(p)]))[0]
+        sat_by_T = backend.sat_props_T
+
+        def superheated(pair, a, b):
+            curve = _backend_props(backend, pair, a, b)
+            return curve[~np.isnan(curve).any(axis=1)]
+    if np.isnan(sat[_TSAT]):  # above the critical pressure
+        return superheated('PT', np.full(CURVE_POINTS, float(p)), np.linspace(T_MIN, T_MAX, CURVE_POINTS))
+    if liquid_T is None:
+        liquid_T = dome_temperatures()
+    liquid_T = liquid_T[liquid_T < sat[_TSAT]]
+    liquid = _sat_points(sat_by_T(liquid_T), np.full(len(liquid_T), float(p)), liquid_T, _HF, _SF, _VF)
+    ends = np.array([[p, sat[_TSAT], sat[_HF], sat[_SF], sat[_VF]], [p, sat[_TSAT], sat[_HG], sat[_SG], sat[_VG]]])
+    vapor_T = np.linspace(sat[_TSAT], T_MAX, CURVE_POINTS)[1:]
+    vapor = superheated('PT', np.full(len(vapor_T), float(p)), vapor_T)
+    return np.concatenate([liquid, ends, vapor])
+
+
+def isotherm(t):
+    """
+    The curve of one isotherm: across the dome at the saturation pressure, then through the superheated region
+    down to P_MIN (only the superheated part above the critical temperature).
+    :param t: temperature (C)
+    :return: (n, 5) array [P, T, h, s, v] with s increasing
+    """
+    from Steam_sat import saturation_curve
+    sat = saturation_curve().by_T(np.array([float(t)]))[0]
+    if np.isnan(sat[_TSAT]):  # above the critical temperature
+        pressures = np.geomspace(P_MAX, P_MIN, CURVE_POINTS)
+        return _superheated('PT', pressures, np.full(CURVE_POINTS, float(t)))
+    psat = sat[_TSAT] * 100  # bar to kPa
+    ends = np.array([[psat, t, sat[_HF], sat[_SF], sat[_VF]], [psat, t, sat[_HG], sat[_SG], sat[_VG]]])
+    pressures = np.geomspace(psat, P_MIN, CURVE_POINTS)[1:]
+    return np.concatenate([ends, _superheated('PT', pressures, np.full(len(pressures), float(t)))])
+
+
+def dome_temperatures():
+    """
+    :return: the temperatures along the vapor dome, denser towards the critical point
+    """
+    from Steam_sat import saturation_curve
+    t_crit = float(saturation_curve().by_T.x[-1])
+    u = np.linspace(0, 1, DOME_POINTS)
+    return T_MIN + (t_crit - T_MIN) * (1 - (1 - u) ** 2)
+
+
+class DiagramGeometry:
+    def __init__(self, curves):
+        """
+        The background curves of the diagrams.
+        :param curves: dict of name -> (n, 5) array [P, T, h, s, v]; names are 'dome_liquid', 'dome_vapor',
+                       'isobar <p>', 'isotherm <T>' and 'quality <x>'
+        """
+        self.curves = curves
+
+    @classmethod
+    def build(cls):
+        from Steam_sat import saturation_curve
+        t = dome_temperatures()
+        sat = saturation_curve().by_T(t)
+        psat = sat[:, _TSAT] * 100
+        curves = {'dome_liquid': _sat_points(sat, psat, t, _HF, _SF, _VF),
+                  'dome_vapor': _sat_points(sat, psat, t, _HG, _SG, _VG)}
+        for p in ISOBARS:
+            curves['isobar {:g}'.format(p)] = isobar(p, t)
+        for temperature in ISOTHERMS:
+            curves['isotherm {:g}'.format(temperature)] = isotherm(temperature)
+        for x in QUALITIES:
+            curves['quality {:g}'.format(x)] = _sat_points(sat, psat, t, None, None, None, x)
+        return cls(curves)
+
+    def group(self, kind):
+        """
+        :param kind: 'dome', 'isobar', 'isotherm' or 'quality'
+        :return: list of (value or None, curve)
+        """
+        out = []
+        for name, curve in self.curves.items():
+            if name.startswith(kind):
+                value = name.split(' ', 1)[1] if ' ' in name else None
+                out.append((None if value is None else float(value), curve))
+        return out
+
+
+def cache_key():
+    """
+    What a cached geometry was built from: the format, the text tables and the geometry settings.
+    """
+    from Steam_compiled import source_fingerprint
+    fingerprint = [-1.0 if f is None else f for f in source_fingerprint()]
+    return np.array([FORMAT_VERSION] + fingerprint + [DOME_POINTS, CURVE_POINTS, T_MIN, T_MAX, P_MIN, P_MAX] +
+                    list(ISOBARS) + [-1] + list(ISOTHERMS) + [-1] + list(QUALITIES), dtype=float)
+
+
+def save_geometry(geometry, path=DIAGRAM_CACHE_FILE):
+    np.savez(path, key=cache_key(), **{'curve:' + name: curve for name, curve in geometry.curves.items()})
+
+
+def load_geometry(path=DIAGRAM_CACHE_FILE):
+    """
+    :return: the cached DiagramGeometry, or None if the file is missing or was built from other tables or settings
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path) as data:
+            if not np.array_equal(data['key'], cache_key()):
+                return None
+            return DiagramGeometry({name[len('curve:'):]: data[name] for name in data.files if name != 'key'})
+    except (OSError, ValueError, KeyError):  # unreadable or truncated file
+        return None
+
+
+def geometry(path=DIAGRAM_CACHE_FILE):
+    """
+    The shared diagram geometry: from memory, else from the disk cache (written by the build command), else built
+    in memory.
+    """
+    global _geometry
+    if _geometry is None:
+        with _lock:
+            if _geometry is None:
+                found = load_geometry(path) if path else None
+                _geometry = DiagramGeometry.build() if found is None else found
+    return _geometry
+
+
+def cached_isobar(p, backend=None):
+    """
+    isobar(p, backend=backend), computed once per pressure and backend (for cycle overlays).
+    """
+    if backend is not None:
+        from Steam_backends import get_backend
+        backend = get_backend(backend)  # names and instances of a backend share their isobars
+    key = (float(p), backend)
+    curve = _isobars.get(key)
+    if curve is None:
+        curve = isobar(key[0], backend=backend)
+        with _lock:
+            if len(_isobars) >= MAX_ISOBARS:
+                _isobars.clear()
+            _isobars[key] = curve
+    return curve
+
+
+@Steam_tables.on_reload
+def _discard_geometry():
+    global _geometry
+    _geometry = None
+    _isobars.clear()
+
+
+def _point(state):
+    return [state.p, state.T, state.h, state.s, state.v]
+
+
+def _along(curve, start, end):
+    # the points of an isobar strictly between two states on it (in the direction from start to end)
+    s0, s1 = start[S], end[S]
+    inside = (curve[:, S] > min(s0, s1)) & (curve[:, S] < max(s0, s1))
+    part = curve[inside]
+    return part if s1 >= s0 else part[::-1]
+
+
+def cycle_legs(cycle):
+    """
+    The two legs of a calculated rankine cycle, along the isobars of its property backend.
+    :param cycle: a rankine object after calc_efficiency
+    :return: ((n, 5) array of pump 3-4, boiler 4-1 along the p_high isobar and turbine 1-2, (m, 5) array of the
+             condenser 2-3 along the p_low isobar, (3, 5) array of states 1, 2 and 3)
+    """
+    s1, s2, s3 = [np.array(_point(state), dtype=float) for state in (cycle.state1, cycle.state2, cycle.state3)]
+    # pump exit: rankine only corrects h4 (h3 + v3 dp); the pumped liquid keeps about the T, s and v of state 3
+    s4 = np.array([cycle.p_high, s3[T], cycle.state4.h, s3[S], s3[V]])
+    boiler = _along(cached_isobar(cycle.p_high, cycle.backend), s4, s1)
+    condenser = _along(cached_isobar(cycle.p_low, cycle.backend), s2, s3)
+    return np.concatenate([[s3, s4], boiler, [s1, s2]]), np.concatenate([[s2], condenser, [s3]]), \
+        np.array([s1, s2, s3])
+
+
+def cycle_path(cycle):
+    """
+    The closed path of a calculated rankine cycle: pump 3-4, boiler 4-1 along the p_high isobar, turbine 1-2 and
+    condenser 2-3 along the p_low isobar.
+    :param cycle: a rankine object after calc_efficiency
+    :return: ((n, 5) array of the path, (3, 5) array of states 1, 2 and 3)
+    """
+    heating, cooling, states = cycle_legs(cycle)
+    return np.concatenate([heating, cooling[1:]]), states
+
+
+class Diagram:
+    def __init__(self, kind='Ts', ax=None, geometry_=None, labels=True):
+        """
+        Draws the background of a property diagram: the vapor dome, isobars, isotherms and lines of constant
+        quality.  Cycles are added with overlay.
+        :param kind: 'Ts', 'hs' or 'Pv'
+        :param ax: matplotlib Axes (None for the current pyplot Axes)
+        :param geometry_: a DiagramGeometry (None for the shared one)
+        :param labels: False to leave out the values of the background curves
+        """
+        if kind not in DIAGRAMS:
+            raise ValueError('unknown diagram {!r}, expected one of {}'.format(kind, ', '.join(DIAGRAMS)))
+        if ax is None:
+            import matplotlib.pyplot as plt
+            ax = plt.gca()
+        self.kind = kind
+        self.ax = ax
+        self.x, self.y, xlabel, ylabel, log = DIAGRAMS[kind]
+        geo = geometry() if geometry_ is None else geometry_
+        styles = {'isobar': ('tab:blue', '{:g} kPa'), 'isotherm': ('tab:orange', '{:g} C'),
+                  'quality': ('gray', 'x={:g}')}
+        for group, (color, text) in styles.items():
+            for value, curve in geo.group(group):
+                ax.plot(curve[:, self.x], curve[:, self.y], color=color, linewidth=0.6, alpha=0.6)
+                if labels and group != 'quality' and len(curve):
+                    at = curve[-1] if group == 'isobar' else curve[len(curve) // 2]  # isotherms meet at P_MIN
+                    ax.annotate(text.format(value), (at[self.x], at[self.y]), fontsize=6, color=color,
+                                annotation_clip=True)
+        for _, curve in geo.group('dome'):
+            ax.plot(curve[:, self.x], curve[:, self.y], color='black', linewidth=1.2)
+        if log:
+            ax.set_xscale('log')
+            ax.set_yscale('log')
+        ax.set_xlabel(xlabel)
+        ax.set_ylabel(ylabel)
+        ax.autoscale_view()
+        ax.autoscale(False)  # overlays do not move the axes, so the background can be reused
+        self.path = self.states = None
+
+    def overlay(self, cycle, color='green', animated=False):
+        """
+        Draws a calculated rankine cycle over the background; later calls move the same lines.
+        :param animated: True to leave the overlay out of full draws (for blitting, see render_cycles)
+        :return: the overlay artists (path line, state markers)
+        """
+        path, states = cycle_path(cycle)
+        if self.path is None:
+            self.path, = self.ax.plot([], [], color=color, linewidth=1.5, animated=animated)
+            self.states, = self.ax.plot([], [], linestyle='', marker='o', markerfacecolor='white',
+                                        markeredgecolor='black', markersize=5, animated=animated)
+        self.path.set_data(path[:, self.x], path[:, self.y])
+        self.states.set_data(states[:, self.x], states[:, self.y])
+        return self.path, self.states
+
+
+def render_cycles(cycles, directory, kind='Ts', names=None, dpi=100, figsize=(6.4, 4.8), compress_level=3):
+    """
+    Writes a PNG of each cycle on the same diagram.  The background is drawn once; each cycle only redraws its
+    overlay and title over a copy of it.
+    :param cycles: iterable of rankine objects (calculated here if they are not yet)
+    :param directory: output directory (created if missing)
+    :param kind: 'Ts', 'hs' or 'Pv'
+    :param names: file names without extension (default: cycle_00000, cycle_00001, ...)
+    :param compress_level: PNG (zlib) compression, 0-9; the encoding is most of the time per cycle, and 3 writes
+                           files about 10 % larger than 6 in about half the time
+    :return: list of the files written
+    """
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from PIL import Image  # a dependency of matplotlib
+    os.makedirs(directory, exist_ok=True)
+    fig = Figure(figsize=figsize, dpi=dpi)
+    canvas = FigureCanvasAgg(fig)
+    ax = fig.add_subplot()
+    diagram = Diagram(kind, ax)
+    title = ax.set_title('Rankine Cycle', animated=True)  # some text, so tight_layout leaves room for titles
+    summary = ax.text(0.02, 0.97, '', transform=ax.transAxes, va='top', fontsize=8, animated=True)
+    fig.tight_layout()
+    canvas.draw()
+    background = canvas.copy_from_bbox(fig.bbox)
+    files = []
+    for i, cycle in enumerate(cycles):
+        if cycle.efficiency is None:
+            cycle.calc_efficiency()
+        artists = diagram.overlay(cycle, animated=True)
+        title.set_text(cycle.name)
+        # plain text: mathtext would be parsed anew for every cycle's numbers
+        summary.set_text('efficiency: {:0.1f}%\nturbine work: {:0.1f} kJ/kg\nheat added: {:0.1f} kJ/kg'
+                         .format(cycle.efficiency, cycle.turbine_work, cycle.heat_added))
+        canvas.restore_region(background)
+        for artist in artists + (title, summary):
+            fig.draw_artist(artist)
+        name = names[i] if names is not None else 'cycle_{:05d}'.format(i)
+        path = os.path.join(directory, name + '.png')
+        Image.fromarray(np.asarray(canvas.buffer_rgba())[:, :, :3]).save(path, compress_level=compress_level)
+        files.append(path)
+    return files
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Builds the diagram geometry cache or renders example diagrams.')
+    parser.add_argument('command', choices=('build', 'render'), help='build the cache, or render example cycles')
+    parser.add_argument('--cache', default=DIAGRAM_CACHE_FILE, help='geometry cache file')
+    parser.add_argument('--output', default='diagrams', help='directory for render')
+    parser.add_argument('--kind', default='Ts', choices=sorted(DIAGRAMS), help='diagram for render')
+    parser.add_argument('-n', '--cycles', type=int, default=100, help='cycles for render')
+    args = parser.parse_args(argv)
+    global _geometry
+    start = time.perf_counter()
+    if args.command == 'build':
+        _geometry = DiagramGeometry.build()
+        save_geometry(_geometry, args.cache)
+        report = {'cache': args.cache, 'curves': len(_geometry.curves),
+                  'seconds': round(time.perf_counter() - start, 3)}
+    else:
+        from Rankine import rankine
+        geometry(args.cache)
+        loaded = time.perf_counter()
+        p_high = np.linspace(2000, 15000, args.cycles)
+        cycles = [rankine(8, p, t_high=550, eff_turbine=0.9, name='p_high = {:.0f} kPa'.format(p)) for p in p_high]
+        files = render_cycles(cycles, args.output, args.kind)
+        seconds = time.perf_counter() - loaded
+        report = {'files': len(files), 'geometry_seconds': round(loaded - start, 3),
+                  'render_seconds': round(seconds, 3), 'ms_per_cycle': round(1000 * seconds / len(files), 2)}
+    print(json.dumps(report))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,346 @@
+# "Fast table" mode: dense regular grids of superheated properties with constant-time bicubic lookup
+
+import math
+import operator
+import os
+import threading
+import zlib
+import numpy as np
+
+import Steam_tables
+import Steam_compiled
+from Steam_sat import saturation_curve
+from Steam_superheated import superheated_engine, OUTPUT_COLUMNS
+
+FORMAT_VERSION = 1
+_MAGIC = 7.0e5 + 97  # first number in a saved grid file
+_HEADER = 16  # number of header values in a saved grid file
+DEFAULT_RESOLUTION = (200, 200)  # (number of pressures, number of T/h/s values)
+MIN_RESOLUTION = 6  # nodes along each axis: fewer leave the 4 node bicubic stencils no room inside the table
+
+# the grids: input pair -> (second coordinate, output columns stored on the grid).  v is not stored: the table's
+# v column is RW*(T+273)/P, so it is computed from the interpolated T
+GRIDS = {
+    'PT': ('T', ('h', 's')),
+    'Ph': ('h', ('T', 's')),
+    'Ps': ('s', ('T', 'h')),
+}
+
+# column of the saturation vectors (Steam_sat) that bounds the superheated region for each grid: Tsat, hg, sg
+_SAT_BOUND = {'PT': 0, 'Ph': 2, 'Ps': 4}
+
+
+def table_fingerprint():
+    """
+    A checksum of the tables the grids are built from, stored with saved grids so a stale grid file is rebuilt.
+    :return: float (exactly representable)
+    """
+    sup, sat = Steam_tables.superheated_table(), Steam_tables.sat_table()
+    crc = zlib.crc32(np.ascontiguousarray(np.column_stack((sup.t, sup.h, sup.s, sup.p))).tobytes())
+    crc = zlib.crc32(np.ascontiguousarray(np.column_stack((sat.ts, sat.ps, sat.hg, sat.sg))).tobytes(), crc)
+    return float(crc)
+
+
+def _fill_rows(layer):
+    """
+    Fills the nan nodes of every row (isobar) by linear extrapolation from the nearest valid nodes, so the
+    bicubic stencil next to the edge of the table data does not pick up nan.
+    """
+    n = layer.shape[1]
+    j = np.arange(n)
+    for row in layer:
+        valid = np.nonzero(~np.isnan(row))[0]
+        if len(valid) == 0:
+            continue
+        if len(valid) == 1:
+            row[:] = row[valid[0]]
+            continue
+        row[:] = np.interp(j, valid, row[valid])  # fills gaps inside the valid range
+        lo, hi = valid[0], valid[-1]
+        slope_lo = (row[valid[1]] - row[lo]) / (valid[1] - lo)
+        slope_hi = (row[hi] - row[valid[-2]]) / (hi - valid[-2])
+        row[:lo] = row[lo] + slope_lo * (j[:lo] - lo)
+        row[hi + 1:] = row[hi] + slope_hi * (j[hi + 1:] - hi)
+
+
+def _cubic_weights(t):
+    """
+    Catmull-Rom (cubic convolution) weights of the four stencil nodes for fractional positions t in [0, 1).
+    :return: (n, 4) array
+    """
+    t2, t3 = t * t, t * t * t
+    return np.stack((-0.5 * t3 + t2 - 0.5 * t,
+                     1.5 * t3 - 2.5 * t2 + 1.0,
+                     -1.5 * t3 + 2.0 * t2 + 0.5 * t,
+                     0.5 * t3 - 0.5 * t2), axis=-1)
+
+
+class FastGrid:
+    def __init__(self, axes, layers, bounds):
+        """
+        Dense regular grids of the superheated properties.  Pressure is spaced evenly in log(P); the second
+        coordinate (T, h or s) is spaced evenly.  Lookups are index arithmetic plus bicubic interpolation.
+        Build one with FastGrid.build or FastGrid.load rather than calling this directly.
+        :param axes: dict with 'logP' and one entry per second coordinate ('T', 'h', 's'), each (start, stop, n)
+        :param layers: dict pair -> (k, nP, n) array of the output columns in GRIDS[pair]
+        :param bounds: dict pair -> (2, nP) array of the lowest and highest value of the second coordinate the
+                       table covers on every isobar of the grid (the table is not a rectangle in any pair)
+        """
+        self.axes = axes
+        self.layers = layers
+        self.bounds = bounds
+
+    @classmethod
+    def build(cls, resolution=DEFAULT_RESOLUTION):
+        """
+        Builds the grids from the superheated table (Clough-Tocher interpolation at every node).  Nodes on the
+        liquid side of the saturated vapor line are extrapolated from the superheated nodes of the same isobar.
+        :param resolution: (number of pressures, number of nodes along T, h and s), each at least MIN_RESOLUTION
+        :return: FastGrid
+        """
+        nP, n = check_resolution(resolution)
+        table = Steam_tables.superheated_table()
+        engine = superheated_engine()
+        axes = {'logP': (np.log(table.p.min()), np.log(table.p.max()), nP)}
+        for c, col in (('T', table.t), ('h', table.h), ('s', table.s)):
+            axes[c] = (col.min(), col.max(), n)
+        P = np.clip(np.exp(np.linspace(*axes['logP'])), table.p.min(), table.p.max())  # ends exactly on the table
+        sat = saturation_curve().by_P(P / 100)  # nan above the critical point: nothing is masked there
+        layers, bounds = {}, {}
+        for pair, (second, outputs) in GRIDS.items():
+            W = np.linspace(*axes[second])
+            Pg, Wg = np.meshgrid(P, W, indexing='ij')
+            props = engine.lookup(pair, Pg, Wg)
+            covered = ~np.isnan(props[..., 0])  # the interpolator gives nan for every column outside the table
+            first = np.argmax(covered, axis=1)
+            last = n - 1 - np.argmax(covered[:, ::-1], axis=1)
+            bounds[pair] = np.where(covered.any(axis=1), [W[first], W[last]], np.nan)
+            props[Wg < sat[:, _SAT_BOUND[pair], None]] = np.nan
+            layer = np.stack([props[..., OUTPUT_COLUMNS.index(c)] for c in outputs])
+            for k in range(len(outputs)):
+                _fill_rows(layer[k])
+            layers[pair] = layer
+        return cls(axes, layers, bounds)
+
+    def to_array(self):
+        """
+        The grids as one flat float array: header, grids, then the table coverage (see from_array).
+        """
+        nP = self.axes['logP'][2]
+        n = self.axes['T'][2]
+        header = [_MAGIC, FORMAT_VERSION, nP, n, table_fingerprint()]
+        for c in ('logP', 'T', 'h', 's'):
+            header.extend(self.axes[c][:2])
+        header.extend([0.0] * (_HEADER - len(header)))
+        data = np.concatenate([np.array(header)] + [self.layers[pair].ravel() for pair in GRIDS]
+                              + [self.bounds[pair].ravel() for pair in GRIDS])
+        return data
+
+    def save(self, path):
+        """
+        Writes the grids to a single .npy file.
+        :param path: file name, e.g. 'superheated_grid.npy'
+        """
+        np.save(path, self.to_array())
+
+    @classmethod
+    def from_array(cls, data, resolution=None):
+        """
+        Creates the grids from the flat array of to_array (the layers are views into data, so a
+        memory-mapped array stays memory-mapped).
+        :param data: the flat array
+        :param resolution: expected (nP, n), or None to accept any
+        :return: FastGrid, or None if data is not a current grid for this table and resolution
+        """
+        if len(data) < _HEADER or data[0] != _MAGIC or data[1] != FORMAT_VERSION:
+            return None
+        nP, n = int(data[2]), int(data[3])
+        if resolution is not None and (nP, n) != tuple(resolution):
+            return None
+        if data[4] != table_fingerprint():
+            return None
+        axes = {}
+        for i, c in enumerate(('logP', 'T', 'h', 's')):
+            axes[c] = (float(data[5 + 2 * i]), float(data[6 + 2 * i]), nP if c == 'logP' else n)
+        layers, bounds = {}, {}
+        offset = _HEADER
+        for pair, (second, outputs) in GRIDS.items():
+            size = len(outputs) * nP * n
+            layers[pair] = data[offset:offset + size].reshape(len(outputs), nP, n)
+            offset += size
+        for pair in GRIDS:
+            bounds[pair] = data[offset:offset + 2 * nP].reshape(2, nP)
+            offset += 2 * nP
+        if offset != len(data):
+            return None
+        return cls(axes, layers, bounds)
+
+    @classmethod
+    def load(cls, path, resolution=None, mmap_mode=None):
+        """
+        Reads grids written by save.
+        :return: FastGrid, or None if the file is missing, from another table or another resolution
+        """
+        if not os.path.exists(path):
+            return None
+        return cls.from_array(np.load(path, mmap_mode=mmap_mode), resolution)
+
+    def _stencil(self, axis, value):
+        """
+        Index of the first stencil node, fractional position and (unclipped) grid position for every value along
+        an axis.
+        """
+        start, stop, n = self.axes[axis]
+        pos = (value - start) * ((n - 1) / (stop - start))
+        i = np.clip(np.floor(pos).astype(np.intp), 1, n - 3)
+        return i - 1, pos - i, pos
+
+    def lookup(self, pair, a, b, bicubic=True):
+        """
+        Superheated properties from the grids.
+        :param pair: 'PT', 'Ph' or 'Ps'
+        :param a: pressures (kPa)
+        :param b: values of the second property of pair
+        :param bicubic: True for bicubic interpolation (16 nodes), False for bilinear (4 nodes, faster, less accurate)
+        :return: array with last axis [P, T, h, s, v] (same layout as Steam_superheated); nan outside the table
+                 (to within one grid step)
+        """
+        if pair not in GRIDS:
+            raise ValueError('the fast grid only handles the pairs {}'.format(', '.join(GRIDS)))
+        if bicubic and np.ndim(a) == 0 and np.ndim(b) == 0:
+            return self._lookup_one(pair, float(a), float(b))
+        second, outputs = GRIDS[pair]
+        a, b = np.broadcast_arrays(np.asarray(a, dtype=float), np.asarray(b, dtype=float))
+        shape = a.shape
+        a, b = a.ravel(), b.ravel()
+        nP, n = self.layers[pair].shape[1:]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            i0, ti, pos_i = self._stencil('logP', np.log(a))
+            j0, tj, pos_j = self._stencil(second, b)
+            # the table's coverage of the second coordinate, interpolated between the isobars of the grid
+            k = np.clip(i0 + 1, 0, nP - 2)
+            f = pos_i - k
+            lo, hi = (bound[k] + f * (bound[k + 1] - bound[k]) for bound in self.bounds[pair])
+            inside = (pos_i >= 0) & (pos_i <= nP - 1) & (pos_j >= 0) & (pos_j <= n - 1) & (b >= lo) & (b <= hi)
+        out = np.empty((len(a), len(OUTPUT_COLUMNS)))
+        out[:, 0] = a
+        out[:, OUTPUT_COLUMNS.index(second)] = b
+        if bicubic:
+            wi, wj = _cubic_weights(ti), _cubic_weights(tj)
+            nodes = (i0 * n + j0)[:, None] + (np.arange(4)[:, None] * n + np.arange(4)).ravel()  # (n, 16) flat indices
+            for c, layer in zip(outputs, self.layers[pair]):
+                patch = layer.reshape(-1).take(nodes).reshape(-1, 4, 4)
+                out[:, OUTPUT_COLUMNS.index(c)] = np.einsum('ni,ni->n', np.einsum('nij,nj->ni', patch, wj), wi)
+        else:
+            i, j = i0 + 1, j0 + 1  # the cell holding the point is the middle of the bicubic stencil
+            ti, tj = pos_i - i, pos_j - j
+            corner = i * n + j
+            for c, layer in zip(outputs, self.layers[pair]):
+                flat = layer.reshape(-1)
+                left = flat.take(corner) + ti * (flat.take(corner + n) - flat.take(corner))
+                right = flat.take(corner + 1) + ti * (flat.take(corner + n + 1) - flat.take(corner + 1))
+                out[:, OUTPUT_COLUMNS.index(c)] = left + tj * (right - left)
+        out[:, 4] = Steam_tables.RW * (out[:, 1] + 273) / a
+        out[~inside] = np.nan
+        return out.reshape(shape + (len(OUTPUT_COLUMNS),))
+
+    def _lookup_one(self, pair, a, b):
+        """
+        lookup for a single state in plain Python floats (numpy's per-call overhead dominates for one point).
+        """
+        second, outputs = GRIDS[pair]
+        out = [a, math.nan, math.nan, math.nan, math.nan]
+        out[OUTPUT_COLUMNS.index(second)] = b
+        stencils = []
+        for axis, value in (('logP', math.log(a) if a > 0 else math.nan), (second, b)):
+            start, stop, n = self.axes[axis]
+            pos = (value - start) * (n - 1) / (stop - start)
+            if not 0 <= pos <= n - 1:  # also catches nan
+                return np.full(len(OUTPUT_COLUMNS), np.nan)
+            if axis == 'logP':
+                k = min(int(pos), n - 2)
+                lo, hi = (row[0] + (pos - k) * (row[1] - row[0]) for row in self.bounds[pair][:, k:k + 2].tolist())
+                if not lo <= b <= hi:
+                    return np.full(len(OUTPUT_COLUMNS), np.nan)
+            i = min(max(int(pos), 1), n - 3)
+            t = pos - i
+            stencils.append((i - 1, (-0.5 * t ** 3 + t * t - 0.5 * t, 1.5 * t ** 3 - 2.5 * t * t + 1.0,
+                                     -1.5 * t ** 3 + 2.0 * t * t + 0.5 * t, 0.5 * t ** 3 - 0.5 * t * t)))
+        (i0, wi), (j0, wj) = stencils
+        for k, c in enumerate(outputs):
+            patch = self.layers[pair][k][i0:i0 + 4, j0:j0 + 4].tolist()
+            w0, w1, w2, w3 = wj
+            out[OUTPUT_COLUMNS.index(c)] = sum(w * (w0 * p0 + w1 * p1 + w2 * p2 + w3 * p3)
+                                               for w, (p0, p1, p2, p3) in zip(wi, patch))
+        out[4] = Steam_tables.RW * (out[1] + 273) / a
+        return np.array(out)
+
+
+_lock = threading.Lock()
+_grid = None
+_settings = {'resolution': DEFAULT_RESOLUTION, 'cache_file': None}
+_KEEP = object()  # configure: leave the cache file as it is
+
+
+def check_resolution(resolution):
+    """
+    :param resolution: (number of pressures, number of nodes along T, h and s)
+    :return: the resolution as a tuple of two ints
+    :raises ValueError: unless it is two integers of at least MIN_RESOLUTION
+    """
+    try:
+        nP, n = [operator.index(value) for value in resolution]
+    except (TypeError, ValueError):
+        raise ValueError('resolution must be two integers (pressures, nodes along T, h and s), got {!r}'
+                         .format(resolution))
+    if min(nP, n) < MIN_RESOLUTION:
+        raise ValueError('resolution needs at least {} nodes along each axis, got {!r}'
+                         .format(MIN_RESOLUTION, resolution))
+    return nP, n
+
+
+def configure(resolution=None, cache_file=_KEEP):
+    """
+    Sets the resolution of the shared grid and an optional .npy file to keep it in between runs.  Settings that
+    are not passed stay as they are.  The grid is rebuilt (or reloaded) on next use.
+    :param resolution: (number of pressures, number of nodes along T, h and s), each at least MIN_RESOLUTION
+    :param cache_file: path of the .npy cache file, or None for no file
+    """
+    global _grid
+    if resolution is not None:
+        resolution = check_resolution(resolution)
+    with _lock:
+        if resolution is not None:
+            _settings['resolution'] = resolution
+        if cache_file is not _KEEP:
+            _settings['cache_file'] = cache_file
+        _grid = None
+
+
+def fast_grid():
+    """
+    Returns the shared FastGrid.  It comes from the compiled table file or the cache file if either has current
+    grids of the configured resolution, otherwise it is built (and written to the cache file, if one is configured).
+    :return: FastGrid
+    """
+    global _grid
+    if _grid is None:
+        with _lock:
+            if _grid is None:
+                path = _settings['cache_file']
+                compiled = Steam_compiled.compiled_tables()
+                grid = compiled.fast_grid(_settings['resolution']) if compiled is not None else None
+                if grid is None and path:
+                    grid = FastGrid.load(path, _settings['resolution'])
+                if grid is None:
+                    grid = FastGrid.build(_settings['resolution'])
+                    if path:
+                        grid.save(path)
+                _grid = grid
+    return _grid
+
+
+@Steam_tables.on_reload
+def _discard_grid():
+    global _grid
+    _grid = None
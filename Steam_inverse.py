@@ -0,0 +1,167 @@
+# Inverse lookups on the saturation curve: bracketed, derivative-aware root finding with a capped iteration count
+
+import numpy as np
+
+import Steam_profile
+import Steam_tables
+from Steam_sat import saturation_curve
+
+# column positions in the vectors from Steam_sat
+_SAT_COLUMN = {'h': (1, 2), 's': (3, 4), 'v': (5, 6)}
+
+XTOL = 1e-10  # relative tolerance on the root
+MAXITER = 50  # cap on iterations (each bisection step at least halves the bracket)
+
+
+class InverseResult:
+    def __init__(self, root, converged, iterations):
+        """
+        The result of a vectorized inverse lookup.
+        :param root: the roots, nan where no root was found
+        :param converged: boolean array, False where there was no bracket or the iteration cap was reached
+        :param iterations: number of iterations used (the slowest row)
+        """
+        self.root = root
+        self.converged = converged
+        self.iterations = iterations
+
+
+def first_bracket(nodes, node_residuals):
+    """
+    Finds the first interval between table nodes where each row's residual changes sign.
+    :param nodes: (m,) increasing node values
+    :param node_residuals: (n, m) residual of every row at every node (nan where undefined)
+    :return: (rows that have a bracket, lower end, upper end, residual at the lower end)
+    """
+    change = np.signbit(node_residuals[:, :-1]) != np.signbit(node_residuals[:, 1:])
+    change &= ~np.isnan(node_residuals[:, :-1]) & ~np.isnan(node_residuals[:, 1:])
+    rows = np.nonzero(change.any(axis=1))[0]
+    i = np.argmax(change[rows], axis=1)
+    return rows, nodes[i].astype(float), nodes[i + 1].astype(float), node_residuals[rows, i]
+
+
+@Steam_profile.timed('root solve')
+def solve_bracketed(fun, lo, hi, r_lo, xtol=XTOL, maxiter=MAXITER):
+    """
+    Safeguarded Newton iteration for many rows at once.  A Newton step from the spline derivative is taken
+    when it stays inside the bracket, otherwise the bracket is bisected, so every row converges in a bounded
+    number of iterations.
+    :param fun: function(z, rows) -> (residual, derivative) at z for the given rows
+    :param lo: lower ends of the brackets
+    :param hi: upper ends of the brackets
+    :param r_lo: residuals at lo (the residual at hi has the opposite sign)
+    :param xtol: relative tolerance on the root
+    :param maxiter: maximum number of iterations
+    :return: InverseResult
+    """
+    n = len(lo)
+    lo, hi, r_lo = lo.copy(), hi.copy(), r_lo.copy()
+    z = 0.5 * (lo + hi)
+    root = np.full(n, np.nan)
+    converged = np.zeros(n, bool)
+    active = np.arange(n)
+    iterations = 0
+    while len(active) and iterations < maxiter:
+        iterations += 1
+        za = z[active]
+        r, dr = fun(za, active)
+        keep = ~np.isnan(r)
+        active, za, r, dr = active[keep], za[keep], r[keep], dr[keep]
+        # shrink the bracket around the root
+        same = np.signbit(r) == np.signbit(r_lo[active])
+        lo[active] = np.where(same, za, lo[active])
+        r_lo[active] = np.where(same, r, r_lo[active])
+        hi[active] = np.where(same, hi[active], za)
+        # Newton step if it lands inside the bracket, bisection otherwise
+        with np.errstate(divide='ignore', invalid='ignore'):
+            step = za - r / dr
+        inside = (step > lo[active]) & (step < hi[active])
+        znew = np.where(inside, step, 0.5 * (lo[active] + hi[active]))
+        tol = xtol * (1 + np.abs(za))
+        done = (r == 0) | (inside & (np.abs(step - za) <= tol)) | (hi[active] - lo[active] <= tol)
+        root[active[done]] = np.where(r[done] == 0, za[done], znew[done])
+        converged[active[done]] = True
+        z[active] = znew
+        active = active[~done]
+    if Steam_profile.enabled:
+        Steam_profile.count('root solves')
+        Steam_profile.count('root solve iterations', iterations)
+    return InverseResult(root, converged, iterations)
+
+
+def solve_on_nodes(fun, nodes, node_residuals, xtol, maxiter):
+    """
+    Brackets every row on the table nodes and solves inside the first bracket.
+    :return: InverseResult for all rows (rows without a bracket are not converged)
+    """
+    n = node_residuals.shape[0]
+    rows, lo, hi, r_lo = first_bracket(nodes, node_residuals)
+    root = np.full(n, np.nan)
+    converged = np.zeros(n, bool)
+    if len(rows) == 0:
+        return InverseResult(root, converged, 0)
+    result = solve_bracketed(lambda z, sub: fun(z, rows[sub]), lo, hi, r_lo, xtol, maxiter)
+    root[rows], converged[rows] = result.root, result.converged
+    return InverseResult(root, converged, result.iterations)
+
+
+def quality_pressure(x, prop, value, xtol=XTOL, maxiter=MAXITER):
+    """
+    Finds the saturation pressure where a two-phase mixture of quality x has the given v, h or s.
+    h and s at a fixed quality are not always monotone in pressure; the lowest pressure that matches is used.
+    :param x: qualities (n,)
+    :param prop: 'v', 'h' or 's'
+    :param value: values of prop (n,)
+    :return: InverseResult with the pressures in bar
+    """
+    x = np.atleast_1d(np.asarray(x, dtype=float))
+    value = np.atleast_1d(np.asarray(value, dtype=float))
+    curve = saturation_curve()
+    table = Steam_tables.sat_table()
+    f, g = _SAT_COLUMN[prop]
+    cols = (table.ts, table.hf, table.hg, table.sf, table.sg, table.vf, table.vg)
+    node_residuals = x[:, None] * (cols[g] - cols[f])[None, :] + cols[f][None, :] - value[:, None]
+
+    def fun(P, rows):
+        sat, dsat = curve.by_P(P), curve.dby_P(P)
+        r = sat[:, f] + x[rows] * (sat[:, g] - sat[:, f]) - value[rows]
+        dr = dsat[:, f] + x[rows] * (dsat[:, g] - dsat[:, f])
+        return r, dr
+
+    return solve_on_nodes(fun, table.ps, node_residuals, xtol, maxiter)
+
+
+def two_phase_temperature(props, a, b, xtol=XTOL, maxiter=MAXITER):
+    """
+    Finds the saturation temperature where the qualities computed from two known properties agree
+    (the two-phase vh, vs and hs cases).
+    :param props: the two property letters, e.g. 'vh'
+    :param a: values of the first property (n,)
+    :param b: values of the second property (n,)
+    :return: InverseResult with the temperatures in C
+    """
+    a = np.atleast_1d(np.asarray(a, dtype=float))
+    b = np.atleast_1d(np.asarray(b, dtype=float))
+    curve = saturation_curve()
+    table = Steam_tables.sat_table()
+    cols = (table.ts, table.hf, table.hg, table.sf, table.sg, table.vf, table.vg)
+    (fa, ga), (fb, gb) = _SAT_COLUMN[props[0]], _SAT_COLUMN[props[1]]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        node_residuals = ((b[:, None] - cols[fb]) / (cols[gb] - cols[fb])
+                          - (a[:, None] - cols[fa]) / (cols[ga] - cols[fa]))
+    node_residuals[:, -1] = np.nan  # the qualities are undefined at the critical point
+
+    def quality(sat, dsat, value, f, g):
+        width = sat[:, g] - sat[:, f]
+        q = (value - sat[:, f]) / width
+        dq = (-dsat[:, f] - q * (dsat[:, g] - dsat[:, f])) / width
+        return q, dq
+
+    def fun(T, rows):
+        sat, dsat = curve.by_T(T), curve.dby_T(T)
+        qb, dqb = quality(sat, dsat, b[rows], fb, gb)
+        qa, dqa = quality(sat, dsat, a[rows], fa, ga)
+        return qb - qa, dqb - dqa
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return solve_on_nodes(fun, table.ts, node_residuals, xtol, maxiter)
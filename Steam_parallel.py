@@ -0,0 +1,110 @@
+# Runs large state batches and Rankine sweeps across a pool of worker processes
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import Steam_tables
+from Steam_sat import saturation_curve
+from Steam_superheated import superheated_engine, PAIRS
+from Steam_batch import calc_states, normalize_case
+from Rankine_sweep import calc_cycles
+from Steam_backends import get_backend
+
+
+def _init_worker():
+    """
+    Runs once in every worker process: reads the tables and builds the splines and triangulations so that
+    tasks only carry their own input arrays (the tables are never pickled).
+    """
+    Steam_tables.sat_table()
+    Steam_tables.superheated_table()
+    saturation_curve()
+    engine = superheated_engine()
+    for pair in PAIRS:
+        engine.triangulation(pair)
+
+
+def _states_task(case, a, b, method='cubic', backend=None):
+    if backend is not None:
+        return get_backend(backend).calc_states(case, a, b)
+    return calc_states(case, a, b, method)
+
+
+def _cycles_task(p_low, p_high, t_high, quality, eff_turbine, method, backend=None):
+    return calc_cycles(p_low, p_high, t_high, quality, eff_turbine, method, backend)
+
+
+class ParallelExecutor:
+    def __init__(self, max_workers=None, chunk_size=50000, mp_context=None):
+        """
+        Splits batch inputs into chunks and evaluates the chunks in a process pool.  Results come back in the
+        order of the inputs.  Use it as a context manager (or call shutdown()) so the workers are stopped.
+        Note: scripts using this must guard their entry point with if __name__ == "__main__".
+        :param max_workers: number of worker processes (default: number of CPUs)
+        :param chunk_size: number of rows per task
+        :param mp_context: optional multiprocessing context (e.g., multiprocessing.get_context('spawn'))
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be at least 1')
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.chunk_size = chunk_size
+        self._pool = ProcessPoolExecutor(max_workers=self.max_workers, mp_context=mp_context,
+                                         initializer=_init_worker)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+    def shutdown(self, wait=True):
+        self._pool.shutdown(wait=wait)
+
+    def _chunks(self, n):
+        return [slice(start, min(start + self.chunk_size, n)) for start in range(0, n, self.chunk_size)]
+
+    def calc_states(self, case, a, b, method='cubic', backend=None):
+        """
+        Parallel version of Steam_batch.calc_states (Steam_SI.calc_many).
+        :param method: interpolation on the superheated table (see Steam_batch.calc_states)
+        :param backend: None for the steam tables, or the name of a registered property backend (the workers
+                        create their own instance, so it is passed by name)
+        :return: structured array of Steam_batch.STATE_DTYPE in input order
+        """
+        normalize_case(case)  # fail here rather than in every worker
+        a = np.atleast_1d(np.asarray(a, dtype=float)).ravel()
+        b = np.atleast_1d(np.asarray(b, dtype=float)).ravel()
+        if len(a) != len(b):
+            raise ValueError('the two property arrays must be the same length')
+        chunks = self._chunks(len(a))
+        if backend is not None:
+            backend = get_backend(backend).name  # fail here for unknown names
+        if len(chunks) <= 1:
+            return _states_task(case, a, b, method, backend)
+        results = self._pool.map(_states_task, [case] * len(chunks), [a[c] for c in chunks], [b[c] for c in chunks],
+                                 [method] * len(chunks), [backend] * len(chunks))
+        return np.concatenate(list(results))
+
+    def sweep(self, p_low=8, p_high=8000, t_high=None, quality=1, eff_turbine=0.95, grid=False, method='linear',
+              backend=None):
+        """
+        Parallel version of Rankine_sweep.sweep.  Arguments are the same (a backend is passed by name).
+        :return: structured array of Rankine_sweep.CYCLE_DTYPE shaped like the broadcast (or grid) of the arguments
+        """
+        args = [p_low, p_high, np.nan if t_high is None else t_high, quality, eff_turbine]
+        args = [np.asarray(arg, dtype=float) for arg in args]
+        if grid:
+            args = np.meshgrid(*[arg.ravel() for arg in args], indexing='ij')
+        args = np.broadcast_arrays(*args)
+        shape = args[0].shape
+        args = [np.ascontiguousarray(arg).ravel() for arg in args]
+        chunks = self._chunks(len(args[0]))
+        if backend is not None:
+            backend = get_backend(backend).name
+        if len(chunks) <= 1:
+            return calc_cycles(*args, method=method, backend=backend).reshape(shape)
+        columns = [[arg[c] for c in chunks] for arg in args]
+        results = self._pool.map(_cycles_task, *columns, [method] * len(chunks), [backend] * len(chunks))
+        return np.concatenate(list(results)).reshape(shape)
@@ -0,0 +1,254 @@
+# Opt-in instrumentation of the hot paths: per-phase timings and counters, plus a cProfile/pyinstrument capture
+#
+#   import Steam_profile
+#   with Steam_profile.instrumented():         # or Steam_profile.enable()
+#       rankine().calc_efficiency()
+#   print(Steam_profile.stats.report())
+#
+#   with Steam_profile.capture() as run:        # cProfile (or engine='pyinstrument') around a block
+#       ...
+#   print(run.text())
+#
+# While instrumentation is off (the default) a timed function costs one extra call and a flag check.
+
+import contextlib
+import functools
+import threading
+import time
+
+enabled = False  # read by the hooks; change it with enable()/disable()
+
+
+class ProfileStats:
+    def __init__(self):
+        """
+        Accumulated timings of named phases and named counters.  Phases nest (e.g., 'Steam_SI.calc' includes the
+        'saturated interpolation' it does), so the phase times are inclusive.
+        """
+        self._phases = {}  # name -> [count, total seconds, max seconds]
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def add(self, name, seconds):
+        """
+        Records one run of a phase.
+        """
+        with self._lock:
+            entry = self._phases.get(name)
+            if entry is None:
+                self._phases[name] = [1, seconds, seconds]
+            else:
+                entry[0] += 1
+                entry[1] += seconds
+                if seconds > entry[2]:
+                    entry[2] = seconds
+
+    def count(self, name, n=1):
+        """
+        Adds n to a counter.
+        """
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + n
+
+    def reset(self):
+        with self._lock:
+            self._phases.clear()
+            self._counters.clear()
+
+    def snapshot(self):
+        """
+        :return: dict with 'phases' (name -> count, total_s, mean_us and max_us) and 'counters' (name -> value)
+        """
+        with self._lock:
+            phases = {name: {'count': count, 'total_s': total, 'mean_us': 1e6 * total / count, 'max_us': 1e6 * peak}
+                      for name, (count, total, peak) in self._phases.items()}
+            return {'phases': phases, 'counters': dict(self._counters)}
+
+    def report(self):
+        """
+        :return: the phases (slowest total first) and counters as a text table
+        """
+        data = self.snapshot()
+        lines = ['{:<32}{:>10}{:>12}{:>12}{:>12}'.format('phase', 'count', 'total s', 'mean us', 'max us')]
+        for name, p in sorted(data['phases'].items(), key=lambda item: -item[1]['total_s']):
+            lines.append('{:<32}{:>10}{:>12.4f}{:>12.1f}{:>12.1f}'.format(name, p['count'], p['total_s'],
+                                                                         p['mean_us'], p['max_us']))
+        if data['counters']:
+            lines.append('')
+            lines.append('{:<32}{:>10}'.format('counter', 'value'))
+            for name, value in sorted(data['counters'].items()):
+                lines.append('{:<32}{:>10}'.format(name, value))
+        return '\n'.join(lines)
+
+
+stats = ProfileStats()  # the statistics every hook records into
+
+
+def enable(reset=False):
+    """
+    Turns the instrumentation on.
+    :param reset: True to clear the statistics first
+    """
+    global enabled
+    if reset:
+        stats.reset()
+    enabled = True
+
+
+def disable():
+    global enabled
+    enabled = False
+
+
+@contextlib.contextmanager
+def instrumented(reset=True):
+    """
+    Turns the instrumentation on inside a with block (and back to what it was afterwards).
+    :param reset: True to clear the statistics first
+    :return: the ProfileStats
+    """
+    was_enabled = enabled
+    enable(reset)
+    try:
+        yield stats
+    finally:
+        if not was_enabled:
+            disable()
+
+
+class _Phase:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        stats.add(self.name, time.perf_counter() - self.start)
+        return False
+
+
+class _NoPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        return False
+
+
+_NO_PHASE = _NoPhase()
+
+
+def phase(name):
+    """
+    Times a block as a phase:  with Steam_profile.phase('table load'): ...
+    :return: a context manager (one that does nothing while instrumentation is off)
+    """
+    return _Phase(name) if enabled else _NO_PHASE
+
+
+def count(name, n=1):
+    """
+    Adds n to a counter while instrumentation is on.
+    """
+    if enabled:
+        stats.count(name, n)
+
+
+def timed(name):
+    """
+    Decorator that times every call of a function as a phase.
+    :param name: the phase name, e.g. 'Steam_SI.calc'
+    """
+    def decorate(fun):
+        @functools.wraps(fun)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return fun(*args, **kwargs)
+            start = time.perf_counter()
+            try:
+                return fun(*args, **kwargs)
+            finally:
+                stats.add(name, time.perf_counter() - start)
+        return wrapper
+    return decorate
+
+
+class Capture:
+    def __init__(self, engine='cProfile'):
+        """
+        A profiler run (see capture).
+        :param engine: 'cProfile' or 'pyinstrument' (pyinstrument must be installed)
+        """
+        if engine not in ('cProfile', 'pyinstrument'):
+            raise ValueError('unsupported profiler: {}'.format(engine))
+        self.engine = engine
+        if engine == 'cProfile':
+            import cProfile
+            self.profiler = cProfile.Profile()
+        else:
+            from pyinstrument import Profiler  # optional dependency, only needed for this engine
+            self.profiler = Profiler()
+
+    def start(self):
+        if self.engine == 'cProfile':
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+
+    def stop(self):
+        if self.engine == 'cProfile':
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+
+    def text(self, limit=30, sort='cumulative'):
+        """
+        :param limit: number of functions listed (cProfile)
+        :param sort: pstats sort key (cProfile)
+        :return: the profile as text
+        """
+        if self.engine == 'pyinstrument':
+            return self.profiler.output_text()
+        import io
+        import pstats
+        out = io.StringIO()
+        pstats.Stats(self.profiler, stream=out).sort_stats(sort).print_stats(limit)
+        return out.getvalue()
+
+    def save(self, path):
+        """
+        Writes the profile: cProfile data (for pstats/snakeviz) or a pyinstrument HTML page.
+        """
+        if self.engine == 'cProfile':
+            self.profiler.dump_stats(path)
+        else:
+            with open(path, 'w') as f:
+                f.write(self.profiler.output_html())
+
+
+@contextlib.contextmanager
+def capture(engine='cProfile', path=None, instrument=True):
+    """
+    Profiles the code in a with block.
+    :param engine: 'cProfile' or 'pyinstrument'
+    :param path: optional file to save the profile to when the block ends
+    :param instrument: True to also record the phase statistics (reset at the start) during the block
+    :return: the Capture (its text() is available after the block)
+    """
+    run = Capture(engine)
+    was_enabled = enabled
+    if instrument:
+        enable(reset=True)
+    run.start()
+    try:
+        yield run
+    finally:
+        run.stop()
+        if instrument and not was_enabled:
+            disable()
+        if path is not None:
+            run.save(path)
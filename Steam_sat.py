@@ -0,0 +1,158 @@
+# Saturation-curve property engine: monotone cubic (PCHIP) splines built once over sat_water_table.txt
+
+import bisect
+import threading
+import numpy as np
+
+import Steam_tables
+import Steam_compiled
+import Steam_profile
+
+# column order of the vectors returned by sat_props_P and sat_props_T
+# (the first entry is Tsat for sat_props_P and Psat for sat_props_T)
+SAT_COLUMNS = ('T_or_P', 'hf', 'hg', 'sf', 'sg', 'vf', 'vg')
+
+# the splines of a SaturationCurve (these are also the spline sections of the compiled table file)
+SPLINES = ('by_P', 'by_T', 'T_by_vg', 'T_by_hg', 'T_by_hg_high')
+
+
+class PiecewisePolynomial:
+    def __init__(self, x, c):
+        """
+        A piecewise polynomial evaluated with numpy alone, in the layout of scipy's PPoly: c[m, i] is the coefficient
+        of (t - x[i])**(degree - m) on the interval x[i] <= t < x[i+1].  Returns nan outside [x[0], x[-1]].
+        :param x: increasing breakpoints (m,)
+        :param c: coefficients (degree + 1, m - 1) or (degree + 1, m - 1, k) for k values per point
+        """
+        self.x = x
+        self.c = c
+
+    def __call__(self, t):
+        """
+        :param t: scalar or array
+        :return: array of shape t.shape (+ (k,))
+        """
+        x = self.x
+        if np.ndim(t) == 0:
+            t = float(t)
+            if not x[0] <= t <= x[-1]:  # also catches nan
+                return np.full(self.c.shape[2:], np.nan)
+            i = min(bisect.bisect_right(x, t) - 1, len(x) - 2)
+            d = t - x[i]
+            c = self.c[:, i]
+            y = c[0] * d + c[1]
+            for ci in c[2:]:
+                y = y * d + ci
+            return y
+        t = np.asarray(t, dtype=float)
+        i = np.clip(np.searchsorted(x, t, side='right') - 1, 0, len(x) - 2)
+        d = t - x[i]
+        if self.c.ndim == 3:
+            d = d[..., None]
+        c = self.c[:, i]
+        y = c[0] * d
+        y += c[1]
+        for ci in c[2:]:  # Horner's rule
+            y *= d
+            y += ci
+        outside = ~((t >= x[0]) & (t <= x[-1]))  # comparisons with nan are False
+        if outside.any():
+            y[outside] = np.nan
+        return y
+
+    def derivative(self):
+        """
+        :return: PiecewisePolynomial of the first derivative
+        """
+        degree = len(self.c) - 1
+        factors = np.arange(degree, 0, -1).reshape((-1,) + (1,) * (self.c.ndim - 1))
+        return PiecewisePolynomial(self.x, self.c[:-1] * factors)
+
+
+class SaturationCurve:
+    def __init__(self, sat, splines=None):
+        """
+        The splines for the saturated properties keyed by pressure and by temperature.
+        Each spline interpolates all seven saturated properties at once, so one evaluation returns a vector.
+        Outside the range of the table the splines return nan (like griddata did).
+        :param sat: a SatTable from Steam_tables
+        :param splines: dict of spline name (SPLINES) -> (breakpoints, coefficients) that were computed before,
+                        e.g. read from the compiled table file.  None to fit the splines to sat.
+        """
+        if splines is None:
+            splines = fit_splines(sat)
+        for name in SPLINES:
+            setattr(self, name, PiecewisePolynomial(*splines[name]))
+        # by_P: P in bar, by_T: T in C.
+        # T_by_vg, T_by_hg and T_by_hg_high are the inverse curves used to check for two-phase states when
+        # neither P nor T is given.
+        self.dby_P = self.by_P.derivative()  # slopes, used by the inverse solvers in Steam_inverse.py
+        self.dby_T = self.by_T.derivative()
+        self.P_max = sat.ps[-1]  # critical pressure (bar)
+        self.T_max = sat.ts[-1]  # critical temperature (C)
+        self.critical = self.by_P(self.P_max)
+
+
+def fit_splines(sat):
+    """
+    Fits the monotone cubic (PCHIP) splines of a SaturationCurve to the saturated water table.
+    :param sat: a SatTable
+    :return: dict of spline name -> (breakpoints, coefficients)
+    """
+    from scipy.interpolate import PchipInterpolator  # only needed when there is no compiled table file
+    props = np.column_stack((sat.hf, sat.hg, sat.sf, sat.sg, sat.vf, sat.vg))
+    # vg falls steadily with T.  hg has a maximum, so it is split into a low and a high temperature side.
+    nmax = int(np.argmax(sat.hg))
+    fits = {'by_P': PchipInterpolator(sat.ps, np.column_stack((sat.ts, props))),
+            'by_T': PchipInterpolator(sat.ts, np.column_stack((sat.ps, props))),
+            'T_by_vg': PchipInterpolator(sat.vg[::-1], sat.ts[::-1]),
+            'T_by_hg': PchipInterpolator(sat.hg[:nmax + 1], sat.ts[:nmax + 1]),
+            'T_by_hg_high': PchipInterpolator(sat.hg[nmax:][::-1], sat.ts[nmax:][::-1])}
+    return {name: (fit.x, fit.c) for name, fit in fits.items()}
+
+
+_lock = threading.Lock()
+_curve = None
+
+
+def saturation_curve():
+    """
+    Returns the shared SaturationCurve, building it on first use.
+    :return: SaturationCurve
+    """
+    global _curve
+    if _curve is None:
+        with _lock:
+            if _curve is None:
+                sat = Steam_tables.sat_table()
+                with Steam_profile.phase('saturation spline build'):
+                    compiled = Steam_compiled.compiled_tables()
+                    splines = compiled.splines() if compiled is not None else None
+                    _curve = SaturationCurve(sat, splines)
+    return _curve
+
+
+@Steam_tables.on_reload
+def _discard_curve():
+    global _curve
+    _curve = None
+
+
+@Steam_profile.timed('saturated interpolation')
+def sat_props_P(P):
+    """
+    Saturated properties at a pressure.
+    :param P: pressure in bar (scalar or array)
+    :return: array with last axis [Tsat, hf, hg, sf, sg, vf, vg]
+    """
+    return saturation_curve().by_P(P)
+
+
+@Steam_profile.timed('saturated interpolation')
+def sat_props_T(T):
+    """
+    Saturated properties at a temperature.
+    :param T: temperature in C (scalar or array)
+    :return: array with last axis [Psat (bar), hf, hg, sf, sg, vf, vg]
+    """
+    return saturation_curve().by_T(T)
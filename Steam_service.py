@@ -0,0 +1,478 @@
+# Local HTTP service for steam states and Rankine cycles, so several tools share one warm process
+#
+#   python Steam_service.py --port 8750                   serve on http://127.0.0.1:8750
+#   python Steam_service.py --unix /tmp/steam.sock        serve on a Unix socket
+#
+#   client = ServiceClient(port=8750)                     (or ServiceClient(path='/tmp/steam.sock'))
+#   client.state(P=500, T=300)                            {'P': 500.0, 'T': 300.0, 'h': 3064.2..., 'region': ...}
+#   client.state(case='Ph', a=[500, 1000], b=[2800, 3000])
+#   client.rankine(p_low=8, p_high=8000, t_high=500)      {'efficiency': ..., 'turbine_work': ..., ...}
+#   client.metrics()
+#
+# Endpoints (JSON in and out): POST /state, POST /rankine, GET /metrics, GET /health.  Requests that arrive within
+# a short window (and use the same case, method and backend) are joined into one vectorized call of
+# Steam_SI.calc_many or Rankine_sweep.calc_cycles; batches run one at a time in a worker thread, so requests that
+# arrive while a batch is running form the next batch.  The tables, splines and interpolators are built when the
+# service starts.  Only the standard library is used for the server and the client.
+
+import argparse
+import asyncio
+import collections
+import http.client
+import json
+import socket
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+import Steam_tables
+from Calc_state import Steam_SI
+from Rankine_sweep import calc_cycles
+from Steam_batch import normalize_case, region_name
+from Steam_cache import state_cache
+from Steam_sat import saturation_curve
+from Steam_superheated import superheated_engine, PAIRS
+
+HOST = '127.0.0.1'
+PORT = 8750
+WINDOW = 0.002  # seconds a request waits for others to join its batch
+MAX_BATCH = 50000  # rows; a batch this large runs without waiting for the window
+LATENCY_SAMPLES = 2048  # latencies kept per endpoint for the percentiles
+STATE_LETTERS = 'PTxvhs'
+CYCLE_ARGS = ('p_low', 'p_high', 't_high', 'quality', 'eff_turbine')
+CYCLE_DEFAULTS = {'p_low': 8, 'p_high': 8000, 't_high': None, 'quality': 1, 'eff_turbine': 0.95}
+
+
+def warm_up(methods=('cubic', 'linear')):
+    """
+    Loads the tables and builds the saturation splines and the superheated interpolators ahead of the first request.
+    :param methods: superheated interpolation methods to build interpolators for
+    """
+    Steam_tables.sat_table()
+    Steam_tables.superheated_table()
+    saturation_curve()
+    engine = superheated_engine()
+    for pair in PAIRS:
+        for method in methods:
+            if method in ('cubic', 'linear'):  # the fast grids are built on first use
+                engine.interpolator(pair, method)
+
+
+def _json_values(values, scalar):
+    # nan is not valid JSON, so it becomes null
+    values = [None if v != v else v for v in values.tolist()]
+    return values[0] if scalar else values
+
+
+class Metrics:
+    def __init__(self):
+        """
+        Request counts, latencies and batch sizes of the service.
+        """
+        self._latency = collections.defaultdict(lambda: collections.deque(maxlen=LATENCY_SAMPLES))
+        self._requests = collections.Counter()
+        self._errors = collections.Counter()
+        self._batches = collections.defaultdict(lambda: {'batches': 0, 'requests': 0, 'rows': 0, 'max_rows': 0,
+                                                         'seconds': 0.0})
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    def request(self, endpoint, seconds, ok=True):
+        with self._lock:
+            self._requests[endpoint] += 1
+            if not ok:
+                self._errors[endpoint] += 1
+            self._latency[endpoint].append(seconds)
+
+    def batch(self, kind, requests, rows, seconds):
+        with self._lock:
+            b = self._batches[kind]
+            b['batches'] += 1
+            b['requests'] += requests
+            b['rows'] += rows
+            b['max_rows'] = max(b['max_rows'], rows)
+            b['seconds'] += seconds
+
+    def snapshot(self):
+        """
+        :return: dict with uptime, per-endpoint requests/errors/latency percentiles (ms), per-kind batch sizes and
+                 the state cache statistics
+        """
+        with self._lock:
+            endpoints = {}
+            for endpoint, count in self._requests.items():
+                latency = np.array(self._latency[endpoint]) * 1000
+                endpoints[endpoint] = {'requests': count, 'errors': self._errors[endpoint],
+                                       'p50_ms': float(np.percentile(latency, 50)),
+                                       'p99_ms': float(np.percentile(latency, 99)),
+                                       'max_ms': float(latency.max())}
+            batches = {}
+            for kind, b in self._batches.items():
+                batches[kind] = dict(b, mean_requests=b['requests'] / b['batches'], mean_rows=b['rows'] / b['batches'])
+        return {'uptime_s': time.time() - self.started, 'endpoints': endpoints, 'batches': batches,
+                'state_cache': state_cache.stats()}
+
+
+class Batcher:
+    def __init__(self, kind, compute, executor, metrics, window=WINDOW, max_batch=MAX_BATCH):
+        """
+        Joins requests with the same key that arrive within a window into one call of compute.
+        :param kind: name used in the metrics, e.g. 'state'
+        :param compute: function(key, *columns) -> structured array with one row per input row
+        :param executor: executor the computation runs in (keeps the event loop free)
+        :param window: seconds the first request of a batch waits for others
+        :param max_batch: number of rows at which a batch runs at once
+        """
+        self.kind = kind
+        self.compute = compute
+        self.executor = executor
+        self.metrics = metrics
+        self.window = window
+        self.max_batch = max_batch
+        self._pending = {}  # key -> [list of (columns, future), rows, timer]
+
+    async def submit(self, key, columns):
+        """
+        :param key: hashable; only requests with equal keys share a batch
+        :param columns: tuple of 1-D float arrays of the same length
+        :return: the rows of the result for these columns
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        pending = self._pending.get(key)
+        if pending is None:
+            pending = self._pending[key] = [[], 0, loop.call_later(self.window, self._flush, key)]
+        pending[0].append((columns, future))
+        pending[1] += len(columns[0])
+        if pending[1] >= self.max_batch:
+            self._flush(key)
+        return await future
+
+    def _flush(self, key):
+        pending = self._pending.pop(key, None)
+        if pending is None:
+            return
+        entries, rows, timer = pending
+        timer.cancel()
+        asyncio.ensure_future(self._run(key, entries, rows))
+
+    async def _run(self, key, entries, rows):
+        loop = asyncio.get_running_loop()
+        columns = [np.concatenate(parts) for parts in zip(*(columns for columns, future in entries))]
+        start = time.perf_counter()
+        try:
+            result = await loop.run_in_executor(self.executor, self.compute, key, *columns)
+        except Exception as e:
+            for columns, future in entries:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.metrics.batch(self.kind, len(entries), rows, time.perf_counter() - start)
+        offset = 0
+        for columns, future in entries:
+            n = len(columns[0])
+            if not future.done():
+                future.set_result(result[offset:offset + n])
+            offset += n
+
+
+class SteamService:
+    def __init__(self, window=WINDOW, max_batch=MAX_BATCH, state_method='cubic', cycle_method='linear'):
+        """
+        The service.  start() it inside an event loop, or use start_background() from ordinary code.
+        :param window: seconds a request waits for others to join its batch
+        :param max_batch: rows at which a batch runs without waiting
+        :param state_method: default superheated interpolation for /state (as Steam_SI.calc_many)
+        :param cycle_method: default superheated interpolation for /rankine (as Rankine_sweep.calc_cycles)
+        """
+        self.metrics = Metrics()
+        self.state_method = state_method
+        self.cycle_method = cycle_method
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='steam-service')
+        self._states = Batcher('state', self._calc_states, self._executor, self.metrics, window, max_batch)
+        self._cycles = Batcher('rankine', self._calc_cycles, self._executor, self.metrics, window, max_batch)
+        self._server = None
+        self._connections = {}  # handler task -> stream writer of every open connection
+        self._loop = None
+        self._thread = None
+        self.address = None
+
+    @staticmethod
+    def _calc_states(key, a, b):
+        case, method, backend = key
+        return Steam_SI.calc_many(case, a, b, method, backend)
+
+    @staticmethod
+    def _calc_cycles(key, *columns):
+        method, backend = key
+        return calc_cycles(*columns, method=method, backend=backend)
+
+    async def start(self, host=HOST, port=PORT, path=None):
+        """
+        Warms up the tables and starts listening.
+        :param host: TCP host
+        :param port: TCP port (0 for any free port)
+        :param path: Unix socket path (used instead of host and port)
+        :return: the address served: (host, port) or the socket path
+        """
+        self._loop = asyncio.get_running_loop()
+        await self._loop.run_in_executor(self._executor, warm_up, (self.state_method, self.cycle_method))
+        if path is not None:
+            self._server = await asyncio.start_unix_server(self._handle, path=path)
+            self.address = path
+        else:
+            self._server = await asyncio.start_server(self._handle, host, port)
+            self.address = self._server.sockets[0].getsockname()[:2]
+        return self.address
+
+    async def serve_forever(self):
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            tasks = list(self._connections)
+            for writer in self._connections.values():  # idle keep-alive connections would otherwise stay open
+                writer.close()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._server.wait_closed()
+        self._executor.shutdown(wait=False)
+
+    def start_background(self, host=HOST, port=PORT, path=None):
+        """
+        Runs the service in its own thread with its own event loop (e.g., next to a GUI or in a script).
+        :return: the address served
+        """
+        ready = threading.Event()
+        failure = []
+
+        def target():
+            loop = asyncio.new_event_loop()
+            asyncio.set_event_loop(loop)
+            try:
+                loop.run_until_complete(self.start(host, port, path))
+            except BaseException as e:
+                failure.append(e)
+                ready.set()
+                return
+            ready.set()
+            try:
+                loop.run_until_complete(self.serve_forever())
+            except asyncio.CancelledError:
+                pass
+            finally:
+                loop.run_until_complete(self.close())
+                loop.close()
+
+        self._thread = threading.Thread(target=target, name='steam-service', daemon=True)
+        self._thread.start()
+        ready.wait()
+        if failure:
+            raise failure[0]
+        return self.address
+
+    def stop_background(self):
+        """
+        Stops a service started with start_background.
+        """
+        if self._thread is None:
+            return
+        self._loop.call_soon_threadsafe(self._server.close)
+        self._thread.join()
+        self._thread = None
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections[task] = writer
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                method, target, version = line.decode('latin-1').split()
+                headers = {}
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                body = await reader.readexactly(int(headers.get('content-length', 0)))
+                status, payload = await self._route(method, target.split('?')[0], body)
+                data = json.dumps(payload).encode()
+                writer.write(b'HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n'
+                             % (status, http.client.responses[status].encode(), len(data)) + data)
+                await writer.drain()
+                if headers.get('connection', '').lower() == 'close' or version == 'HTTP/1.0':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # the client went away or sent something that is not HTTP
+        finally:
+            self._connections.pop(task, None)
+            writer.close()
+
+    async def _route(self, method, path, body):
+        start = time.perf_counter()
+        handler = {('GET', '/health'): self._health, ('GET', '/metrics'): self._metrics,
+                   ('POST', '/state'): self._state, ('POST', '/rankine'): self._rankine}.get((method, path))
+        if handler is None:
+            return 404, {'error': 'no such endpoint: {} {}'.format(method, path)}
+        try:
+            result = await handler(json.loads(body) if body else {})
+        except (ValueError, KeyError, TypeError) as e:
+            self.metrics.request(path, time.perf_counter() - start, ok=False)
+            return 400, {'error': str(e)}
+        except Exception as e:
+            self.metrics.request(path, time.perf_counter() - start, ok=False)
+            return 500, {'error': '{}: {}'.format(type(e).__name__, e)}
+        if path in ('/state', '/rankine'):
+            self.metrics.request(path, time.perf_counter() - start)
+        return 200, result
+
+    async def _health(self, request):
+        return {'status': 'ok'}
+
+    async def _metrics(self, request):
+        return self.metrics.snapshot()
+
+    async def _state(self, request):
+        """
+        {"case": "Ph", "a": ..., "b": ...} or two properties by name, e.g. {"P": ..., "T": ...}; values are numbers
+        or lists of numbers.  Optional "method" and "backend" as for Steam_SI.calc_many.
+        """
+        if 'case' in request:
+            case, a, b = request['case'], request['a'], request['b']
+        else:
+            given = [c for c in STATE_LETTERS if c in request]
+            if len(given) != 2:
+                raise ValueError('give exactly two of P, T, x, v, h, s (or case, a and b)')
+            case, a, b = given[0] + given[1], request[given[0]], request[given[1]]
+        normalize_case(case)  # fail on bad pairs before joining a batch
+        scalar = np.ndim(a) == 0 and np.ndim(b) == 0
+        a, b = np.broadcast_arrays(np.atleast_1d(np.asarray(a, dtype=float)), np.atleast_1d(np.asarray(b, dtype=float)))
+        key = (case, request.get('method', self.state_method), request.get('backend'))
+        states = await self._states.submit(key, (a.ravel(), b.ravel()))
+        result = {name: _json_values(states[name], scalar) for name in 'PTxhsv'}
+        regions = [region_name(code) for code in states['region'].tolist()]
+        result['region'] = regions[0] if scalar else regions
+        return result
+
+    async def _rankine(self, request):
+        """
+        Cycle arguments as for rankine (p_low, p_high, t_high, quality, eff_turbine), numbers or lists of numbers
+        (broadcast together).  Optional "method" and "backend" as for Rankine_sweep.calc_cycles.
+        """
+        unknown = set(request) - set(CYCLE_ARGS) - {'method', 'backend'}
+        if unknown:
+            raise ValueError('unknown arguments: {}'.format(sorted(unknown)))
+        values = [request.get(name, CYCLE_DEFAULTS[name]) for name in CYCLE_ARGS]
+        scalar = all(np.ndim(v) == 0 for v in values)
+        values = [np.nan if v is None else [np.nan if x is None else x for x in v] if isinstance(v, list) else v
+                  for v in values]
+        columns = [np.ascontiguousarray(c, dtype=float).ravel()
+                   for c in np.broadcast_arrays(*[np.atleast_1d(np.asarray(v, dtype=float)) for v in values])]
+        key = (request.get('method', self.cycle_method), request.get('backend'))
+        cycles = await self._cycles.submit(key, tuple(columns))
+        return {name: _json_values(cycles[name], scalar) for name in cycles.dtype.names}
+
+
+class _UnixHTTPConnection(http.client.HTTPConnection):
+    def __init__(self, path, timeout):
+        super().__init__('localhost', timeout=timeout)
+        self._path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.settimeout(self.timeout)
+        self.sock.connect(self._path)
+
+
+class ServiceError(Exception):
+    pass
+
+
+class ServiceClient:
+    def __init__(self, host=HOST, port=PORT, path=None, timeout=30):
+        """
+        Blocking client of a SteamService (one connection, kept alive; use one client per thread).
+        :param path: Unix socket path (instead of host and port)
+        """
+        self._connection = (_UnixHTTPConnection(path, timeout) if path is not None
+                            else http.client.HTTPConnection(host, port, timeout=timeout))
+
+    def _request(self, method, url, payload=None):
+        body = None if payload is None else json.dumps(payload)
+        headers = {} if body is None else {'Content-Type': 'application/json'}
+        try:
+            self._connection.request(method, url, body, headers)
+            response = self._connection.getresponse()
+        except (ConnectionError, http.client.HTTPException):
+            self._connection.close()  # reconnect once (the server may have closed an idle connection)
+            self._connection.request(method, url, body, headers)
+            response = self._connection.getresponse()
+        data = json.loads(response.read())
+        if response.status != 200:
+            raise ServiceError('{}: {}'.format(response.status, data.get('error')))
+        return data
+
+    def state(self, case=None, a=None, b=None, method=None, backend=None, **properties):
+        """
+        Resolves one or many states, e.g. state(P=500, T=300) or state(case='Ph', a=[500, 1000], b=[2800, 3000])
+        :return: dict of P, T, x, h, s, v and region (lists if the inputs are lists; null where unresolved)
+        """
+        payload = dict(properties)
+        if case is not None:
+            payload.update(case=case, a=a, b=b)
+        if method is not None:
+            payload['method'] = method
+        if backend is not None:
+            payload['backend'] = backend
+        return self._request('POST', '/state', payload)
+
+    def rankine(self, **kwargs):
+        """
+        Evaluates one or many cycles, e.g. rankine(p_low=8, p_high=[5000, 8000], t_high=500)
+        :return: dict of the Rankine_sweep.CYCLE_DTYPE fields (lists if any argument is a list)
+        """
+        return self._request('POST', '/rankine', kwargs)
+
+    def metrics(self):
+        return self._request('GET', '/metrics')
+
+    def health(self):
+        return self._request('GET', '/health')
+
+    def close(self):
+        self._connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serves steam states and Rankine cycles over local HTTP.')
+    parser.add_argument('--host', default=HOST, help='TCP host')
+    parser.add_argument('--port', type=int, default=PORT, help='TCP port')
+    parser.add_argument('--unix', help='serve on this Unix socket instead of TCP')
+    parser.add_argument('--window', type=float, default=WINDOW, help='seconds a request waits for its batch')
+    parser.add_argument('--max-batch', type=int, default=MAX_BATCH, help='rows at which a batch runs at once')
+    args = parser.parse_args(argv)
+
+    async def serve():
+        service = SteamService(args.window, args.max_batch)
+        address = await service.start(args.host, args.port, args.unix)
+        print('serving on {}'.format(address), file=sys.stderr)
+        try:
+            await service.serve_forever()
+        finally:
+            await service.close()
+
+    try:
+        asyncio.run(serve())
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
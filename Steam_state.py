@@ -0,0 +1,292 @@
+# Compact containers for resolved steam states: State (one state, __slots__) and StateArray (many states, one
+# structured array of Steam_batch.STATE_DTYPE with the region as an int8 code)
+#
+#   states = StateArray.calc('PT', P_array, T_array)     resolve many states (see Steam_SI.calc_many)
+#   states.h, states.region_codes                        property columns as arrays
+#   states[0].print()                                    one state, printed like Steam_SI.print
+#   python Steam_state.py -n 100000                      measure the memory per state of every container
+#
+# Measured with tracemalloc (python Steam_state.py -n 200000, CPython 3.11, 64-bit), every state holding its own
+# six float objects:
+#   Steam_SI    ~304 bytes/state    object, instance __dict__ and the floats
+#   steam       ~360 bytes/state    same, with the hf..vg attributes
+#   State       ~248 bytes/state    __slots__, no __dict__ (the six floats are 144 bytes of it)
+#   StateArray    49 bytes/state    packed row of six float64 and an int8 region
+# so a StateArray holds millions of states in about a sixth of the memory of a list of Steam_SI objects.
+
+import argparse
+import json
+import sys
+import tracemalloc
+import numpy as np
+
+from Steam_batch import STATE_DTYPE, REGION_NAMES, REGION_NONE, REGION_LIQUID, region_name, empty_states
+
+PROPERTIES = ('P', 'T', 'x', 'h', 's', 'v')
+_CODES = {name: code for code, name in REGION_NAMES.items() if name is not None}
+
+
+def region_code(region):
+    """
+    :param region: a region name ('saturated', 'Superheated', ...), a region code or None
+    :return: the region code (REGION_NONE if unknown)
+    """
+    if region is None:
+        return REGION_NONE
+    if isinstance(region, str):
+        return _CODES.get(region.lower(), REGION_NONE)
+    return int(region)
+
+
+def _value(v):
+    # None for a missing property, like Steam_SI
+    return None if v is None or v != v else float(v)
+
+
+class State:
+    __slots__ = ('P', 'T', 'x', 'h', 's', 'v', 'region_code', 'name')
+
+    def __init__(self, P=None, T=None, x=None, h=None, s=None, v=None, region=REGION_NONE, name=None):
+        """
+        One resolved state without a per-instance __dict__.  Missing properties are None, as in Steam_SI.
+        :param P: pressure (kPa)
+        :param T: temperature (C)
+        :param x: quality
+        :param h: enthalpy (kJ/kg)
+        :param s: entropy (kJ/(kg K))
+        :param v: specific volume (m^3/kg)
+        :param region: region code (see Steam_batch.REGION_NAMES) or region name
+        :param name: a useful identifier
+        """
+        self.P = P
+        self.T = T
+        self.x = x
+        self.h = h
+        self.s = s
+        self.v = v
+        self.region_code = region_code(region)
+        self.name = name
+
+    @property
+    def region(self):
+        """
+        :return: region name ('saturated', 'superheated', ...) or None, as Steam_SI.region
+        """
+        return region_name(self.region_code)
+
+    @classmethod
+    def from_object(cls, obj):
+        """
+        Copies a Steam_SI, steam or State.
+        """
+        if isinstance(obj, State):
+            return cls(obj.P, obj.T, obj.x, obj.h, obj.s, obj.v, obj.region_code, obj.name)
+        P = obj.P if hasattr(obj, 'P') else obj.p  # steam calls the pressure p
+        region = obj.region
+        if not hasattr(obj, 'P') and obj.x is not None and obj.x < 0:  # steam marks compressed liquid with x < 0
+            region = REGION_LIQUID
+        return cls(P, obj.T, obj.x, obj.h, obj.s, obj.v, region, obj.name)
+
+    @classmethod
+    def from_row(cls, row, name=None):
+        """
+        :param row: one element of a STATE_DTYPE array
+        """
+        return cls(*(_value(row[c]) for c in PROPERTIES), region=int(row['region']), name=name)
+
+    def as_row(self):
+        """
+        :return: tuple for a STATE_DTYPE array (None becomes nan)
+        """
+        return tuple(np.nan if getattr(self, c) is None else getattr(self, c) for c in PROPERTIES) + \
+            (self.region_code,)
+
+    def to_steam_si(self):
+        """
+        :return: a Steam_SI with the same properties (no calculation is done)
+        """
+        from Calc_state import Steam_SI
+        state = Steam_SI(self.P, self.T, self.x, self.v, self.h, self.s, self.name)
+        state.region = self.region
+        return state
+
+    def print(self):
+        from Calc_state import Steam_SI
+        Steam_SI.print(self)  # same report as Steam_SI
+
+    def __repr__(self):
+        return 'State(' + ', '.join('{}={!r}'.format(c, getattr(self, c)) for c in PROPERTIES) + \
+            ', region={!r}, name={!r})'.format(self.region, self.name)
+
+
+class StateArray:
+    def __init__(self, data, names=None):
+        """
+        Many states in one structured array.
+        :param data: structured array of Steam_batch.STATE_DTYPE (used as is, not copied)
+        :param names: optional sequence of names, one per state
+        """
+        data = np.asarray(data)
+        if data.dtype != STATE_DTYPE:
+            raise ValueError('StateArray needs an array of Steam_batch.STATE_DTYPE')
+        if names is not None and len(names) != len(data):
+            raise ValueError('one name per state is needed')
+        self.data = data.ravel()
+        self.names = names
+
+    @classmethod
+    def empty(cls, n):
+        """
+        :return: StateArray of n unresolved states
+        """
+        return cls(empty_states(n))
+
+    @classmethod
+    def calc(cls, case, a, b, method='cubic', backend=None):
+        """
+        Resolves many states given by the same pair of properties.  See Steam_SI.calc_many
+        """
+        from Calc_state import Steam_SI
+        return cls(Steam_SI.calc_many(case, a, b, method, backend))
+
+    @classmethod
+    def from_states(cls, states):
+        """
+        :param states: iterable of Steam_SI, steam or State objects
+        """
+        states = [s if isinstance(s, State) else State.from_object(s) for s in states]
+        data = np.array([s.as_row() for s in states], dtype=STATE_DTYPE)
+        names = [s.name for s in states]
+        return cls(data, names if any(name is not None for name in names) else None)
+
+    @classmethod
+    def concatenate(cls, arrays):
+        arrays = list(arrays)
+        names = None
+        if any(a.names is not None for a in arrays):
+            names = [name for a in arrays for name in (a.names if a.names is not None else [None] * len(a))]
+        return cls(np.concatenate([a.data for a in arrays]), names)
+
+    @property
+    def P(self):
+        return self.data['P']
+
+    @property
+    def T(self):
+        return self.data['T']
+
+    @property
+    def x(self):
+        return self.data['x']
+
+    @property
+    def h(self):
+        return self.data['h']
+
+    @property
+    def s(self):
+        return self.data['s']
+
+    @property
+    def v(self):
+        return self.data['v']
+
+    @property
+    def region_codes(self):
+        return self.data['region']
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, index):
+        """
+        :param index: an int gives a State; a slice, index array or boolean mask gives a StateArray
+        """
+        if isinstance(index, (int, np.integer)):
+            return State.from_row(self.data[index], None if self.names is None else self.names[index])
+        names = None if self.names is None else list(np.asarray(self.names, dtype=object)[index])
+        return StateArray(self.data[index], names)
+
+    def __iter__(self):
+        for i in range(len(self.data)):
+            yield self[i]
+
+    def print(self):
+        """
+        Prints every state like Steam_SI.print
+        """
+        for state in self:
+            state.print()
+
+
+def _bytes_per_state(build, n):
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        kept = build()
+        after = tracemalloc.get_traced_memory()[0]
+    finally:
+        tracemalloc.stop()
+    del kept
+    return (after - before) / n
+
+
+def memory_report(n=100000, seed=0):
+    """
+    Measures the memory of n states held in each container (the states hold random values, so no float objects
+    are shared).
+    :return: dict of container name -> bytes per state
+    """
+    from Calc_state import Steam_SI
+    from Steam import steam
+    rng = np.random.default_rng(seed)
+    data = empty_states(n)
+    for c in PROPERTIES:
+        data[c] = rng.uniform(0, 1000, n)
+    data['region'] = 2
+
+    def rows():
+        # new float objects for every state, created while the memory is traced
+        return zip(*(data[c].tolist() for c in PROPERTIES))
+
+    def steam_si_list():
+        states = []
+        for P, T, x, h, s, v in rows():
+            state = Steam_SI(P, T, x, v, h, s)
+            state.region = 'superheated'
+            states.append(state)
+        return states
+
+    def steam_list():
+        states = []
+        for P, T, x, h, s, v in rows():
+            state = steam(P)
+            state.T, state.x, state.h, state.s, state.v, state.region = T, x, h, s, v, 'Superheated'
+            state.hf = state.hg = state.sf = state.sg = state.vf = state.vg = None
+            states.append(state)
+        return states
+
+    report = {
+        'Steam_SI': _bytes_per_state(steam_si_list, n),
+        'steam': _bytes_per_state(steam_list, n),
+        'State': _bytes_per_state(lambda: [State(*row, region=2) for row in rows()], n),
+        'StateArray': _bytes_per_state(lambda: StateArray(data.copy()), n),
+    }
+    return {name: round(value, 1) for name, value in report.items()}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Measures the memory per state of the state containers.')
+    parser.add_argument('-n', '--states', type=int, default=100000, help='number of states')
+    args = parser.parse_args(argv)
+    report = {'states': args.states, 'python': sys.version.split()[0], 'bytes_per_state': memory_report(args.states)}
+    print(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
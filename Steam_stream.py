@@ -0,0 +1,349 @@
+# Streams large CSV or Parquet files of measured states through the vectorized engine and writes them back enriched
+#
+#   python Steam_stream.py plant.csv states.csv --case PT --columns PT101 TT101
+#   python Steam_stream.py plant.parquet states.parquet --case Ph --chunksize 200000 --backend if97
+#   python Steam_stream.py - - --case Px < plant.csv > states.csv        (CSV on stdin/stdout)
+#
+# The file is read in chunks of rows.  Reading, resolving and writing run in their own threads connected by bounded
+# queues, so they overlap and at most a few chunks are held in memory whatever the size of the file.  Every output
+# row is the input row followed by steam_P, steam_T, steam_x, steam_h, steam_s, steam_v and steam_region (units as
+# in Steam_SI: kPa, C, kJ/kg, kJ/(kg K), m^3/kg).  Rows that cannot be resolved get empty (null) properties.
+# Parquet needs pyarrow.
+
+import argparse
+import csv
+import itertools
+import json
+import queue
+import sys
+import threading
+import time
+import numpy as np
+
+from Calc_state import Steam_SI
+from Steam_batch import normalize_case, REGION_NAMES, REGION_NONE
+
+CHUNKSIZE = 100000  # rows per chunk
+QUEUE_DEPTH = 2  # chunks waiting between two stages
+OUTPUT_FIELDS = ('P', 'T', 'x', 'h', 's', 'v', 'region')
+PREFIX = 'steam_'  # prefix of the added column names, so they do not clash with the input columns
+PARQUET_EXTENSIONS = ('.parquet', '.pq')
+
+
+def is_parquet(path):
+    return path.lower().endswith(PARQUET_EXTENSIONS)
+
+
+def _floats(values):
+    """
+    :param values: sequence of strings (or numbers); empty or invalid entries become nan
+    :return: float array
+    """
+    try:
+        return np.asarray(values, dtype=float)
+    except ValueError:
+        out = np.full(len(values), np.nan)
+        for i, value in enumerate(values):
+            try:
+                out[i] = float(value)
+            except (TypeError, ValueError):
+                pass
+        return out
+
+
+class CsvSource:
+    def __init__(self, path, chunksize=CHUNKSIZE):
+        """
+        Reads a CSV file with a header row in chunks.
+        :param path: file name, or '-' for stdin
+        :param chunksize: rows per chunk
+        """
+        self._file = sys.stdin if path == '-' else open(path, newline='')
+        self._reader = csv.reader(self._file)
+        self.columns = next(self._reader, [])
+        self.chunksize = chunksize
+
+    def chunks(self):
+        """
+        :return: iterator of chunks (lists of rows, each a list of strings)
+        """
+        while True:
+            rows = list(itertools.islice(self._reader, self.chunksize))
+            if not rows:
+                return
+            yield rows
+
+    def values(self, chunk, column):
+        i = self.columns.index(column)
+        return _floats([row[i] if i < len(row) else '' for row in chunk])
+
+    def close(self):
+        if self._file is not sys.stdin:
+            self._file.close()
+
+
+class CsvSink:
+    def __init__(self, path, columns):
+        """
+        Writes the enriched rows of a CsvSource.
+        :param path: file name, or '-' for stdout
+        :param columns: header of the output
+        """
+        self._file = sys.stdout if path == '-' else open(path, 'w', newline='')
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(columns)
+
+    def write(self, chunk, states):
+        properties = [[repr(value) if value == value else '' for value in states[name].tolist()]  # '' for nan
+                      for name in OUTPUT_FIELDS[:-1]]
+        regions = [REGION_NAMES.get(code) or '' for code in states['region'].tolist()]
+        self._writer.writerows(row + list(values) for row, values in zip(chunk, zip(*properties, regions)))
+
+    def close(self):
+        if self._file is sys.stdout:
+            self._file.flush()
+        else:
+            self._file.close()
+
+
+class ParquetSource:
+    def __init__(self, path, chunksize=CHUNKSIZE):
+        """
+        Reads a Parquet file in record batches.
+        :param path: file name
+        :param chunksize: rows per batch
+        """
+        import pyarrow.parquet as pq  # optional dependency, only needed for Parquet files
+        self._file = pq.ParquetFile(path)
+        self.schema = self._file.schema_arrow
+        self.columns = self.schema.names
+        self.chunksize = chunksize
+
+    def chunks(self):
+        """
+        :return: iterator of pyarrow.RecordBatch
+        """
+        return self._file.iter_batches(batch_size=self.chunksize)
+
+    def values(self, chunk, column):
+        import pyarrow.compute as pc
+        values = pc.cast(chunk.column(column), 'float64')
+        return values.to_numpy(zero_copy_only=False)  # nulls become nan
+
+    def close(self):
+        self._file.close()
+
+
+class ParquetSink:
+    def __init__(self, path, source, prefix=PREFIX):
+        """
+        Writes the enriched batches of a ParquetSource.
+        :param path: file name
+        :param source: the ParquetSource (for the input schema)
+        :param prefix: prefix of the added column names
+        """
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        self._pa = pa
+        fields = [pa.field(prefix + name, pa.float64()) for name in OUTPUT_FIELDS[:-1]]
+        fields.append(pa.field(prefix + 'region', pa.string()))
+        self.schema = pa.schema(list(source.schema) + fields)
+        self._writer = pq.ParquetWriter(path, self.schema)
+
+    def write(self, chunk, states):
+        pa = self._pa
+        columns = list(chunk.columns)
+        for name in OUTPUT_FIELDS[:-1]:
+            values = states[name]
+            columns.append(pa.array(values, mask=np.isnan(values)))
+        columns.append(pa.array([REGION_NAMES.get(code) for code in states['region'].tolist()], pa.string()))
+        self._writer.write_batch(pa.RecordBatch.from_arrays(columns, schema=self.schema))
+
+    def close(self):
+        self._writer.close()
+
+
+def open_source(path, chunksize=CHUNKSIZE):
+    """
+    :return: a ParquetSource for .parquet/.pq files, otherwise a CsvSource
+    """
+    return ParquetSource(path, chunksize) if is_parquet(path) else CsvSource(path, chunksize)
+
+
+def open_sink(path, source, prefix=PREFIX):
+    """
+    :param source: the source whose chunks will be written (Parquet output needs a Parquet input)
+    :param prefix: prefix of the added column names
+    """
+    names = [prefix + name for name in OUTPUT_FIELDS]
+    clash = set(names) & set(source.columns)
+    if clash:
+        raise ValueError('the input already has columns {}; choose a prefix for the output columns'
+                         .format(sorted(clash)))
+    if is_parquet(path):
+        if not isinstance(source, ParquetSource):
+            raise ValueError('Parquet output needs a Parquet input')
+        return ParquetSink(path, source, prefix)
+    if isinstance(source, ParquetSource):
+        raise ValueError('CSV output needs a CSV input')
+    return CsvSink(path, list(source.columns) + names)
+
+
+class _Stop(Exception):
+    pass
+
+
+def _put(q, item, stop):
+    # a blocking put that gives up once another stage has failed
+    while True:
+        if stop.is_set():
+            raise _Stop()
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            pass
+
+
+def _get(q, stop):
+    while True:
+        if stop.is_set():
+            raise _Stop()
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            pass
+
+
+_DONE = object()
+
+
+def run(src, dst, case, columns=None, chunksize=CHUNKSIZE, method='cubic', backend=None, executor=None, prefix=PREFIX,
+        depth=QUEUE_DEPTH, progress=None):
+    """
+    Resolves every row of a CSV or Parquet file and writes the rows with their properties to another file.
+    :param src: input file ('-' for CSV on stdin)
+    :param dst: output file ('-' for CSV on stdout); Parquet in, Parquet out and CSV in, CSV out
+    :param case: the pair of given properties, one of the 15 cases of Steam_SI.calc (e.g., 'PT' or 'Ph')
+    :param columns: the two input columns holding the properties of case (default: the letters of case)
+    :param chunksize: rows per chunk
+    :param method: interpolation on the superheated table (see Steam_SI.calc_many)
+    :param backend: None for the steam tables, or the name of a property backend (see Steam_backends.py)
+    :param executor: optional Steam_parallel.ParallelExecutor to resolve each chunk across processes
+    :param prefix: prefix of the added column names
+    :param depth: chunks allowed to wait between two stages
+    :param progress: optional function(rows so far) called after every chunk is written
+    :return: dict of rows, chunks, unresolved, seconds and rows_per_sec
+    """
+    normalize_case(case)
+    columns = list(columns or case)
+    if len(columns) != 2:
+        raise ValueError('two input columns are needed')
+    start = time.perf_counter()
+    source = open_source(src, chunksize)
+    try:
+        missing = [c for c in columns if c not in source.columns]
+        if missing:
+            raise ValueError('columns not in the input: {}'.format(missing))
+        sink = open_sink(dst, source, prefix)
+    except BaseException:
+        source.close()
+        raise
+
+    read_q = queue.Queue(maxsize=depth)
+    write_q = queue.Queue(maxsize=depth)
+    stop = threading.Event()
+    errors = []
+    totals = {'rows': 0, 'chunks': 0, 'unresolved': 0}
+
+    def stage(work):
+        def target():
+            try:
+                work()
+            except _Stop:
+                pass
+            except BaseException as e:
+                errors.append(e)
+                stop.set()
+        return threading.Thread(target=target, daemon=True)
+
+    def read():
+        for chunk in source.chunks():
+            _put(read_q, chunk, stop)
+        _put(read_q, _DONE, stop)
+
+    def resolve():
+        while True:
+            chunk = _get(read_q, stop)
+            if chunk is _DONE:
+                _put(write_q, _DONE, stop)
+                return
+            a, b = source.values(chunk, columns[0]), source.values(chunk, columns[1])
+            if executor is not None:
+                states = executor.calc_states(case, a, b, method=method, backend=backend)
+            else:
+                states = Steam_SI.calc_many(case, a, b, method=method, backend=backend)
+            _put(write_q, (chunk, states), stop)
+
+    def write():
+        while True:
+            item = _get(write_q, stop)
+            if item is _DONE:
+                return
+            chunk, states = item
+            sink.write(chunk, states)
+            totals['rows'] += len(states)
+            totals['chunks'] += 1
+            totals['unresolved'] += int(np.count_nonzero(states['region'] == REGION_NONE))
+            if progress is not None:
+                progress(totals['rows'])
+
+    threads = [stage(read), stage(resolve), stage(write)]
+    try:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    finally:
+        stop.set()  # stops the other stages if the caller is interrupted
+        source.close()
+        sink.close()
+    if errors:
+        raise errors[0]
+    seconds = time.perf_counter() - start
+    totals['seconds'] = seconds
+    totals['rows_per_sec'] = totals['rows'] / seconds if seconds > 0 else None
+    return totals
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Resolves the steam states in a CSV or Parquet file, in chunks.')
+    parser.add_argument('input', help="CSV or Parquet (.parquet/.pq) file, '-' for CSV on stdin")
+    parser.add_argument('output', help="output file of the same format, '-' for CSV on stdout")
+    parser.add_argument('--case', required=True, help='the pair of given properties, e.g. PT, Ph or Px')
+    parser.add_argument('--columns', nargs=2, metavar=('FIRST', 'SECOND'),
+                        help='input columns of the two properties (default: the letters of the case)')
+    parser.add_argument('--chunksize', type=int, default=CHUNKSIZE, help='rows per chunk')
+    parser.add_argument('--method', default='cubic', help='superheated interpolation: cubic, linear, fast, fast_linear')
+    parser.add_argument('--backend', help='property backend (see Steam_backends.py), default: the steam tables')
+    parser.add_argument('--workers', type=int, help='resolve every chunk across this many processes')
+    parser.add_argument('--prefix', default=PREFIX, help='prefix of the added column names')
+    args = parser.parse_args(argv)
+
+    try:
+        if args.workers:
+            from Steam_parallel import ParallelExecutor
+            with ParallelExecutor(args.workers, chunk_size=max(1, args.chunksize // args.workers)) as executor:
+                totals = run(args.input, args.output, args.case, args.columns, args.chunksize, args.method,
+                             args.backend, executor, args.prefix)
+        else:
+            totals = run(args.input, args.output, args.case, args.columns, args.chunksize, args.method,
+                         args.backend, prefix=args.prefix)
+    except ValueError as e:
+        parser.error(str(e))
+    print(json.dumps(totals), file=sys.stderr)  # stdout may be the data
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,132 @@
+# Superheated-region property engine: one cached Delaunay triangulation per input pair
+
+import threading
+import numpy as np
+
+import Steam_profile
+import Steam_tables
+
+# column order of the vectors returned by superheated_props
+OUTPUT_COLUMNS = ('P', 'T', 'h', 's', 'v')
+
+# the coordinates each input pair is triangulated in (same orientation as the original griddata calls)
+PAIRS = {
+    'PT': ('T', 'P'),
+    'Ph': ('h', 'P'),
+    'Ps': ('s', 'P'),
+    'Pv': ('v', 'P'),
+    'Th': ('h', 'T'),
+    'Ts': ('s', 'T'),
+    'Tv': ('v', 'T'),
+    'vh': ('v', 'h'),
+    'vs': ('v', 's'),
+    'hs': ('h', 's'),
+}
+
+
+class SuperheatedEngine:
+    def __init__(self, table):
+        """
+        Interpolates superheated_water_table.txt.  The triangulation for an input pair is built the first time
+        that pair is used and then reused for every output property and every later call.
+        :param table: a SuperheatedTable from Steam_tables
+        """
+        self.columns = {'P': table.p, 'T': table.t, 'h': table.h, 's': table.s, 'v': table.v}
+        self.outputs = np.column_stack([self.columns[c] for c in OUTPUT_COLUMNS])  # all outputs interpolated together
+        self._triangulations = {}
+        self._interpolators = {}
+        self._lock = threading.Lock()
+
+    def triangulation(self, pair):
+        """
+        Returns the (cached) Delaunay triangulation of the table in the coordinates of an input pair.
+        :param pair: one of the keys of PAIRS, e.g. 'Ph'
+        :return: scipy.spatial.Delaunay
+        """
+        tri = self._triangulations.get(pair)
+        if tri is None:
+            if pair not in PAIRS:
+                raise ValueError('unsupported superheated input pair: {}'.format(pair))
+            with self._lock:
+                tri = self._triangulations.get(pair)
+                if tri is None:
+                    from scipy.spatial import Delaunay  # scipy is only imported once a triangulation is needed
+                    with Steam_profile.phase('triangulation build'):
+                        tri = Delaunay(np.column_stack([self.columns[c] for c in PAIRS[pair]]))
+                    self._triangulations[pair] = tri
+        return tri
+
+    def interpolator(self, pair, method='cubic'):
+        """
+        Returns the (cached) interpolator of all output columns for an input pair.
+        :param pair: one of the keys of PAIRS
+        :param method: 'cubic' (Clough-Tocher, what griddata(method='cubic') uses) or 'linear'
+        :return: a callable taking an (n, 2) array of points
+        """
+        key = (pair, method)
+        interp = self._interpolators.get(key)
+        if interp is None:
+            tri = self.triangulation(pair)
+            from scipy.interpolate import CloughTocher2DInterpolator, LinearNDInterpolator
+            if method == 'cubic':
+                interp = CloughTocher2DInterpolator(tri, self.outputs)
+            elif method == 'linear':
+                interp = LinearNDInterpolator(tri, self.outputs)
+            else:
+                raise ValueError('unsupported interpolation method: {}'.format(method))
+            self._interpolators[key] = interp
+        return interp
+
+    def lookup(self, pair, a, b, method='cubic'):
+        """
+        Interpolates every property from a pair of known properties.
+        :param pair: one of the keys of PAIRS, e.g. 'Ph'
+        :param a: value(s) of the first property of the pair (P in kPa, T in C)
+        :param b: value(s) of the second property of the pair
+        :param method: 'cubic' or 'linear'
+        :return: array with last axis [P, T, h, s, v]; nan outside the table
+        """
+        values = {pair[0]: np.asarray(a, dtype=float), pair[1]: np.asarray(b, dtype=float)}
+        first, second = np.broadcast_arrays(*[values[c] for c in PAIRS[pair]])
+        points = np.column_stack((first.ravel(), second.ravel()))
+        result = self.interpolator(pair, method)(points)
+        return result.reshape(first.shape + (len(OUTPUT_COLUMNS),))
+
+
+_lock = threading.Lock()
+_engine = None
+
+
+def superheated_engine():
+    """
+    Returns the shared SuperheatedEngine, creating it on first use.
+    :return: SuperheatedEngine
+    """
+    global _engine
+    if _engine is None:
+        with _lock:
+            if _engine is None:
+                _engine = SuperheatedEngine(Steam_tables.superheated_table())
+    return _engine
+
+
+@Steam_tables.on_reload
+def _discard_engine():
+    global _engine
+    _engine = None
+
+
+@Steam_profile.timed('superheated interpolation')
+def superheated_props(pair, a, b, method='cubic'):
+    """
+    Superheated properties from a pair of known properties.  See SuperheatedEngine.lookup
+    :param method: 'cubic', 'linear', or 'fast' (bicubic) / 'fast_linear' (bilinear) for the precomputed grids in
+                   Steam_fastgrid.py.  The grids cover PT, Ph and Ps; the other pairs fall back to 'cubic'/'linear'.
+    :return: array with last axis [P, T, h, s, v]
+    """
+    if method in ('fast', 'fast_linear'):
+        from Steam_fastgrid import fast_grid, GRIDS  # imported here because Steam_fastgrid imports this module
+        if pair in GRIDS:
+            return fast_grid().lookup(pair, a, b, bicubic=method == 'fast')
+        method = 'cubic' if method == 'fast' else 'linear'
+    return superheated_engine().lookup(pair, a, b, method)
@@ -0,0 +1,164 @@
+# Shared, read-only store for the steam table data used by Calc_state, Steam and Rankine
+
+import os
+import threading
+import numpy as np
+
+import Steam_profile
+
+TABLE_DIR = os.path.dirname(os.path.abspath(__file__))
+SAT_TABLE_FILE = os.path.join(TABLE_DIR, 'sat_water_table.txt')
+SUPERHEATED_TABLE_FILE = os.path.join(TABLE_DIR, 'superheated_water_table.txt')
+
+R = 8.314  # kJ/kmol*K
+MW = 18.0  # kg/kmol
+RW = R / MW  # kJ/kg*K
+
+
+def _read_only(col):
+    """
+    Returns a contiguous float copy of a table column that cannot be written to.
+    :param col: a column from np.loadtxt
+    :return: a read-only numpy array
+    """
+    col = np.ascontiguousarray(col, dtype=float)
+    col.setflags(write=False)
+    return col
+
+
+class SatTable:
+    def __init__(self, ts, ps, hf, hg, sf, sg, vf, vg):
+        """
+        The columns of sat_water_table.txt.  Every column is a read-only numpy array.
+        :param ts: saturation temperature (C)
+        :param ps: saturation pressure (bar)
+        :param hf: enthalpy of saturated liquid (kJ/kg)
+        :param hg: enthalpy of saturated vapor (kJ/kg)
+        :param sf: entropy of saturated liquid (kJ/(kg*K))
+        :param sg: entropy of saturated vapor (kJ/(kg*K))
+        :param vf: specific volume of saturated liquid (m^3/kg)
+        :param vg: specific volume of saturated vapor (m^3/kg)
+        """
+        self.ts = _read_only(ts)
+        self.ps = _read_only(ps)
+        self.hf = _read_only(hf)
+        self.hg = _read_only(hg)
+        self.sf = _read_only(sf)
+        self.sg = _read_only(sg)
+        self.vf = _read_only(vf)
+        self.vg = _read_only(vg)
+
+
+class SuperheatedTable:
+    def __init__(self, t, h, s, p):
+        """
+        The columns of superheated_water_table.txt plus a specific volume column estimated with the ideal gas law
+        v=(R/MW)*(T+273)/P.  Every column is a read-only numpy array.
+        :param t: temperature (C)
+        :param h: enthalpy (kJ/kg)
+        :param s: entropy (kJ/(kg*K))
+        :param p: pressure (kPa)
+        """
+        self.t = _read_only(t)
+        self.h = _read_only(h)
+        self.s = _read_only(s)
+        self.p = _read_only(p)
+        self.v = _read_only(RW * (self.t + 273) / self.p)
+
+
+_lock = threading.RLock()
+_sat = None
+_superheated = None
+_version = 0
+_reload_callbacks = []
+
+
+def read_sat_table(path=SAT_TABLE_FILE):
+    """
+    Parses a saturated water table text file.
+    :return: a SatTable
+    """
+    return SatTable(*np.loadtxt(path, skiprows=1, unpack=True))
+
+
+def read_superheated_table(path=SUPERHEATED_TABLE_FILE):
+    """
+    Parses a superheated water table text file.
+    :return: a SuperheatedTable
+    """
+    return SuperheatedTable(*np.loadtxt(path, skiprows=1, unpack=True))
+
+
+def _compiled_tables():
+    import Steam_compiled  # imported here because Steam_compiled imports this module
+    return Steam_compiled.compiled_tables()
+
+
+def sat_table():
+    """
+    Returns the saturated water table, from the compiled table file if there is a current one (see
+    Steam_compiled.py), otherwise by reading sat_water_table.txt.  Either happens on first use only.
+    :return: a SatTable
+    """
+    global _sat
+    if _sat is None:
+        with _lock:
+            if _sat is None:
+                with Steam_profile.phase('table load'):
+                    compiled = _compiled_tables()
+                    _sat = compiled.sat_table() if compiled is not None else read_sat_table()
+    return _sat
+
+
+def superheated_table():
+    """
+    Returns the superheated water table, from the compiled table file if there is a current one (see
+    Steam_compiled.py), otherwise by reading superheated_water_table.txt.  Either happens on first use only.
+    :return: a SuperheatedTable
+    """
+    global _superheated
+    if _superheated is None:
+        with _lock:
+            if _superheated is None:
+                with Steam_profile.phase('table load'):
+                    compiled = _compiled_tables()
+                    _superheated = (compiled.superheated_table() if compiled is not None
+                                    else read_superheated_table())
+    return _superheated
+
+
+def table_version():
+    """
+    A counter that changes every time the tables are reloaded.  Anything derived from the tables can
+    compare versions to find out if it is stale.
+    :return: int
+    """
+    return _version
+
+
+def on_reload(callback):
+    """
+    Registers a function (taking no arguments) to be called after reload_tables() so that anything
+    built from the table data can be thrown away.
+    :param callback: a callable
+    :return: the callback, so this can be used as a decorator
+    """
+    with _lock:
+        _reload_callbacks.append(callback)
+    return callback
+
+
+def reload_tables():
+    """
+    Discards the loaded tables (e.g., after the table files change).  They are read again on next use.
+    :return: the new table version
+    """
+    global _sat, _superheated, _version
+    with _lock:
+        _sat = None
+        _superheated = None
+        _version += 1
+        callbacks = list(_reload_callbacks)
+    for callback in callbacks:
+        callback()
+    return _version
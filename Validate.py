@@ -0,0 +1,231 @@
+# Accuracy against XSteam (IAPWS-IF97) next to the speed of every calculation mode, reported as JSON
+#
+#   python Validate.py                                   every mode, 2000 sample states
+#   python Validate.py --modes table table_fast --table  only two modes, as a readable table
+#   python Validate.py --budget h=0.5 s=0.001 v=1e-3     also name the fastest mode within these maximum errors
+#
+# Reference states are sampled across the subcritical domain: two-phase states from (P, x) and superheated states
+# from (P, T) inside the superheated table.  For every input pair each mode is given the reference values of the
+# pair and its other properties are compared with the reference, per property and region.
+
+import argparse
+import datetime
+import json
+import sys
+import time
+import numpy as np
+
+from Calc_state import Steam_SI
+from Steam import steam
+from Steam_backends import get_backend
+from Steam_batch import CASES, REGION_SATURATED, REGION_SUPERHEATED, region_name
+from Steam_cache import state_cache
+
+# modes: the scalar classes, and every registered backend through the batch interface (Steam_SI.calc_many)
+SCALAR_MODES = ('Steam_SI', 'steam')
+BATCH_MODES = ('table', 'table_linear', 'table_fast', 'if97')
+STEAM_CASES = ('PT', 'Px', 'Ph', 'Ps')  # the pairs the steam class takes (pressure and one other property)
+PROPERTIES = 'PTxhsv'
+# h and s at a fixed quality are not monotone along the saturation curve, so a two-phase state is not always the
+# only one with its x and h (or x and s); every mode returns the lowest pressure.  These cases are reported on their
+# own but left out of the totals of a mode.
+AMBIGUOUS_CASES = ('xh', 'xs')
+P_RANGE = (6.0, 21000.0)  # kPa, inside the superheated table and below the critical point
+T_MAX = 800.0  # C, top of the sampled superheated states
+
+
+def reference_states(n=2000, seed=0):
+    """
+    Samples two-phase and superheated states and resolves them with XSteam.
+    :param n: number of states (half two-phase, half superheated)
+    :param seed: random seed
+    :return: structured array of Steam_batch.STATE_DTYPE
+    """
+    rng = np.random.default_rng(seed)
+    xsteam = get_backend('xsteam')
+    n_sat = n // 2
+    P = np.exp(rng.uniform(*np.log(P_RANGE), size=n))
+    saturated = xsteam.calc_states('Px', P[:n_sat], rng.uniform(0, 1, n_sat))
+    tsat = xsteam.sat_props_P(P[n_sat:])[:, 0]
+    superheated = xsteam.calc_states('PT', P[n_sat:], rng.uniform(tsat + 1, T_MAX))
+    states = np.concatenate((saturated, superheated))
+    return states[states['region'] != 0]
+
+
+def case_rows(case, states):
+    """
+    The reference states used for a case: the quality only identifies two-phase states and T is indeterminate
+    for them, so the x cases use the two-phase states, PT the superheated states and the others all of them.
+    :return: boolean mask
+    """
+    if 'x' in case:
+        return states['region'] == REGION_SATURATED
+    if case == 'PT':
+        return states['region'] == REGION_SUPERHEATED
+    return np.ones(len(states), bool)
+
+
+def _run_scalar(mode, case, a, b):
+    """
+    Resolves the states one at a time with Steam_SI or steam.
+    :return: (n, 6) array of P, T, x, h, s, v (nan where nothing was calculated)
+    """
+    out = np.full((len(a), len(PROPERTIES)), np.nan)
+    for i, (va, vb) in enumerate(zip(a.tolist(), b.tolist())):
+        if mode == 'Steam_SI':
+            state = Steam_SI(**{case[0]: va, case[1]: vb})
+            state.calc()
+            values = [state.P, state.T, state.x, state.h, state.s, state.v]
+        else:
+            state = steam(va, **{case[1]: vb})
+            values = [state.p, state.T, state.x, state.h, state.s, state.v]
+        out[i] = [np.nan if value is None else value for value in values]
+    return out
+
+
+def run_mode(mode, case, a, b):
+    """
+    Resolves one case with a mode.
+    :return: ((n, 6) array of P, T, x, h, s, v, seconds taken)
+    """
+    start = time.perf_counter()
+    if mode in SCALAR_MODES:
+        result = _run_scalar(mode, case, a, b)
+    else:
+        states = Steam_SI.calc_many(case, a, b, backend=mode)
+        result = np.column_stack([states[c] for c in PROPERTIES])
+    return result, time.perf_counter() - start
+
+
+def error_stats(values, expected):
+    """
+    :return: dict of max and mean absolute error, max relative error and the number of compared values
+    """
+    ok = ~np.isnan(values) & ~np.isnan(expected)
+    if not ok.any():
+        return {'max': None, 'mean': None, 'max_rel': None, 'count': 0}
+    err = np.abs(values[ok] - expected[ok])
+    rel = err / np.maximum(np.abs(expected[ok]), 1e-12)
+    return {'max': float(err.max()), 'mean': float(err.mean()), 'max_rel': float(rel.max()), 'count': int(ok.sum())}
+
+
+def validate(modes=SCALAR_MODES + BATCH_MODES, n=2000, seed=0):
+    """
+    Compares every mode with XSteam for every input pair.
+    :param modes: names from SCALAR_MODES and/or registered backends (see Steam_backends.py)
+    :param n: number of reference states
+    :param seed: random seed of the sample
+    :return: report dict.  report['modes'][mode] has states_per_sec over all cases, unresolved (states the mode
+             gave no answer for), errors[property][region] over all cases but AMBIGUOUS_CASES, and the same
+             per case under 'cases'.
+    """
+    states = reference_states(n, seed)
+    expected = np.column_stack([states[c] for c in PROPERTIES])
+    was_enabled = state_cache.enabled
+    state_cache.configure(enabled=False)  # measure the calculation, not the cache
+    report = {'timestamp': datetime.datetime.now().isoformat(timespec='seconds'), 'python': sys.version.split()[0],
+              'states': len(states), 'seed': seed, 'modes': {}}
+    try:
+        for mode in modes:
+            cases = {}
+            results, references, regions = [], [], []
+            total_time = total_states = 0
+            for case in (STEAM_CASES if mode == 'steam' else CASES):
+                rows = case_rows(case, states)
+                result, seconds = run_mode(mode, case, states[case[0]][rows], states[case[1]][rows])
+                ref = expected[rows]
+                cases[case] = _summary(result, ref, states['region'][rows], len(result) / seconds)
+                if case in AMBIGUOUS_CASES:
+                    continue
+                results.append(result)
+                references.append(ref)
+                regions.append(states['region'][rows])
+                total_time += seconds
+                total_states += len(result)
+            summary = _summary(np.concatenate(results), np.concatenate(references), np.concatenate(regions),
+                               total_states / total_time)
+            summary['cases'] = cases
+            report['modes'][mode] = summary
+    finally:
+        state_cache.configure(enabled=was_enabled)
+    return report
+
+
+def _summary(result, ref, region, states_per_sec):
+    unresolved = np.isnan(result[:, [0, 1, 3, 4, 5]]).any(axis=1)
+    errors = {}
+    for j, prop in enumerate(PROPERTIES):
+        errors[prop] = {region_name(code): error_stats(result[region == code, j], ref[region == code, j])
+                        for code in (REGION_SATURATED, REGION_SUPERHEATED)}
+        errors[prop]['all'] = error_stats(result[:, j], ref[:, j])
+    return {'states_per_sec': states_per_sec, 'unresolved': int(unresolved.sum()), 'errors': errors}
+
+
+def cheapest(report, budget):
+    """
+    The fastest mode whose maximum absolute errors are all within a budget and that resolves every state (the
+    errors are only taken over the states a mode resolved).
+    :param budget: dict of property -> largest acceptable absolute error, e.g. {'h': 0.5, 's': 0.001}, and
+                   optionally 'unresolved' -> the number of states a mode may leave unresolved (default 0)
+    :return: mode name, or None if no mode meets the budget
+    """
+    budget = dict(budget)
+    max_unresolved = budget.pop('unresolved', 0)
+    passing = []
+    for mode, summary in report['modes'].items():
+        errors = summary['errors']
+        if summary['unresolved'] <= max_unresolved and \
+                all(errors[prop]['all']['max'] is not None and errors[prop]['all']['max'] <= limit
+                    for prop, limit in budget.items()):
+            passing.append((summary['states_per_sec'], mode))
+    return max(passing)[1] if passing else None
+
+
+def print_table(report, file=sys.stdout):
+    """
+    Prints one line per mode and region: throughput, unresolved states and the max/mean error of every property.
+    """
+    print('{:<14}{:>12}{:>8}  {:<12}'.format('mode', 'states/s', 'unres', 'region')
+          + ''.join('{:>20}'.format(prop + ' max/mean') for prop in 'Thsv'), file=file)
+    for mode, summary in report['modes'].items():
+        for region in ('saturated', 'superheated'):
+            cells = []
+            for prop in 'Thsv':
+                stats = summary['errors'][prop][region]
+                cells.append('{:>20}'.format('-' if stats['max'] is None else
+                                             '{:.2g}/{:.2g}'.format(stats['max'], stats['mean'])))
+            print('{:<14}{:>12.0f}{:>8}  {:<12}'.format(mode, summary['states_per_sec'], summary['unresolved'], region)
+                  + ''.join(cells), file=file)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Compares the steam calculation modes with XSteam.')
+    parser.add_argument('--modes', nargs='+', default=list(SCALAR_MODES + BATCH_MODES),
+                        help='Steam_SI, steam and/or property backend names')
+    parser.add_argument('-n', '--points', type=int, default=2000, help='number of reference states')
+    parser.add_argument('--seed', type=int, default=0, help='random seed of the reference states')
+    parser.add_argument('--table', action='store_true', help='print a table instead of the JSON report')
+    parser.add_argument('-o', '--output', help='write the JSON report to this file')
+    parser.add_argument('--budget', nargs='+', metavar='PROP=ERROR',
+                        help='maximum absolute errors, e.g. h=0.5 s=0.001 (and optionally unresolved=N states, default 0); '
+                             'prints the fastest mode that meets them')
+    args = parser.parse_args(argv)
+
+    report = validate(args.modes, args.points, args.seed)
+    if args.table:
+        print_table(report)
+    else:
+        print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.budget:
+        budget = {item.split('=')[0]: float(item.split('=')[1]) for item in args.budget}
+        mode = cheapest(report, budget)
+        print('fastest mode within the budget: {}'.format(mode), file=sys.stderr)
+        return 0 if mode is not None else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())